@@ -1,82 +1,138 @@
+import argparse
+import asyncio
+import contextlib
 import json
+import mimetypes
+import os
+import sys
 import uuid
 import time
-from playwright.sync_api import sync_playwright
 from urllib.parse import urljoin
 
-# --- Helper functions ---
-def extract_scripts(page):
-    """Return all script src URLs on the page."""
-    return [s.get_attribute("src") for s in page.query_selector_all("script") if s.get_attribute("src")]
+from browser_pool import USER_AGENT, BrowserPool
+from capture import CaptureRecorder, resolve_profile
+from extractor import extract_features, extract_main_text
+from history import get_history
+from http_client import close_client, get_client
+from scoring import risk_features, risk_label, score_features
+from screenshots import capture_screenshot
+from settle import SETTLE_MAX_MS, PageSettler
+from urls import ensure_scheme, resolves_to_public
+
+# Shorter plain-HTTP text than this probably needs JS to render
+PRIVACY_MIN_TEXT_CHARS = int(os.environ.get("PRIVACY_MIN_TEXT_CHARS", "500"))
+JS_REQUIRED_MARKERS = ("enable javascript", "javascript is required", "requires javascript", "turn on javascript")
+# The policy link comes from the scanned page: bound what fetching it can cost
+PRIVACY_MAX_BYTES = int(os.environ.get("PRIVACY_MAX_BYTES", str(2 * 1024 * 1024)))
+PRIVACY_MAX_REDIRECTS = 5
+PRIVACY_CONTENT_TYPES = ("text/html", "text/plain", "application/xhtml+xml")
+# Caps per browser step; a scan budget can only shorten them
+NAVIGATION_TIMEOUT_MS = 15000
+PRIVACY_TIMEOUT_MS = 25000
+# With less budget left than this the privacy policy isn't fetched
+PRIVACY_MIN_BUDGET_MS = 1000
 
-def get_privacy_policy_text(context, base_url, original_page_content):
-    """
-    Scans for a privacy policy link.
-    FIX: Ignores product pages and enforces strictly legal wording.
-    """
-    result = {"link": None, "text": None}
 
-    # 1. Strong keywords: These usually indicate the actual legal doc
-    strong_keywords = ["privacy policy", "privacy notice", "privacy statement", "legal notice"]
-
-    try:
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(original_page_content, 'html.parser')
+# --- Helper functions ---
+def _elapsed_ms(started):
+    return round((time.monotonic() - started) * 1000, 1)
 
-        best_link = None
 
-        # Find all links
-        all_links = soup.find_all('a', href=True)
+class UnsafeLink(Exception):
+    """A page-supplied link that leads to a private, loopback or link-local address."""
 
-        for a in all_links:
-            href = a['href']
-            text = a.get_text(" ", strip=True).lower()
 
-            # --- FILTER 1: Ignore Junk ---
-            # Ignore javascript links, anchors, and empty text
-            if not text or not href or href.startswith("javascript") or href.startswith("#"):
-                continue
+async def fetch_privacy_text_http(link, recorder=None):
+    """
+    Fetch a policy page without a browser; None if it needs one. Redirects
+    are followed by hand so every hop is checked against private addresses
+    (UnsafeLink), and at most PRIVACY_MAX_BYTES of an HTML or text body is read.
+    """
+    url = link
+    try:
+        for _ in range(PRIVACY_MAX_REDIRECTS + 1):
+            if not await resolves_to_public(url):
+                raise UnsafeLink(f"Privacy link {url} does not resolve to a public address")
+            async with get_client().stream("GET", url, headers={"User-Agent": USER_AGENT}, timeout=10) as resp:
+                if resp.is_redirect:
+                    url = urljoin(url, resp.headers.get("location", ""))
+                    continue
+                resp.raise_for_status()
+                content_type = resp.headers.get("content-type", "").lower()
+                if not content_type.startswith(PRIVACY_CONTENT_TYPES):
+                    return None  # PDFs and the like: let the browser try
+                body = bytearray()
+                async for chunk in resp.aiter_bytes():
+                    body += chunk
+                    if len(body) >= PRIVACY_MAX_BYTES:
+                        del body[PRIVACY_MAX_BYTES:]
+                        break  # the policy text is near the top; the rest isn't read
+                encoding = resp.charset_encoding or "utf-8"
+                break
+        else:
+            print(f"Privacy link {link} redirected more than {PRIVACY_MAX_REDIRECTS} times, using browser")
+            return None
+    except UnsafeLink:
+        raise
+    except Exception as e:
+        print(f"HTTP fetch of privacy link failed, using browser: {e}")
+        return None
+    if recorder is not None:
+        recorder.bytes_downloaded += len(body)
 
-            # --- FILTER 2: Ignore Products (Amazon specific and general) ---
-            # Products usually have /dp/ in the URL or very long titles
-            if "/dp/" in href or "/gp/product" in href or len(text) > 50:
-                continue
+    try:
+        html = bytes(body).decode(encoding, errors="replace")
+    except LookupError:  # unknown charset name
+        html = bytes(body).decode("utf-8", errors="replace")
+    text = html.strip() if content_type.startswith("text/plain") else extract_main_text(html)
+    head = text[:300].lower()
+    if len(text) < PRIVACY_MIN_TEXT_CHARS or any(m in head for m in JS_REQUIRED_MARKERS):
+        return None
+    return text
 
-            # --- FILTER 3: Strict Matching ---
-            # Check for EXACT match first (highest priority)
-            if text in strong_keywords:
-                best_link = href
-                break # We found the holy grail, stop looking.
 
-            # Check for partial match (e.g., "Your Privacy Rights") if we haven't found a best link yet
-            if "privacy" in text and "settings" not in text and not best_link:
-                best_link = href
+async def get_privacy_policy_text(context, best_link, recorder=None):
+    """
+    Scrapes the privacy policy found by the extractor. A plain HTTP fetch is
+    tried first; a browser tab is only opened when that yields no usable text.
+    """
+    result = {"link": None, "text": None, "source": None}
 
+    try:
         if best_link:
-            # Normalize URL
-            if not best_link.startswith("http"):
-                best_link = urljoin(base_url, best_link)
-
             print(f"\U0001f3af Privacy Link Candidate: {best_link}")
             result["link"] = best_link
 
+            try:
+                text = await fetch_privacy_text_http(best_link, recorder)
+            except UnsafeLink as e:
+                print(f"\u26a0\ufe0f {e}; not fetched")
+                return result
+            if text:
+                result["text"] = text
+                result["source"] = "http"
+                return result
+
             # Open in a NEW page (tab) to grab the text
-            policy_page = context.new_page()
+            policy_page = await context.new_page()
+            if recorder is not None:
+                await recorder.attach(policy_page)
             try:
-                policy_page.goto(best_link, timeout=15000, wait_until="domcontentloaded")
+                await policy_page.goto(best_link, timeout=15000, wait_until="domcontentloaded")
                 # Grab text from <main>, <article>, or fallback to <body>
                 # This avoids grabbing navbars/footers again if possible
                 content_text = ""
                 try:
-                    content_text = policy_page.inner_text("main")
+                    content_text = await policy_page.inner_text("main")
                 except:
-                    content_text = policy_page.inner_text("body")
+                    content_text = await policy_page.inner_text("body")
 
                 result["text"] = content_text
+                result["source"] = "browser"
             except Exception as e:
                 print(f"Could not load privacy link {best_link}: {e}")
             finally:
-                policy_page.close()
+                await policy_page.close()
         else:
             print("\u274c No valid Privacy Policy link found.")
 
@@ -86,64 +142,323 @@ def get_privacy_policy_text(context, base_url, original_page_content):
     return result
 
 
-def analyze_url(url, screenshot_path="screenshot.png"):
+async def scan_page(context, url, profile=None, budget=None):
     """
-    Single-pass analysis:
+    Single-pass analysis inside an already-open BrowserContext:
     1. Open URL
     2. Capture basic data (redirects, HTML, scripts)
     3. Find & scrape Privacy Policy (using same browser context)
+    `profile` is a capture profile name ("full" or "fast").
+    `budget` (seconds) bounds the whole scan: navigation and settling get
+    what is left of it, and the privacy policy is dropped (listed under
+    "skipped") when it doesn't fit.
+    Per-stage wall time (ms, monotonic clock) is returned under "timings".
     """
+    started = time.monotonic()
+    timings = {}
+    skipped = []
+
+    def left_ms(cap_ms):
+        if budget is None:
+            return cap_ms
+        return max(0, min(cap_ms, (started + budget - time.monotonic()) * 1000))
+
     redirects = []
     downloads = []
+    recorder = CaptureRecorder(resolve_profile(profile))
+    await recorder.install(context)
+
+    # Setup event listeners
+    page = await context.new_page()
+    await recorder.attach(page)
+    page.on("framenavigated", lambda frame: redirects.append(frame.url) if frame == page.main_frame else None)
+    page.on("download", lambda download: downloads.append(download.suggested_filename))
+    settler = PageSettler(page)
+    await settler.install()
+
+    # 1. Visit Main URL
+    try:
+        stage = time.monotonic()
+        # Playwright treats a timeout of 0 as "no timeout"
+        await page.goto(url, wait_until="domcontentloaded", timeout=max(left_ms(NAVIGATION_TIMEOUT_MS), 1))
+        timings["navigation"] = _elapsed_ms(stage)
+        # Wait for network, DOM and JS redirects to go quiet (bounded)
+        stage = time.monotonic()
+        settle = await settler.wait(max_ms=left_ms(SETTLE_MAX_MS))
+        timings["settle"] = _elapsed_ms(stage)
+    except Exception as e:
+        print(f"Navigation failed: {e}")
+        return None
+
+    # 2. Capture Main Page Data (screenshot stays in memory)
+    stage = time.monotonic()
+    screenshot = await capture_screenshot(page)
+    timings["screenshot"] = _elapsed_ms(stage)
+    stage = time.monotonic()
+    main_html = await page.content()
+    final_url = page.url
+
+    # One parse of the captured HTML feeds scripts, privacy link and signals
+    features = extract_features(main_html, final_url)
+    timings["extract"] = _elapsed_ms(stage)
+
+    # 3. Extract Privacy Policy (Reusing context)
+    stage = time.monotonic()
+    privacy_data = {"link": features.privacy_link, "text": None, "source": None}
+    privacy_budget = left_ms(PRIVACY_TIMEOUT_MS)
+    if privacy_budget < PRIVACY_MIN_BUDGET_MS:
+        skipped.append("privacyPolicy")
+    else:
+        try:
+            privacy_data = await asyncio.wait_for(
+                get_privacy_policy_text(context, features.privacy_link, recorder), privacy_budget / 1000
+            )
+        except asyncio.TimeoutError:
+            print(f"Privacy policy skipped: scan budget ran out after {_elapsed_ms(stage)} ms")
+            skipped.append("privacyPolicy")
+    timings["privacyPolicy"] = _elapsed_ms(stage)
+    timings["total"] = _elapsed_ms(started)
+
+    return {
+        "final_url": final_url,
+        "redirects": redirects,
+        "html": main_html,
+        "screenshot": screenshot,
+        "downloads": downloads,
+        "scripts": features.scripts,
+        "features": features,
+        "privacy_policy": privacy_data,
+        "capture": recorder.summary(),
+        "settle": settle,
+        "timings": timings,
+        "skipped": skipped,
+    }
+
+
+async def analyze_url_async(url, pool=None, profile=None, budget=None):
+    """
+    Scan a URL on the running event loop. With a BrowserPool the scan leases
+    a warm browser; without one a pool is started for this call only.
+    `budget` (seconds) bounds the scan, waiting for the lease included.
+    """
+    if pool is not None:
+        return await _leased_scan(pool, url, profile, budget)
+
+    pool = BrowserPool(size=1, max_concurrent=1)
+    await pool.start()
+    try:
+        return await _leased_scan(pool, url, profile, budget)
+    finally:
+        await pool.close()
+
 
-    with sync_playwright() as p:
-        # Launch browser
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-        )
+async def _leased_scan(pool, url, profile, budget=None):
+    """scan_page on a leased context, timing the wait for the lease too."""
+    started = time.monotonic()
+    async with pool.lease() as context:
+        waited = _elapsed_ms(started)
+        if budget is not None:
+            budget -= waited / 1000
+        data = await scan_page(context, url, profile, budget)
+    if data is not None:
+        data["timings"] = {"browserLease": waited, **data["timings"]}
+    return data
 
-        # Setup event listeners
-        page = context.new_page()
-        page.on("framenavigated", lambda frame: redirects.append(frame.url) if frame == page.main_frame else None)
-        page.on("download", lambda download: downloads.append(download.suggested_filename))
 
-        # 1. Visit Main URL
+def analyze_url(url, screenshot_path=None, profile=None):
+    """
+    Blocking wrapper around analyze_url_async for scripts and the CLI.
+    The in-memory screenshot is written to screenshot_path
+    (default: screenshot.<format> in the working directory).
+    """
+    async def run():
         try:
-            page.goto(url, wait_until="domcontentloaded", timeout=15000)
-            page.wait_for_timeout(2000) # Allow JS to settle
-        except Exception as e:
-            print(f"Navigation failed: {e}")
-            browser.close()
-            return None
+            return await analyze_url_async(url, profile=profile)
+        finally:
+            await close_client()
+
+    data = asyncio.run(run())
+    if data is None:
+        return None
+    data["features"] = data["features"].to_dict()
+    screenshot = data.pop("screenshot", None)
+    if screenshot:
+        screenshot_path = screenshot_path or "screenshot." + screenshot["mime_type"].split("/")[1]
+        with open(screenshot_path, "wb") as f:
+            f.write(screenshot["data"])
+    data["screenshot_path"] = screenshot_path if screenshot else None
+    return data
+
+# --- Bulk mode ---
+def read_urls(source):
+    """URLs from an open file, one per line; blank lines and # comments are skipped."""
+    for line in source:
+        url = line.strip()
+        if not url or url.startswith("#"):
+            continue
+        yield ensure_scheme(url)
+
+
+def bulk_record(url, data, elapsed_ms):
+    """One JSONL line for a finished scan: the heuristic verdict and key signals, no HTML."""
+    features = data["features"]
+    risk = score_features(risk_features(data, url))
+    return {
+        "url": url,
+        "status": "ok",
+        "final_url": data["final_url"],
+        "redirects": data["redirects"],
+        "title": features.title[:200],
+        "risk": risk,
+        "label": risk_label(risk),
+        "has_login_form": features.has_login_form,
+        "third_party_scripts": len(features.third_party_scripts),
+        "privacy_link": (data.get("privacy_policy") or {}).get("link"),
+        "downloads": data["downloads"],
+        "capture": data.get("capture"),
+        "skipped": data.get("skipped", []),
+        "elapsed_ms": elapsed_ms,
+    }
+
 
-        # 2. Capture Main Page Data
-        page.screenshot(path=screenshot_path)
-        main_html = page.content()
-        scripts = extract_scripts(page)
-        final_url = page.url
+def load_checkpoint(path):
+    """URLs already written by an earlier run of the same job."""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
 
-        # 3. Extract Privacy Policy (Reusing context)
-        # We pass the HTML we just captured so we don't have to scrape the live DOM again
-        privacy_data = get_privacy_policy_text(context, final_url, main_html)
 
-        browser.close()
+async def bulk_scan(urls, out, concurrency=4, browsers=1, timeout=60.0, profile=None,
+                    checkpoint=None, record_history=True):
+    """
+    Scan `urls` (any iterable, consumed in a worker thread) with `concurrency`
+    scans in flight on a shared BrowserPool and write one JSON line to `out`
+    as each scan finishes, in completion order.
+    Finished URLs are appended to the `checkpoint` file (after their line is
+    flushed), so a rerun skips them; a crash between the two can repeat one
+    line per in-flight scan, never lose one. Returns run statistics.
+    """
+    done = load_checkpoint(checkpoint)
+    checkpoint_file = open(checkpoint, "a") if checkpoint else None
+    history = get_history() if record_history else None
+    stats = {"scanned": 0, "ok": 0, "failed": 0, "timed_out": 0, "skipped": 0, "duplicates": 0}
+    latencies = []
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    pool = BrowserPool(size=browsers, max_concurrent=concurrency)
+    await pool.start()
+    started = time.monotonic()
+
+    def write(record):
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+        if checkpoint_file:
+            checkpoint_file.write(record["url"] + "\n")
+            checkpoint_file.flush()
+        stats["scanned"] += 1
+        if stats["scanned"] % 100 == 0:
+            rate = stats["scanned"] / (time.monotonic() - started)
+            print(f"[bulk] {stats['scanned']} scanned, {rate:.1f} URLs/s", file=sys.stderr)
+
+    async def worker():
+        while (url := await queue.get()) is not None:
+            scan_started = time.monotonic()
+            try:
+                # The agent fits its steps into the timeout; wait_for only stops a scan that hangs
+                data = await asyncio.wait_for(
+                    analyze_url_async(url, pool=pool, profile=profile, budget=timeout), timeout
+                )
+            except asyncio.TimeoutError:
+                stats["timed_out"] += 1
+                write({"url": url, "status": "timeout", "error": f"No result within {timeout:g}s"})
+                continue
+            except Exception as e:
+                stats["failed"] += 1
+                write({"url": url, "status": "error", "error": str(e) or type(e).__name__})
+                continue
+            elapsed_ms = _elapsed_ms(scan_started)
+            if data is None:
+                stats["failed"] += 1
+                write({"url": url, "status": "error", "error": "Failed to load the URL", "elapsed_ms": elapsed_ms})
+                continue
+            latencies.append(elapsed_ms)
+            stats["ok"] += 1
+            write(bulk_record(url, data, elapsed_ms))
+            if history is not None:
+                try:
+                    await asyncio.to_thread(history.record, url, data, None, profile, "cli")
+                except Exception as e:
+                    print(f"[bulk] History write failed for {url}: {e}", file=sys.stderr)
 
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        seen = set()
+        urls = iter(urls)
+        # Lines come from a file or a pipe that can block between them: read off the event loop
+        while (url := await asyncio.to_thread(next, urls, None)) is not None:
+            if url in done:
+                stats["skipped"] += 1
+                continue
+            if url in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(url)
+            await queue.put(url)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await pool.close()
+        await close_client()
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    pick = lambda pct: latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))] if latencies else None
     return {
-        "final_url": final_url,
-        "redirects": redirects,
-        "html": main_html,
-        "screenshot_path": screenshot_path,
-        "downloads": downloads,
-        "scripts": scripts,
-        "privacy_policy": privacy_data
+        **stats,
+        "seconds": round(elapsed, 1),
+        "urls_per_second": round(stats["scanned"] / elapsed, 2) if elapsed else None,
+        "p50_ms": pick(50),
+        "p95_ms": pick(95),
     }
 
+
+def run_bulk(args):
+    source = sys.stdin if args.bulk == "-" else open(args.bulk)
+    out = sys.stdout if args.output in (None, "-") else open(args.output, "a")
+    checkpoint = args.checkpoint
+    if checkpoint is None and out is not sys.stdout:
+        checkpoint = args.output + ".checkpoint"
+    try:
+        # Scan-time prints must not end up between the JSON lines on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            summary = asyncio.run(bulk_scan(
+                read_urls(source), out,
+                concurrency=args.concurrency, browsers=args.browsers, timeout=args.timeout,
+                profile=args.profile, checkpoint=checkpoint, record_history=not args.no_history,
+            ))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(
+        f"[bulk] {summary['scanned']} scanned ({summary['ok']} ok, {summary['failed']} failed, "
+        f"{summary['timed_out']} timed out), {summary['skipped']} skipped from checkpoint, "
+        f"{summary['duplicates']} duplicates, "
+        f"{summary['seconds']}s, {summary['urls_per_second']} URLs/s, "
+        f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms",
+        file=sys.stderr,
+    )
+
+
 # --- Main ---
-if __name__ == "__main__":
-    target_url = input("Enter a URL to analyze: ")
-    if not target_url.startswith("http"):
-        target_url = "https://" + target_url
+def run_single():
+    target_url = ensure_scheme(input("Enter a URL to analyze: "))
 
     job_id = str(uuid.uuid4())
     print(f"Starting analysis on {target_url}...")
@@ -169,6 +484,37 @@ if __name__ == "__main__":
             json.dump(job_json, f, indent=4)
 
         print(f"Success! Data saved to {output_file}")
+
+        # Step 4: Keep it in the scan history (HISTORY_DB)
+        history = get_history()
+        if history is not None:
+            record = dict(data)
+            if data["screenshot_path"]:
+                with open(data["screenshot_path"], "rb") as f:
+                    record["screenshot"] = {
+                        "data": f.read(),
+                        "mime_type": mimetypes.guess_type(data["screenshot_path"])[0] or "image/jpeg",
+                    }
+            scan_id = history.record(target_url, record, source="cli")
+            print(f"Recorded in scan history as #{scan_id}")
         print(f"Privacy Policy Found: {data['privacy_policy']['link']}")
     else:
         print("Analysis failed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan one URL interactively, or many with --bulk")
+    parser.add_argument("--bulk", metavar="FILE", help="file with one URL per line, or - for stdin")
+    parser.add_argument("--output", "-o", default=None, help="JSONL output file, appended to (default: stdout)")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="scans in flight")
+    parser.add_argument("--browsers", type=int, default=1, help="browser processes shared by the scans")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per URL before it is given up")
+    parser.add_argument("--checkpoint", default=None,
+                        help="file of finished URLs to resume from (default: OUTPUT.checkpoint for file output)")
+    parser.add_argument("--profile", choices=["full", "fast"], default=None, help="capture profile")
+    parser.add_argument("--no-history", action="store_true", help="don't record bulk scans in the scan history")
+    args = parser.parse_args()
+    if args.bulk:
+        run_bulk(args)
+    else:
+        run_single()
@@ -0,0 +1,106 @@
+"""
+Lookalike detector benchmark.
+
+Times lookalike.brand_hits() per URL, and the whole URL-only scoring path
+(url_features + score_features) that /api/triage and bulk lists run, over a
+generated mix: each brand domain with homoglyph, typo and keyword variants
+plus unrelated domains. Also reports how long building the indexes takes.
+
+    python bench/lookalike_bench.py --urls 20000 --output lookalike.json
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import lookalike
+from scoring import score_features, url_features
+
+from run_bench import git_commit
+
+UNRELATED = ["example", "wikipedia", "weather", "recipes", "cityguide", "bikeshop", "newsdaily", "photoblog"]
+TLDS = ["com", "net", "org", "xyz", "top", "co.uk", "io"]
+PATH_WORDS = ["login", "verify", "account", "checkout", "blog", "help", "update"]
+
+
+def variants(name: str, rng: random.Random) -> list[str]:
+    """Homoglyph, typo and keyword-stuffed versions of a brand name."""
+    i = rng.randrange(len(name))
+    swapped = name[:i] + name[i + 1:i + 2] + name[i] + name[i + 2:] if i < len(name) - 1 else name[:-1]
+    return [
+        name.replace("o", "0").replace("l", "1").replace("a", "а"),
+        name[:i] + name[i + 1:],
+        swapped,
+        f"secure-{name}-{rng.choice(PATH_WORDS)}",
+        f"{name}{rng.choice(PATH_WORDS)}",
+    ]
+
+
+def generate_urls(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    hosts = []
+    for domains in lookalike.BRANDS.values():
+        for domain in domains:
+            _, name, _ = lookalike.split_host(domain)
+            hosts.append(domain)
+            hosts += [f"{v}.{rng.choice(TLDS)}" for v in variants(name, rng)]
+    hosts += [f"{w}{n}.{rng.choice(TLDS)}" for w in UNRELATED for n in range(20)]
+    urls = []
+    for _ in range(count):
+        brand = rng.choice(list(lookalike.BRANDS)) if rng.random() < 0.3 else rng.choice(PATH_WORDS)
+        urls.append(f"https://{rng.choice(hosts)}/{brand}/{rng.choice(PATH_WORDS)}")
+    return urls
+
+
+def per_url_us(fn, urls: list[str]) -> dict:
+    samples = []
+    for url in urls:
+        started = time.perf_counter()
+        fn(url)
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "meanUs": round(statistics.mean(samples), 1),
+        "p50Us": round(samples[len(samples) // 2], 1),
+        "p99Us": round(samples[int(len(samples) * 0.99)], 1),
+        "maxUs": round(samples[-1], 1),
+    }
+
+
+def main(args) -> None:
+    started = time.perf_counter()
+    detector = lookalike.get_detector()
+    build_ms = round((time.perf_counter() - started) * 1000, 1)
+    urls = generate_urls(args.urls, args.seed)
+    hits = sum(1 for url in urls if detector.check(url))
+
+    report = {
+        "commit": git_commit(),
+        "urls": len(urls),
+        "brands": len(detector.brands),
+        "indexBuildMs": build_ms,
+        "urlsWithHits": hits,
+        "check": per_url_us(lookalike.brand_hits, urls),
+        "urlScoring": per_url_us(lambda url: score_features(url_features(url)), urls),
+    }
+    print(f"{report['brands']} brands, indexes built in {build_ms} ms; {hits}/{len(urls)} URLs with hits")
+    for name in ("check", "urlScoring"):
+        r = report[name]
+        print(f"{name:<12} mean {r['meanUs']} us  p50 {r['p50Us']} us  p99 {r['p99Us']} us  max {r['maxUs']} us")
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SafeLink lookalike detector benchmark")
+    parser.add_argument("--urls", type=int, default=20000, help="generated URLs to check")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the URL mix")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    main(parser.parse_args())
@@ -0,0 +1,154 @@
+"""
+Preview payload benchmark.
+
+Fetches real /api/preview responses for the benchmark corpus, once in full
+and once per field projection, then measures offline:
+
+- response size per projection: raw JSON, gzip and brotli (same settings
+  as the API's CompressionMiddleware)
+- serialization time of a full response through FastAPI's default path
+  (jsonable_encoder + json.dumps) against the orjson path (responses.dumps)
+
+    python bench/payload_bench.py --output payload.json
+    python bench/payload_bench.py --api-url http://localhost:8000 --targets https://example.com
+
+Without --api-url it starts the upstream stubs and an API server like
+run_bench.py does.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.encoders import jsonable_encoder
+
+import responses
+from run_bench import CORPUS_PAGES, api_env, free_port, git_commit, start_server, wait_ready
+
+PROJECTIONS = {
+    "full": None,
+    "risk": ["risk"],
+    "risk+lookups": ["risk", "whois", "pageRank", "safeBrowsing"],
+    "summary": ["finalUrl", "risk", "aiSummary", "screenshot"],
+}
+
+
+async def fetch_previews(api_url: str, targets: list[str]) -> dict[str, list[dict]]:
+    """{projection: [preview for each target]}; full previews are scanned, the rest come from cache."""
+    previews = {name: [] for name in PROJECTIONS}
+    async with httpx.AsyncClient(timeout=120, headers={"Accept-Encoding": "identity"}) as client:
+        for target in targets:
+            for name, fields in PROJECTIONS.items():
+                body = {"url": target, "force": name == "full"}
+                if fields:
+                    body["fields"] = fields
+                resp = await client.post(f"{api_url}/api/preview", json=body)
+                resp.raise_for_status()
+                previews[name].append(resp.json())
+    return previews
+
+
+def time_call(fn, arg, iterations: int) -> float:
+    """Median microseconds per call over `iterations` runs (after one warm-up)."""
+    fn(arg)
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def fastapi_default(content) -> bytes:
+    """What FastAPI does for a returned dict: encode recursively, then json.dumps."""
+    return json.dumps(
+        jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def measure(previews: dict[str, list[dict]], iterations: int) -> dict:
+    sizes = {}
+    for name, items in previews.items():
+        raw = [responses.dumps(p) for p in items]
+        row = {
+            "raw": round(statistics.mean(len(b) for b in raw)),
+            "gzip": round(statistics.mean(len(responses.compress(b, "gzip")) for b in raw)),
+        }
+        if responses.brotli is not None:
+            row["br"] = round(statistics.mean(len(responses.compress(b, "br")) for b in raw))
+        sizes[name] = row
+
+    full = previews["full"]
+    serialization = {
+        "fastapiDefaultUs": round(statistics.mean(time_call(fastapi_default, p, iterations) for p in full), 1),
+        "fastJsonUs": round(statistics.mean(time_call(responses.dumps, p, iterations) for p in full), 1),
+        "orjson": responses.orjson is not None,
+    }
+    serialization["speedup"] = round(serialization["fastapiDefaultUs"] / max(serialization["fastJsonUs"], 0.01), 1)
+    raw_full = [responses.dumps(p) for p in full]
+    compression = {}
+    for encoding in ("gzip", "br") if responses.brotli is not None else ("gzip",):
+        encode = lambda body: responses.compress(body, encoding)
+        compression[f"{encoding}Us"] = round(statistics.mean(time_call(encode, b, iterations) for b in raw_full), 1)
+    return {"bytes": sizes, "serialization": serialization, "compression": compression}
+
+
+def print_report(report: dict) -> None:
+    full = report["bytes"]["full"]["raw"]
+    print(f"\n{'projection':<16}{'raw':>9}{'gzip':>9}{'br':>9}  (mean bytes per response)")
+    for name, row in report["bytes"].items():
+        br = row.get("br")
+        print(f"{name:<16}{row['raw']:>9}{row['gzip']:>9}{br if br is not None else '-':>9}"
+              f"  {100 * row['raw'] / full:5.1f}% of full")
+    s = report["serialization"]
+    print(f"\nserialize full response: FastAPI default {s['fastapiDefaultUs']} us, "
+          f"fast path {s['fastJsonUs']} us ({s['speedup']}x{'' if s['orjson'] else ', orjson not installed'})")
+    c = report["compression"]
+    print(f"compress full response: gzip {c['gzipUs']} us" + (f", brotli {c['brUs']} us" if "brUs" in c else ""))
+
+
+async def main(args) -> None:
+    processes = []
+    try:
+        api_url, targets = args.api_url, args.targets
+        if api_url is None:
+            stub_port, api_port = free_port(), free_port()
+            stub_url, api_url = f"http://localhost:{stub_port}", f"http://localhost:{api_port}"
+            processes.append(start_server("stubs:app", stub_port, {}, BACKEND_DIR / "bench"))
+            await wait_ready(f"{stub_url}/stats")
+            processes.append(start_server("main:app", api_port, api_env(stub_url), BACKEND_DIR))
+            await wait_ready(f"{api_url}/health", timeout=120)
+            targets = targets or [f"{stub_url}/site/{page}" for page in CORPUS_PAGES]
+        if not targets:
+            raise SystemExit("--targets is required with --api-url")
+
+        report = {
+            "commit": git_commit(),
+            "targets": len(targets),
+            **measure(await fetch_previews(api_url, targets), args.iterations),
+        }
+        print_report(report)
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"\nReport written to {args.output}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait(timeout=15)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SafeLink preview payload benchmark")
+    parser.add_argument("--api-url", default=None, help="measure an already running API instead of starting one")
+    parser.add_argument("--targets", nargs="+", default=None, help="URLs to preview (default: the corpus)")
+    parser.add_argument("--iterations", type=int, default=2000, help="timing runs per response")
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    asyncio.run(main(parser.parse_args()))
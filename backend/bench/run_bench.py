@@ -0,0 +1,316 @@
+"""
+Offline scan benchmark.
+
+Starts the upstream stubs (and corpus) and an API server wired to them, then
+drives /api/preview/stream at several concurrency levels. The streaming
+endpoint runs the same pipeline as /api/preview and also reveals when each
+stage finishes, so the report has per-stage timings next to the end-to-end
+p50/p95/p99, scans per second and the API process tree's peak RSS. The
+server's own per-stage timings (the response's `timings` block) are
+summarized alongside.
+
+    python bench/run_bench.py --concurrency 1 4 8 --requests 40 --output bench.json
+
+Every request uses force=true so the result cache never answers; lookup and
+privacy-analysis caches are disabled too unless --warm-caches is given.
+Use --api-url to benchmark an API server you started yourself.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+CORPUS_PAGES = [
+    "index.html",
+    "login.html",
+    "scripts.html",
+    "privacy.html",
+    "js-redirect.html",
+    "spa.html",
+    "redirect/4",
+]
+STAGES = [
+    "navigation", "screenshot", "risk", "whois", "pageRank", "safeBrowsing",
+    "aiScore", "aiSummary", "aiCaption", "privacyAnalysis", "done",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": round(sum(values) / len(values), 1) if values else None,
+    }
+
+
+# --- Process management ---
+def tree_rss_bytes(pid: int) -> int:
+    """RSS of a process and all its descendants (browsers included), from /proc."""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    stack.extend(int(c) for c in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            continue
+    return total
+
+
+def start_server(app: str, port: int, env: dict, app_dir: Path) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--app-dir", str(app_dir), "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, **env},
+        cwd=str(BACKEND_DIR),
+    )
+
+
+def api_env(stub_url: str, warm_caches: bool = False) -> dict:
+    """Environment for an API server whose upstreams are the stubs at stub_url."""
+    cache_ttl = {} if warm_caches else {
+        "WHOIS_CACHE_TTL": "0", "PAGERANK_CACHE_TTL": "0",
+        "LOOKUP_NEGATIVE_TTL": "0", "PRIVACY_ANALYSIS_CACHE_TTL": "0",
+    }
+    return {
+        "WHOIS_API_KEY": "bench", "OPEN_PAGERANK_KEY": "bench",
+        "GOOGLE_SAFE_BROWSING_KEY": "bench", "GEMINI_API": "bench",
+        "WHOIS_API_URL": f"{stub_url}/whois",
+        "PAGERANK_API_URL": f"{stub_url}/pagerank",
+        "SAFE_BROWSING_API_URL": f"{stub_url}/safebrowsing/v4",
+        "GEMINI_API_URL": f"{stub_url}/gemini",
+        "LOOKUP_CACHE_DB": "", "SAFE_BROWSING_DB": "", "HISTORY_DB": "",
+        **cache_ttl,
+    }
+
+
+async def wait_ready(url: str, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url, timeout=2)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.3)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+# --- Load generation ---
+async def scan_once(client: httpx.AsyncClient, api_url: str, target: str, profile: str | None) -> dict:
+    """
+    One streamed preview; returns total latency, per-stage arrival times and
+    the server-side stage durations (ms).
+    """
+    started = time.monotonic()
+    stages: dict[str, float] = {}
+    server: dict[str, float] = {}
+    error = None
+    body = {"url": target, "force": True, "timings": True}
+    if profile:
+        body["profile"] = profile
+    try:
+        async with client.stream("POST", f"{api_url}/api/preview/stream", json=body, timeout=120) as resp:
+            event = None
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    stages.setdefault(event, (time.monotonic() - started) * 1000)
+                elif line.startswith("data: ") and event == "error":
+                    error = json.loads(line[6:]).get("detail")
+                elif line.startswith("data: ") and event == "done":
+                    server = flatten_timings(json.loads(line[6:]).get("timings") or {})
+    except httpx.HTTPError as e:
+        error = str(e) or type(e).__name__
+    if "done" not in stages and error is None:
+        error = "stream ended without a result"
+    return {"target": target, "ms": (time.monotonic() - started) * 1000, "stages": stages,
+            "server": server, "error": error}
+
+
+def flatten_timings(timings: dict) -> dict[str, float]:
+    """{"scan": {"navigation": 1}, "total": 2} -> {"scan.navigation": 1, "total": 2}"""
+    flat = {}
+    for name, value in timings.items():
+        if isinstance(value, dict):
+            flat.update({f"{name}.{k}" if name == "scan" else k: v for k, v in value.items()})
+        else:
+            flat[name] = value
+    return flat
+
+
+async def run_level(api_url: str, targets: list[str], concurrency: int, requests: int,
+                    profile: str | None, server_pid: int | None) -> dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(targets[i % len(targets)])
+    results: list[dict] = []
+    peak_rss = 0
+
+    async def worker(client):
+        while not queue.empty():
+            results.append(await scan_once(client, api_url, queue.get_nowait(), profile))
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, tree_rss_bytes(server_pid))
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample_rss()) if server_pid else None
+    started = time.monotonic()
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency * 2)) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+    if sampler:
+        sampler.cancel()
+
+    ok = [r for r in results if r["error"] is None]
+    errors: dict[str, int] = {}
+    for r in results:
+        if r["error"] is not None:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "ok": len(ok),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "scansPerSecond": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latencyMs": summarize([r["ms"] for r in ok]),
+        "stagesMs": {
+            stage: summarize([r["stages"][stage] for r in ok if stage in r["stages"]])
+            for stage in STAGES
+        },
+        "serverMs": {
+            stage: summarize([r["server"][stage] for r in ok if stage in r["server"]])
+            for stage in sorted({stage for r in ok for stage in r["server"]})
+        },
+        "peakRssMb": round(peak_rss / (1024 * 1024), 1) if server_pid else None,
+    }
+
+
+def print_level(level: dict) -> None:
+    lat = level["latencyMs"]
+    fmt = lambda v: f"{v:8.0f}" if v is not None else "       -"
+    print(f"\n== concurrency {level['concurrency']}: {level['ok']}/{level['requests']} ok in {level['seconds']}s, "
+          f"{level['scansPerSecond']} scans/s, peak RSS {level['peakRssMb']} MB")
+    if level["errors"]:
+        print(f"   errors: {level['errors']}")
+    print(f"   {'stage':<16}{'p50':>8}{'p95':>8}{'p99':>8}  (ms since request start)")
+    for stage, s in level["stagesMs"].items():
+        print(f"   {stage:<16}{fmt(s['p50'])}{fmt(s['p95'])}{fmt(s['p99'])}")
+    print(f"   {'total':<16}{fmt(lat['p50'])}{fmt(lat['p95'])}{fmt(lat['p99'])}")
+    if level["serverMs"]:
+        print(f"   {'server stage':<22}{'p50':>8}{'p95':>8}{'p99':>8}  (ms spent in the stage)")
+        for stage, s in level["serverMs"].items():
+            print(f"   {stage:<22}{fmt(s['p50'])}{fmt(s['p95'])}{fmt(s['p99'])}")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+async def main(args) -> None:
+    processes = []
+    try:
+        stub_port = args.stub_port or free_port()
+        stub_url = f"http://localhost:{stub_port}"
+        processes.append(start_server("stubs:app", stub_port, {
+            "BENCH_LATENCY_MS": json.dumps(args.latency),
+            "BENCH_ERROR_RATE": json.dumps(args.error_rate),
+        }, BACKEND_DIR / "bench"))
+        await wait_ready(f"{stub_url}/stats")
+
+        server_pid = None
+        api_url = args.api_url
+        if api_url is None:
+            api_port = free_port()
+            api_url = f"http://localhost:{api_port}"
+            api = start_server("main:app", api_port, api_env(stub_url, args.warm_caches), BACKEND_DIR)
+            processes.append(api)
+            server_pid = api.pid
+            await wait_ready(f"{api_url}/health", timeout=120)
+
+        targets = [f"{stub_url}/site/{page}" for page in CORPUS_PAGES]
+        report = {
+            "commit": git_commit(),
+            "startedAt": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "profile": args.profile,
+            "latencyMs": args.latency,
+            "errorRate": args.error_rate,
+            "levels": [],
+        }
+        if args.warmup:
+            await run_level(api_url, targets, 1, args.warmup, args.profile, None)
+        for concurrency in args.concurrency:
+            level = await run_level(api_url, targets, concurrency, args.requests, args.profile, server_pid)
+            print_level(level)
+            report["levels"].append(level)
+
+        async with httpx.AsyncClient() as client:
+            report["upstreamCalls"] = (await client.get(f"{stub_url}/stats")).json()["calls"]
+        if args.output:
+            Path(args.output).write_text(json.dumps(report, indent=2))
+            print(f"\nReport written to {args.output}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def _mapping(value: str) -> dict:
+    """Parse "whois=200,gemini=800" into a dict of floats."""
+    pairs = (item.split("=", 1) for item in value.split(",") if item)
+    return {k.strip(): float(v) for k, v in pairs}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline SafeLink scan benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=28, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--profile", choices=["full", "fast"], default=None)
+    parser.add_argument("--latency", type=_mapping, default={}, help="per-upstream ms, e.g. whois=200,gemini=800")
+    parser.add_argument("--error-rate", type=_mapping, default={}, help="per-upstream failure rate, e.g. pagerank=0.05")
+    parser.add_argument("--warm-caches", action="store_true", help="keep WHOIS/PageRank/privacy caches enabled")
+    parser.add_argument("--api-url", default=None, help="benchmark an already running API instead of starting one")
+    parser.add_argument("--stub-port", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the JSON report here")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""
+Local stand-ins for every upstream API plus the static benchmark corpus.
+
+Serves WhoisXML, Open PageRank, Safe Browsing (Lookup API) and Gemini
+generateContent with canned answers, and the pages under corpus/ at /site/.
+Latency and error injection are set per upstream through environment
+variables so the benchmark runner can configure a stub process:
+
+    BENCH_LATENCY_MS   JSON, e.g. {"whois": 200, "gemini": 800}
+    BENCH_ERROR_RATE   JSON, e.g. {"pagerank": 0.05}
+
+Corpus pages may use {{THIRD_PARTY}}, which is replaced with this server on
+a different host name (127.0.0.1 vs localhost) so scripts count as third-party.
+
+Run: uvicorn stubs:app --app-dir bench --port 8765
+"""
+import asyncio
+import json
+import os
+import random
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
+
+CORPUS_DIR = Path(__file__).parent / "corpus"
+LATENCY_MS = json.loads(os.environ.get("BENCH_LATENCY_MS", "{}"))
+ERROR_RATE = json.loads(os.environ.get("BENCH_ERROR_RATE", "{}"))
+
+DEFAULT_LATENCY_MS = {"whois": 150, "pagerank": 80, "safebrowsing": 60, "gemini": 600}
+
+app = FastAPI(title="SafeLink upstream stubs")
+calls: dict[str, int] = {}
+
+
+async def upstream(name: str) -> None:
+    """Apply the configured latency and maybe fail, like a real upstream would."""
+    calls[name] = calls.get(name, 0) + 1
+    await asyncio.sleep(LATENCY_MS.get(name, DEFAULT_LATENCY_MS.get(name, 0)) / 1000)
+    if random.random() < ERROR_RATE.get(name, 0):
+        raise HTTPException(status_code=503, detail=f"Injected {name} error")
+
+
+@app.get("/stats")
+def stats():
+    return {"calls": calls, "latencyMs": {**DEFAULT_LATENCY_MS, **LATENCY_MS}, "errorRate": ERROR_RATE}
+
+
+# --- Upstream APIs ---
+@app.get("/whois")
+async def whois(domainName: str):
+    await upstream("whois")
+    return {"WhoisRecord": {
+        "domainName": domainName,
+        "registrarName": "Bench Registrar, Inc.",
+        "createdDate": "2015-03-01T00:00:00Z",
+        "updatedDate": "2024-11-20T00:00:00Z",
+        "registrant": {"organization": "Privacy Protect, LLC", "name": "REDACTED"},
+        "contactEmail": "",
+    }}
+
+
+@app.get("/pagerank")
+async def pagerank(request: Request):
+    await upstream("pagerank")
+    domains = request.query_params.getlist("domains[]")
+    return {"status_code": 200, "response": [
+        {"status_code": 200, "domain": d, "page_rank_decimal": 3.42, "page_rank_integer": 3, "rank": "123456"}
+        for d in domains
+    ]}
+
+
+@app.post("/safebrowsing/v4/threatMatches:find")
+async def safe_browsing(request: Request):
+    await upstream("safebrowsing")
+    body = await request.json()
+    entries = body.get("threatInfo", {}).get("threatEntries", [])
+    return {"matches": [
+        {"threatType": "SOCIAL_ENGINEERING", "platformType": "ANY_PLATFORM", "threat": {"url": e["url"]}}
+        for e in entries if "login" in e.get("url", "")
+    ]}
+
+
+def _gemini_text(body: dict) -> str:
+    config = body.get("generationConfig", {})
+    prompt = body["contents"][0]["parts"][0].get("text", "")
+    if "responseSchema" in config:
+        return json.dumps({
+            "score": 72, "tier": "HIGH", "reasoning": "Stub reasoning one. Stub reasoning two.",
+            "domainTrustScore": 65, "summary": "A benchmark corpus page.",
+            "caption": "A plain page with a heading.", "privacySummary": "Stub privacy summary.",
+            "privacyHighlights": ["we collect", "we share", "we never sell"],
+        })
+    if "privacy policy analyst" in prompt:
+        return json.dumps({"summary": "Stub privacy summary.", "highlights": ["we collect", "we share", "we never sell"]})
+    if '"score"' in prompt:
+        return json.dumps({"score": 72, "tier": "HIGH", "reasoning": "Stub reasoning one. Stub reasoning two.", "domainTrustScore": 65})
+    if len(body["contents"][0]["parts"]) > 1:
+        return "A plain page with a heading."
+    return "A benchmark corpus page used to measure scan performance."
+
+
+@app.post("/gemini:generateContent")
+async def gemini(request: Request):
+    await upstream("gemini")
+    body = await request.json()
+    return {"candidates": [{"content": {"parts": [{"text": _gemini_text(body)}]}}]}
+
+
+# --- Static corpus ---
+@app.get("/site/redirect/{hops}")
+def redirect_chain(hops: int):
+    """Server-side redirect chain ending at the index page."""
+    target = f"/site/redirect/{hops - 1}" if hops > 1 else "/site/index.html"
+    return RedirectResponse(target, status_code=302)
+
+
+@app.get("/site/static/{name}")
+def static_asset(name: str):
+    if name.endswith(".js"):
+        return Response(f"window.__loaded = (window.__loaded || 0) + 1; // {name}", media_type="application/javascript")
+    path = CORPUS_DIR / "static" / name
+    if not path.is_file():
+        raise HTTPException(status_code=404)
+    media_type = "image/svg+xml" if name.endswith(".svg") else "application/octet-stream"
+    return Response(path.read_bytes(), media_type=media_type)
+
+
+@app.get("/site/{name}")
+def corpus_page(name: str, request: Request):
+    path = CORPUS_DIR / name
+    if not path.is_file() or path.suffix != ".html":
+        raise HTTPException(status_code=404)
+    other_host = "127.0.0.1" if request.url.hostname == "localhost" else "localhost"
+    third_party = f"{request.url.scheme}://{other_host}:{request.url.port}"
+    return HTMLResponse(path.read_text().replace("{{THIRD_PARTY}}", third_party))
+
+
+@app.post("/site/login")
+def login_post():
+    return JSONResponse({"ok": False}, status_code=401)
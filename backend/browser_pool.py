@@ -0,0 +1,224 @@
+"""
+Long-lived pool of headless Chromium browsers shared across scans.
+
+All browsers are driven from one async Playwright instance on the running
+event loop. Scans lease a fresh, isolated BrowserContext from the least busy
+browser; the context is torn down after each scan so no cookies, storage or
+pages leak into the next one. A semaphore bounds how many scans navigate at
+the same time. Browsers due for recycling are drained and relaunched in a
+background task, so no scan waits on (or holds a scan slot during) a launch.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+MAX_CONCURRENT_SCANS = int(os.environ.get("MAX_CONCURRENT_SCANS", "8"))
+MAX_SCANS_PER_BROWSER = int(os.environ.get("BROWSER_MAX_SCANS", "50"))
+MAX_RSS_MB = int(os.environ.get("BROWSER_MAX_RSS_MB", "1024"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("BROWSER_HEALTH_INTERVAL", "30"))
+_viewport_w, _viewport_h = os.environ.get("BROWSER_VIEWPORT", "1280x720").lower().split("x")
+VIEWPORT = {"width": int(_viewport_w), "height": int(_viewport_h)}
+
+logger = logging.getLogger(__name__)
+
+
+def _proc_rss_bytes(pid: int) -> int:
+    """Resident set size of a single process, read from /proc (Linux only)."""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+async def browser_rss_bytes(browser) -> int | None:
+    """
+    Total RSS of a Chromium browser and all its renderer/GPU processes.
+    Returns None when the process list or /proc is unavailable.
+    """
+    try:
+        session = await browser.new_browser_cdp_session()
+        try:
+            info = await session.send("SystemInfo.getProcessInfo")
+        finally:
+            await session.detach()
+        return sum(_proc_rss_bytes(proc["id"]) for proc in info.get("processInfo", []))
+    except Exception:
+        return None
+
+
+class _Slot:
+    """One browser in the pool and its bookkeeping."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.browser = None
+        self.scans = 0
+        self.active = 0
+        self.draining = False
+        self.lock = asyncio.Lock()
+        self.relaunching: asyncio.Task | None = None
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browsers handing out per-scan contexts."""
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        max_concurrent: int = MAX_CONCURRENT_SCANS,
+        max_scans: int = MAX_SCANS_PER_BROWSER,
+        max_rss_mb: int = MAX_RSS_MB,
+        health_interval: float = HEALTH_CHECK_INTERVAL,
+    ):
+        self.size = max(1, size)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_scans = max_scans
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+        self.health_interval = health_interval
+        self._playwright = None
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        self._health_task: asyncio.Task | None = None
+        self._waiting = 0
+        self._scans = 0
+        self._recycles = 0
+        self._failures = 0
+
+    # --- Lifecycle ---
+    async def start(self) -> None:
+        """Start Playwright and launch every browser."""
+        self._playwright = await async_playwright().start()
+        await asyncio.gather(*(self._relaunch(slot) for slot in self._slots))
+        self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self) -> None:
+        if self._health_task:
+            self._health_task.cancel()
+        pending = [s.relaunching for s in self._slots if s.relaunching is not None and not s.relaunching.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for slot in self._slots:
+            await self._close_browser(slot)
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # --- Leasing ---
+    @asynccontextmanager
+    async def lease(self):
+        """Yield a fresh BrowserContext; it is closed when the block exits."""
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            slot = await self._pick_slot()
+            slot.active += 1
+            context = None
+            try:
+                context = await slot.browser.new_context(user_agent=USER_AGENT, viewport=VIEWPORT)
+                yield context
+            except BaseException:
+                self._failures += 1
+                raise
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+                slot.active -= 1
+                slot.scans += 1
+                self._scans += 1
+                if self.max_scans and slot.scans >= self.max_scans:
+                    slot.draining = True
+                if slot.draining and slot.active == 0:
+                    self._relaunch_later(slot, f"drained after {slot.scans} scans")
+        finally:
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "alive": sum(1 for s in self._slots if s.browser is not None and s.browser.is_connected()),
+            "busy": sum(s.active for s in self._slots),
+            "maxConcurrent": self.max_concurrent,
+            "queued": self._waiting,
+            "scans": self._scans,
+            "recycles": self._recycles,
+            "failures": self._failures,
+        }
+
+    # --- Slot internals ---
+    async def _pick_slot(self) -> _Slot:
+        while True:
+            candidates = [
+                s for s in self._slots if not s.draining and s.browser is not None and s.browser.is_connected()
+            ]
+            if candidates:
+                return min(candidates, key=lambda s: s.active)
+            idle = next((s for s in self._slots if s.active == 0), None)
+            if idle is None:
+                raise RuntimeError("No browser available")
+            # Everything is down or draining: wait for an idle slot to come back,
+            # joining a relaunch already under way rather than starting another.
+            # Another lease may take (and drain) it first, then look again.
+            await asyncio.shield(self._relaunch_later(idle, "no healthy browser"))
+            if idle.browser is None:
+                raise RuntimeError("No browser available")
+
+    async def _close_browser(self, slot: _Slot) -> None:
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+        slot.browser = None
+
+    def _relaunch_later(self, slot: _Slot, reason: str) -> asyncio.Task:
+        """Relaunch slot's browser in a background task; at most one per slot at a time."""
+        if slot.relaunching is None or slot.relaunching.done():
+            slot.relaunching = asyncio.create_task(self._relaunch(slot, reason))
+        return slot.relaunching
+
+    async def _relaunch(self, slot: _Slot, reason: str | None = None) -> None:
+        async with slot.lock:
+            if reason:
+                logger.info(f"Recycling browser slot {slot.index}: {reason}")
+                self._recycles += 1
+            await self._close_browser(slot)
+            slot.scans = 0
+            try:
+                slot.browser = await self._playwright.chromium.launch(headless=True)
+            except Exception as e:
+                logger.error(f"Browser slot {slot.index} failed to launch: {e}")
+            slot.draining = False
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self._check_slots()
+            except Exception as e:
+                logger.error(f"Browser health check failed: {e}")
+
+    async def _check_slots(self) -> None:
+        for slot in self._slots:
+            if slot.browser is None or not slot.browser.is_connected():
+                slot.draining = True
+            elif self.max_rss_bytes:
+                rss = await browser_rss_bytes(slot.browser)
+                if rss is not None and rss > self.max_rss_bytes:
+                    logger.info(f"Browser slot {slot.index} at {rss // (1024 * 1024)} MB RSS")
+                    slot.draining = True
+            if slot.draining and slot.active == 0:
+                self._relaunch_later(slot, "failed health check")
@@ -0,0 +1,334 @@
+"""
+TTL caches for upstream lookups and whole-scan results.
+
+Lookup entries live in an in-memory LRU and, when a SQLite path is configured, are
+written through to disk so they survive restarts. Disk reads run in a worker
+thread and writes are queued to one writer thread, so the event loop never
+waits on SQLite. Negative results (None) are cached too, but for a shorter
+time than real answers.
+"""
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from singleflight import SingleFlight
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("LOOKUP_CACHE_SIZE", "5000"))
+DEFAULT_NEGATIVE_TTL = float(os.environ.get("LOOKUP_NEGATIVE_TTL", str(30 * 60)))
+CACHE_DB_PATH = os.environ.get("LOOKUP_CACHE_DB", "")
+
+_MISSING = object()
+
+
+class LookupUnavailable(Exception):
+    """Raised by a fetch when the upstream couldn't answer right now; nothing gets cached."""
+
+
+class TTLCache:
+    """In-memory LRU cache where every entry carries its own expiry time."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key, default=_MISSING):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl: float, expires_at: float | None = None) -> None:
+        self._data[key] = (value, expires_at if expires_at is not None else time.time() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Small key/value table with expiry, shared by every cache namespace. The
+    methods block; async callers read through asyncio.to_thread and write
+    with set_later(), which a background thread commits in batches.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lookup_cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+        self._writes: queue.SimpleQueue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._write_loop, name="lookup-cache-writer", daemon=True)
+        self._writer.start()
+
+    def get(self, namespace: str, key: str):
+        """Return (value, expires_at) for a live entry, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM lookup_cache WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def get_many(self, namespace: str, keys: list[str]) -> dict:
+        """{key: (value, expires_at)} for the keys with a live entry."""
+        rows = {}
+        for key in keys:
+            row = self.get(namespace, key)
+            if row is not None:
+                rows[key] = row
+        return rows
+
+    def set(self, namespace: str, key: str, value, expires_at: float) -> None:
+        self._write([(namespace, key, value, expires_at)])
+
+    def set_later(self, namespace: str, key: str, value, expires_at: float) -> None:
+        """Queue a write for the writer thread and return at once; writes keep their order."""
+        self._writes.put((namespace, key, value, expires_at))
+
+    def _write(self, rows: list[tuple]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lookup_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value), expires_at) for namespace, key, value, expires_at in rows],
+            )
+            self._conn.commit()
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._writes.get()]
+            # Whatever queued up meanwhile goes into the same commit
+            while not self._writes.empty():
+                batch.append(self._writes.get())
+            rows = [row for row in batch if row is not None]
+            if rows:
+                try:
+                    self._write(rows)
+                except sqlite3.Error as e:
+                    print(f"Lookup cache write failed: {e}")
+            if len(rows) < len(batch):
+                return  # close() was called
+
+    def prune(self) -> int:
+        """Delete expired rows and return how many were removed."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM lookup_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+            return cur.rowcount
+
+    def close(self) -> None:
+        """Write out queued entries, then close the database."""
+        if self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+
+_store: SQLiteStore | None = None
+
+
+def get_store() -> SQLiteStore | None:
+    """The on-disk store configured via LOOKUP_CACHE_DB, or None."""
+    global _store
+    if _store is None and CACHE_DB_PATH:
+        _store = SQLiteStore(CACHE_DB_PATH)
+        _store.prune()
+    return _store
+
+
+class LookupCache:
+    """Cache for one upstream source, keyed by domain."""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        store: SQLiteStore | None = None,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.store = store
+        self._memory = TTLCache(max_entries)
+        self._flight = SingleFlight(name)
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+
+    def _count(self, value):
+        if value is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if value is None:
+                self.negative_hits += 1
+        return value
+
+    def _from_disk(self, key: str, row):
+        value, expires_at = row
+        self._memory.set(key, value, 0, expires_at=expires_at)
+        self.disk_hits += 1
+        return value
+
+    async def get(self, key: str):
+        """Return the cached value or _MISSING; counts hits and misses."""
+        value = self._memory.get(key)
+        if value is _MISSING and self.store is not None:
+            row = await asyncio.to_thread(self.store.get, self.name, key)
+            if row is not None:
+                value = self._from_disk(key, row)
+        return self._count(value)
+
+    def set(self, key: str, value) -> None:
+        ttl = self.ttl if value is not None else self.negative_ttl
+        expires_at = time.time() + ttl
+        self._memory.set(key, value, ttl, expires_at=expires_at)
+        if self.store is not None:
+            self.store.set_later(self.name, key, value, expires_at)
+
+    async def get_or_fetch(self, key: str, fetch):
+        """
+        Return the cached value for key, calling `await fetch(key)` on a miss.
+        If fetch raises (e.g. LookupUnavailable) the error reaches the caller
+        and nothing is cached.
+        """
+        value = await self.get(key)
+        if value is not _MISSING:
+            return value
+
+        async def fetch_and_set(_publish):
+            fetched = await fetch(key)
+            self.set(key, fetched)
+            return fetched
+
+        # Concurrent misses for the same key share one upstream call
+        return await self._flight.do(key, fetch_and_set)
+
+    async def get_or_fetch_many(self, keys: list[str], fetch_many) -> dict:
+        """Like get_or_fetch for many keys; misses go to one `await fetch_many(keys)`."""
+        keys = list(dict.fromkeys(keys))
+        found = {key: self._memory.get(key) for key in keys}
+        not_in_memory = [key for key, value in found.items() if value is _MISSING]
+        if not_in_memory and self.store is not None:
+            # One trip to the disk thread for the whole batch
+            rows = await asyncio.to_thread(self.store.get_many, self.name, not_in_memory)
+            for key, row in rows.items():
+                found[key] = self._from_disk(key, row)
+        results = {}
+        missing = []
+        for key, value in found.items():
+            if self._count(value) is _MISSING:
+                missing.append(key)
+            else:
+                results[key] = value
+        if missing:
+
+            async def fetch_and_set_many(keys: list[str]) -> dict:
+                fetched = await fetch_many(keys)
+                for key in keys:
+                    self.set(key, fetched.get(key))
+                return fetched
+
+            results.update(await self._flight.do_many(missing, fetch_and_set_many))
+        return results
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "diskHits": self.disk_hits,
+            "negativeHits": self.negative_hits,
+            "hitRate": round(self.hits / lookups, 3) if lookups else None,
+            "upstreamCalls": self._flight.executions,
+            "coalesced": self._flight.coalesced,
+            "ttlSeconds": self.ttl,
+            "negativeTtlSeconds": self.negative_ttl,
+        }
+
+
+class ResultCache:
+    """
+    Whole-scan response cache with stale-while-revalidate.
+
+    Entries younger than `fresh_for` are served as-is. Older entries are still
+    served until `stale_for` while the caller refreshes them in the
+    background; past that they are dropped.
+    """
+
+    def __init__(self, fresh_for: float, stale_for: float, max_entries: int):
+        self.fresh_for = fresh_for
+        self.stale_for = max(stale_for, fresh_for)
+        self._memory = TTLCache(max_entries)
+        self._refreshing: set = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def get(self, key: str):
+        """Return (value, age_seconds, is_fresh) or None."""
+        entry = self._memory.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, stored_at = entry
+        age = time.time() - stored_at
+        if age < self.fresh_for:
+            self.hits += 1
+            return value, age, True
+        self.stale_hits += 1
+        return value, age, False
+
+    def set(self, key: str, value) -> None:
+        self._memory.set(key, (value, time.time()), self.stale_for)
+
+    def begin_refresh(self, key: str) -> bool:
+        """Claim the background refresh for key; False if one is already running."""
+        if key in self._refreshing:
+            return False
+        self._refreshing.add(key)
+        self.refreshes += 1
+        return True
+
+    def end_refresh(self, key: str) -> None:
+        self._refreshing.discard(key)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "freshHits": self.hits,
+            "staleHits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "refreshing": len(self._refreshing),
+            "freshSeconds": self.fresh_for,
+            "staleSeconds": self.stale_for,
+        }
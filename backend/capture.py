@@ -0,0 +1,118 @@
+"""
+Capture profiles for the browser agent.
+
+A profile decides which subresources a scan actually downloads. "full" keeps
+every request for screenshot fidelity; "fast" aborts images, media, fonts
+and known tracker hosts through Playwright request routing. Either way the
+URLs of trackers and blocked requests are recorded as signals, and the bytes
+transferred for the scan are counted via the DevTools Network domain.
+"""
+import os
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+MAX_RECORDED_URLS = 200
+
+
+@dataclass(frozen=True)
+class CaptureProfile:
+    name: str
+    blocked_resource_types: frozenset = frozenset()
+    block_trackers: bool = False
+
+
+PROFILES = {
+    "full": CaptureProfile("full"),
+    "fast": CaptureProfile("fast", frozenset({"image", "media", "font"}), block_trackers=True),
+}
+DEFAULT_PROFILE = os.environ.get("CAPTURE_PROFILE", "full")
+
+# Registrable domains of common ad/analytics/session-recording services
+TRACKER_HOSTS = {
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com", "doubleclick.net",
+    "googlesyndication.com", "googleadservices.com", "adservice.google.com", "facebook.net",
+    "connect.facebook.net", "hotjar.com", "hotjar.io", "scorecardresearch.com", "quantserve.com",
+    "adnxs.com", "criteo.com", "criteo.net", "taboola.com", "outbrain.com", "segment.com",
+    "segment.io", "mixpanel.com", "amplitude.com", "clarity.ms", "bat.bing.com", "ads-twitter.com",
+    "analytics.tiktok.com", "moatads.com", "pubmatic.com", "rubiconproject.com",
+    "amazon-adsystem.com", "hs-analytics.net", "nr-data.net", "fullstory.com", "mouseflow.com",
+    "crazyegg.com", "optimizely.com", "mc.yandex.ru", "adroll.com",
+    "bluekai.com", "krxd.net", "demdex.net", "omtrdc.net", "everesttech.net", "chartbeat.com",
+}
+
+
+def resolve_profile(name: str | None) -> CaptureProfile:
+    """Look up a profile by name; raises ValueError for unknown names."""
+    name = (name or DEFAULT_PROFILE).lower()
+    if name not in PROFILES:
+        raise ValueError(f"Unknown capture profile '{name}' (expected one of: {', '.join(PROFILES)})")
+    return PROFILES[name]
+
+
+def is_tracker(url: str) -> bool:
+    """True if the URL's host is, or is a subdomain of, a known tracker host."""
+    host = (urlparse(url).hostname or "").lower()
+    labels = host.split(".")
+    return any(".".join(labels[i:]) in TRACKER_HOSTS for i in range(len(labels) - 1))
+
+
+class CaptureRecorder:
+    """Applies a profile to a browser context and records what it saw."""
+
+    def __init__(self, profile: CaptureProfile):
+        self.profile = profile
+        self.bytes_downloaded = 0
+        self.blocked: list[dict] = []
+        self.blocked_count = 0
+        self.tracker_hosts: dict[str, None] = {}
+        self._byte_counting = False
+
+    async def install(self, context) -> None:
+        """Route the context's requests when the profile blocks anything."""
+        if self.profile.blocked_resource_types or self.profile.block_trackers:
+            await context.route("**/*", self._handle_route)
+        else:
+            context.on("request", self._note_request)
+
+    async def attach(self, page) -> None:
+        """Count transferred bytes for a page (Chromium only)."""
+        try:
+            session = await page.context.new_cdp_session(page)
+            await session.send("Network.enable")
+            session.on("Network.loadingFinished", self._on_loading_finished)
+            self._byte_counting = True
+        except Exception:
+            pass
+
+    def _on_loading_finished(self, event: dict) -> None:
+        self.bytes_downloaded += int(event.get("encodedDataLength", 0))
+
+    def _note_request(self, request) -> bool:
+        tracker = is_tracker(request.url)
+        if tracker:
+            self.tracker_hosts[urlparse(request.url).hostname] = None
+        return tracker
+
+    async def _handle_route(self, route) -> None:
+        request = route.request
+        tracker = self._note_request(request)
+        # Never block the document itself, even if it lives on a tracker host
+        if request.resource_type != "document" and (
+            request.resource_type in self.profile.blocked_resource_types
+            or (tracker and self.profile.block_trackers)
+        ):
+            self.blocked_count += 1
+            if len(self.blocked) < MAX_RECORDED_URLS:
+                self.blocked.append({"url": request.url, "type": request.resource_type, "tracker": tracker})
+            await route.abort("blockedbyclient")
+            return
+        await route.continue_()
+
+    def summary(self) -> dict:
+        return {
+            "profile": self.profile.name,
+            "bytesDownloaded": self.bytes_downloaded if self._byte_counting else None,
+            "blockedRequests": self.blocked_count,
+            "blocked": self.blocked,
+            "trackerHosts": list(self.tracker_hosts),
+        }
@@ -0,0 +1,62 @@
+"""
+Per-request scan deadlines.
+
+A preview gets one deadline (SCAN_DEADLINE seconds, or the request's own
+deadlineSeconds; larger values than SCAN_MAX_DEADLINE are clamped to it)
+instead of a fixed timeout per stage. Jobs pass their own, higher limit.
+Each stage gets a budget out of what is left of it: the browser scan a
+share of the whole deadline, every enrichment stage its usual cap cut down
+to the time remaining. The lookups leave part of the remainder to the Gemini
+score prompt that waits on them. A stage whose budget runs out is cancelled
+and reported as skipped; the preview is then returned as partial.
+"""
+import os
+import time
+
+SCAN_DEADLINE = float(os.environ.get("SCAN_DEADLINE", "45"))
+SCAN_MAX_DEADLINE = float(os.environ.get("SCAN_MAX_DEADLINE", "120"))
+# Share of the deadline the browser scan (lease, navigation, settle, privacy page) may use
+SCAN_BUDGET_SHARE = float(os.environ.get("SCAN_BUDGET_SHARE", "0.6"))
+# Share of the remaining time WHOIS / PageRank / Safe Browsing may use
+LOOKUP_BUDGET_SHARE = float(os.environ.get("LOOKUP_BUDGET_SHARE", "0.5"))
+# Below this a stage isn't started at all
+MIN_STAGE_BUDGET = float(os.environ.get("MIN_STAGE_BUDGET", "0.25"))
+
+# Longest each enrichment stage may take even when the deadline allows more (seconds)
+STAGE_CAPS = {
+    "whois": 10,
+    "pageRank": 10,
+    "safeBrowsing": 10,
+    "aiScore": 30,
+    "aiSummary": 20,
+    "aiCaption": 25,
+    "privacyAnalysis": 25,
+    "aiCombined": 30,
+}
+LOOKUP_STAGES = ("whois", "pageRank", "safeBrowsing")
+
+
+class Deadline:
+    """A point in monotonic time that a whole preview has to finish by."""
+
+    def __init__(self, seconds: float | None = None, max_seconds: float = SCAN_MAX_DEADLINE):
+        self.seconds = max(0.0, min(SCAN_DEADLINE if seconds is None else seconds, max_seconds))
+        self.at = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def scan_budget(self) -> float:
+        """Seconds the browser scan may use."""
+        return min(self.seconds * SCAN_BUDGET_SHARE, self.remaining())
+
+    def stage_budget(self, stage: str) -> float:
+        """Seconds `stage` may use from now; below MIN_STAGE_BUDGET it should be skipped."""
+        remaining = self.remaining()
+        if stage in LOOKUP_STAGES:
+            remaining *= LOOKUP_BUDGET_SHARE
+        budget = min(STAGE_CAPS.get(stage, remaining), remaining)
+        return budget if budget >= MIN_STAGE_BUDGET else 0.0
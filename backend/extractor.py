@@ -0,0 +1,156 @@
+"""
+Single-pass HTML feature extraction.
+
+The page HTML is parsed once with lxml and walked once; everything the risk
+heuristics, the Gemini prompts and the privacy-policy lookup need is read
+from the resulting PageFeatures record instead of re-scanning the raw HTML.
+"""
+from dataclasses import asdict, dataclass, field
+from urllib.parse import urljoin, urlparse
+
+import lxml.html
+
+# Strong keywords: These usually indicate the actual legal doc
+PRIVACY_STRONG_KEYWORDS = {"privacy policy", "privacy notice", "privacy statement", "legal notice"}
+LOGIN_WORDS = ("login", "log in", "sign in", "signin")
+
+
+@dataclass
+class PageFeatures:
+    title: str = ""
+    forms: int = 0
+    password_inputs: int = 0
+    email_inputs: int = 0
+    has_login_form: bool = False
+    scripts: list[str] = field(default_factory=list)
+    third_party_scripts: list[str] = field(default_factory=list)
+    script_origins: list[str] = field(default_factory=list)
+    privacy_candidates: list[str] = field(default_factory=list)
+    privacy_link: str | None = None
+    meta_refresh: str | None = None
+    iframes: list[str] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _is_privacy_candidate(href: str, text: str) -> bool:
+    # --- FILTER 1: Ignore Junk ---
+    # Ignore javascript links, anchors, and empty text
+    if not text or not href or href.startswith("javascript") or href.startswith("#"):
+        return False
+    # --- FILTER 2: Ignore Products (Amazon specific and general) ---
+    # Products usually have /dp/ in the URL or very long titles
+    if "/dp/" in href or "/gp/product" in href or len(text) > 50:
+        return False
+    return "privacy" in text or text in PRIVACY_STRONG_KEYWORDS
+
+
+def extract_features(html: str, base_url: str) -> PageFeatures:
+    """Parse the page once and collect every feature the pipeline uses."""
+    features = PageFeatures()
+    if not html or not html.strip():
+        return features
+    try:
+        root = lxml.html.fromstring(html.encode("utf-8", "replace"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    except Exception:
+        return features
+
+    final_domain = urlparse(base_url).netloc
+    origins: dict[str, None] = {}
+    strong_link = None
+    partial_link = None
+    login_form = False
+
+    for el in root.iter():
+        tag = el.tag
+        if not isinstance(tag, str):
+            continue  # comments / processing instructions
+        tag = tag.lower()
+
+        if tag == "title" and not features.title:
+            features.title = " ".join((el.text_content() or "").split())
+        elif tag == "script":
+            src = el.get("src")
+            if src:
+                features.scripts.append(src)
+                netloc = urlparse(src).netloc
+                if netloc and netloc != final_domain:
+                    features.third_party_scripts.append(src)
+                    origins[netloc] = None
+        elif tag == "form":
+            features.forms += 1
+            action = (el.get("action") or "").lower()
+            if any(w in action for w in LOGIN_WORDS):
+                login_form = True
+        elif tag == "input":
+            input_type = (el.get("type") or "").lower()
+            if input_type == "password":
+                features.password_inputs += 1
+            elif input_type == "email":
+                features.email_inputs += 1
+        elif tag == "button" and not login_form:
+            # Only a "Sign in" button inside a form counts, not one in the navbar
+            if any(w in (el.text_content() or "").lower() for w in LOGIN_WORDS) and next(el.iterancestors("form"), None) is not None:
+                login_form = True
+        elif tag == "a":
+            href = el.get("href")
+            if not href or strong_link:
+                continue
+            text = " ".join((el.text_content() or "").split()).lower()
+            if not _is_privacy_candidate(href, text):
+                continue
+            features.privacy_candidates.append(href)
+            # --- FILTER 3: Strict Matching ---
+            # Exact match wins; otherwise keep the first partial match (e.g. "Your Privacy Rights")
+            if text in PRIVACY_STRONG_KEYWORDS:
+                strong_link = href
+            elif "settings" not in text and not partial_link:
+                partial_link = href
+        elif tag == "meta":
+            if (el.get("http-equiv") or "").lower() == "refresh" and features.meta_refresh is None:
+                features.meta_refresh = el.get("content") or ""
+        elif tag in ("iframe", "frame"):
+            features.iframes.append(el.get("src") or "")
+
+    features.script_origins = list(origins)
+    features.has_login_form = features.password_inputs > 0 or login_form or (
+        features.forms > 0 and features.email_inputs > 0
+    )
+    best_link = strong_link or partial_link
+    if best_link and not best_link.startswith("http"):
+        best_link = urljoin(base_url, best_link)
+    features.privacy_link = best_link
+    return features
+
+
+NON_TEXT_TAGS = ("script", "style", "noscript", "template", "svg")
+
+
+def extract_main_text(html: str) -> str:
+    """Visible text of <main> (or <body>), one line per text block."""
+    if not html or not html.strip():
+        return ""
+    try:
+        root = lxml.html.fromstring(html.encode("utf-8", "replace"), parser=lxml.html.HTMLParser(encoding="utf-8"))
+    except Exception:
+        return ""
+    for el in root.xpath("|".join(f"//{tag}" for tag in NON_TEXT_TAGS)):
+        el.drop_tree()
+    container = next(iter(root.xpath("//main")), None)
+    if container is None:
+        container = next(iter(root.xpath("//body")), root)
+    lines = (" ".join(t.split()) for t in container.itertext())
+    return "\n".join(line for line in lines if line)
+
+
+def features_for(agent_data: dict) -> PageFeatures:
+    """The scan's PageFeatures, extracting them if the scan predates the extractor."""
+    features = agent_data.get("features")
+    if isinstance(features, PageFeatures):
+        return features
+    if isinstance(features, dict):
+        return PageFeatures(**features)
+    features = extract_features(agent_data.get("html", ""), agent_data.get("final_url", ""))
+    agent_data["features"] = features
+    return features
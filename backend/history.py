@@ -0,0 +1,258 @@
+"""
+Persistent scan history.
+
+When HISTORY_DB names a file (it is unset by default, like the lookup cache
+and SQLite job store), every finished scan is appended to a SQLite table
+with indexes on normalized URL, input and final domain, risk label and
+time, so history queries walk an index instead of the whole table. Rows are
+never updated; the ids grow with scanned_at, which lets a time window turn
+into an id range and keeps keyset pagination (`before` an id) on the same
+indexes.
+
+Large blobs (page HTML, screenshots) are kept out of the rows in a
+content-addressed directory (HISTORY_BLOB_DIR), one file per SHA-256, so a
+page or image seen in many scans is stored once.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse
+
+from scoring import risk_features, risk_label, score_features
+from urls import normalize_url
+
+HISTORY_DB = os.environ.get("HISTORY_DB", "")  # e.g. history.db
+HISTORY_BLOB_DIR = os.environ.get("HISTORY_BLOB_DIR", "history_blobs")
+HISTORY_PAGE_SIZE = int(os.environ.get("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.environ.get("HISTORY_MAX_PAGE_SIZE", "500"))
+
+LABELS = ("Safe", "Suspicious", "Dangerous", "Unknown")
+
+# Columns returned in listings; the full result JSON only comes with get()
+SUMMARY_COLUMNS = (
+    "id", "scanned_at", "source", "profile", "url", "normalized_url", "final_url",
+    "input_domain", "final_domain", "score", "tier", "label", "flagged",
+)
+
+
+class BlobStore:
+    """Files named by the SHA-256 of their content, fanned out by hash prefix."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes, compress: bool = False) -> str:
+        """Store `data` unless it is already there; returns its digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if path.exists() or path.with_suffix(".z").exists():
+            return digest
+        if compress:
+            data, path = zlib.compress(data, 6), path.with_suffix(".z")
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        return digest
+
+    def get(self, digest: str) -> bytes | None:
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            return None
+        path = self._path(digest)
+        if path.exists():
+            return path.read_bytes()
+        if path.with_suffix(".z").exists():
+            return zlib.decompress(path.with_suffix(".z").read_bytes())
+        return None
+
+
+class HistoryStore:
+    """Append-only scan log in SQLite plus a BlobStore for HTML and screenshots."""
+
+    def __init__(self, path: str, blob_dir: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS scans ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, scanned_at REAL NOT NULL, source TEXT NOT NULL,"
+            " profile TEXT, url TEXT NOT NULL, normalized_url TEXT NOT NULL, final_url TEXT NOT NULL,"
+            " input_domain TEXT NOT NULL, final_domain TEXT NOT NULL,"
+            " score NUMERIC, tier TEXT, label TEXT NOT NULL, flagged INTEGER NOT NULL,"
+            " features TEXT NOT NULL, result TEXT,"
+            " html_blob TEXT, screenshot_blob TEXT, screenshot_mime TEXT);"
+            "CREATE INDEX IF NOT EXISTS scans_normalized_url ON scans (normalized_url, id);"
+            "CREATE INDEX IF NOT EXISTS scans_input_domain ON scans (input_domain, id);"
+            "CREATE INDEX IF NOT EXISTS scans_final_domain ON scans (final_domain, id);"
+            "CREATE INDEX IF NOT EXISTS scans_label ON scans (label, id);"
+            "CREATE INDEX IF NOT EXISTS scans_scanned_at ON scans (scanned_at);"
+            "CREATE INDEX IF NOT EXISTS scans_flagged ON scans (id) WHERE flagged = 1;"
+        )
+        self._conn.commit()
+        self.blobs = BlobStore(blob_dir)
+
+    def record(self, url: str, data: dict, result: dict | None = None,
+               profile: str | None = None, source: str = "api") -> int:
+        """
+        Append one scan. `data` is the agent's output; `result` is the preview
+        response when the scan went through the API (the CLI has none, so the
+        heuristic score is used). Returns the new row id.
+        """
+        final_url = data.get("final_url") or url
+        features = risk_features(data, url)
+        risk = (result or {}).get("risk") or score_features(features)
+        label = risk_label(risk)
+        safe_browsing = (result or {}).get("safeBrowsing") or {}
+        flagged = label == "Dangerous" or safe_browsing.get("is_flagged") is True
+
+        html = data.get("html")
+        html_blob = self.blobs.put(html.encode("utf-8", "replace"), compress=True) if html else None
+        screenshot = data.get("screenshot")
+        screenshot_blob = self.blobs.put(screenshot["data"]) if screenshot else None
+
+        row = {
+            "scanned_at": time.time(),
+            "source": source,
+            "profile": profile,
+            "url": url,
+            "normalized_url": normalize_url(url) or url,
+            "final_url": final_url,
+            "input_domain": _domain(url),
+            "final_domain": _domain(final_url),
+            "score": risk.get("score"),
+            "tier": risk.get("tier"),
+            "label": label,
+            "flagged": int(flagged),
+            "features": json.dumps({k: v for k, v in features.items() if k not in ("finalDomain", "inputDomain")}),
+            "result": json.dumps(result) if result is not None else None,
+            "html_blob": html_blob,
+            "screenshot_blob": screenshot_blob,
+            "screenshot_mime": screenshot["mime_type"] if screenshot else None,
+        }
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT INTO scans ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})", tuple(row.values())
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def get(self, scan_id: int) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM scans WHERE id = ?", (scan_id,)).fetchone()
+        if row is None:
+            return None
+        scan = dict(row)
+        scan["flagged"] = bool(scan["flagged"])
+        scan["features"] = json.loads(scan["features"])
+        scan["result"] = json.loads(scan["result"]) if scan["result"] is not None else None
+        return scan
+
+    def _first_id_since(self, since: float) -> int | None:
+        row = self._conn.execute(
+            "SELECT id FROM scans WHERE scanned_at >= ? ORDER BY scanned_at LIMIT 1", (since,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _last_id_until(self, until: float) -> int | None:
+        row = self._conn.execute(
+            "SELECT id FROM scans WHERE scanned_at < ? ORDER BY scanned_at DESC LIMIT 1", (until,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def query(
+        self,
+        normalized_url: str | None = None,
+        domain: str | None = None,
+        final_domain: str | None = None,
+        redirected: bool = False,
+        label: str | None = None,
+        flagged: bool = False,
+        since: float | None = None,
+        until: float | None = None,
+        before: int | None = None,
+        limit: int = HISTORY_PAGE_SIZE,
+    ) -> dict:
+        """
+        Newest-first page of scan summaries matching every given filter.
+        `before` is the cursor from the previous page. Returns
+        {"items": [...], "next_cursor": id | None}.
+        """
+        limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+        where, params = [], []
+        if normalized_url is not None:
+            where.append("normalized_url = ?")
+            params.append(normalized_url)
+        if domain is not None:
+            where.append("input_domain = ?")
+            params.append(domain.lower().removeprefix("www."))
+        if final_domain is not None:
+            where.append("final_domain = ?")
+            params.append(final_domain.lower().removeprefix("www."))
+        if redirected:
+            where.append("input_domain != final_domain")
+        if label is not None:
+            where.append("label = ?")
+            params.append(label)
+        if flagged:
+            where.append("flagged = 1")
+
+        with self._lock:
+            # Time bounds become id bounds, which every (column, id) index covers
+            if since is not None:
+                first = self._first_id_since(since)
+                if first is None:
+                    return {"items": [], "next_cursor": None}
+                where.append("id >= ?")
+                params.append(first)
+            if until is not None:
+                last = self._last_id_until(until)
+                if last is None:
+                    return {"items": [], "next_cursor": None}
+                where.append("id <= ?")
+                params.append(last)
+            if before is not None:
+                where.append("id < ?")
+                params.append(before)
+            rows = self._conn.execute(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM scans"
+                f"{' WHERE ' + ' AND '.join(where) if where else ''}"
+                " ORDER BY id DESC LIMIT ?",
+                (*params, limit + 1),
+            ).fetchall()
+
+        items = [{**dict(row), "flagged": bool(row["flagged"])} for row in rows[:limit]]
+        return {"items": items, "next_cursor": items[-1]["id"] if len(rows) > limit else None}
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scans").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _domain(url: str) -> str:
+    # Host only: https://example.com:443/ and https://example.com/ are the same domain
+    return (urlparse(url).hostname or "").removeprefix("www.")
+
+
+_history: HistoryStore | None = None
+
+
+def get_history() -> HistoryStore | None:
+    """The process-wide history store, or None when HISTORY_DB is empty."""
+    global _history
+    if _history is None and HISTORY_DB:
+        _history = HistoryStore(HISTORY_DB, HISTORY_BLOB_DIR)
+    return _history
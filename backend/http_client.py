@@ -0,0 +1,82 @@
+"""
+Shared async HTTP client for upstream APIs.
+
+One client per process keeps TCP/TLS connections alive between requests to
+WhoisXML, Open PageRank, Safe Browsing and Gemini instead of paying a new
+handshake for every call. Every request through it is timed per upstream
+for /metrics; register_upstream() maps URL prefixes to upstream names.
+"""
+import os
+import time
+
+import httpx
+
+from metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+
+MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.environ.get("HTTP_MAX_KEEPALIVE", "20"))
+
+_client: httpx.AsyncClient | None = None
+# (url prefix, upstream name), longest prefix first
+_upstreams: list[tuple[str, str]] = []
+
+
+def register_upstream(name: str, base_url: str) -> None:
+    """Label requests under `base_url` as `name` in the upstream metrics."""
+    _upstreams.append((base_url, name))
+    _upstreams.sort(key=lambda item: len(item[0]), reverse=True)
+
+
+def upstream_name(url: str) -> str:
+    for prefix, name in _upstreams:
+        if url.startswith(prefix):
+            return name
+    return "other"
+
+
+class _TimedTransport(httpx.AsyncBaseTransport):
+    """Records latency and failures (transport errors, 5xx/429) per upstream."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        upstream = upstream_name(str(request.url))
+        started = time.monotonic()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            UPSTREAM_ERRORS.inc(upstream=upstream)
+            raise
+        finally:
+            UPSTREAM_SECONDS.observe(time.monotonic() - started, upstream=upstream)
+        if response.status_code >= 500 or response.status_code == 429:
+            UPSTREAM_ERRORS.inc(upstream=upstream)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            transport=_TimedTransport(httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                    keepalive_expiry=30,
+                ),
+            )),
+            timeout=10,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,403 @@
+"""
+Asynchronous scan jobs.
+
+POST /api/jobs enqueues a scan and returns immediately; a bounded pool of
+worker tasks claims queued jobs in submission order and runs them. Each job
+has a deadline counted from submission, can be cancelled while queued or
+running, and records stage events as partial results while it runs. When the
+queue is full, submit() raises QueueFull with a Retry-After estimate.
+
+Job state lives in a JobStore: in memory (default) or in SQLite, which keeps
+queued and finished jobs across restarts. SQLite calls run in a worker
+thread, and stage events are written in batches rather than one commit each.
+"""
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "memory").lower()
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "100"))
+JOB_DEADLINE = float(os.environ.get("JOB_DEADLINE", "120"))
+JOB_MAX_DEADLINE = float(os.environ.get("JOB_MAX_DEADLINE", "600"))
+# Share of a job's remaining time kept back so its partial result is recorded before the deadline
+JOB_DEADLINE_MARGIN = float(os.environ.get("JOB_DEADLINE_MARGIN", "0.05"))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", "3600"))
+PARTIAL_FLUSH_INTERVAL = float(os.environ.get("JOB_PARTIAL_FLUSH_INTERVAL", "0.25"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED, TIMED_OUT = (
+    "queued", "running", "succeeded", "failed", "cancelled", "timed_out"
+)
+FINISHED = {SUCCEEDED, FAILED, CANCELLED, TIMED_OUT}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def new_job(url: str, profile: str | None, force: bool, deadline: float) -> dict:
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "url": url,
+        "profile": profile,
+        "force": force,
+        "status": QUEUED,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "deadline_at": now + deadline,
+        "partial": {},
+        "result": None,
+        "error": None,
+    }
+
+
+class InMemoryJobStore:
+    """Jobs in a dict with a FIFO of queued ids; lost on restart."""
+
+    blocking = False  # cheap enough to call on the event loop
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._queue: deque = deque()
+
+    def create(self, job: dict) -> None:
+        self._jobs[job["id"]] = job
+        self._queue.append(job["id"])
+
+    def get(self, job_id: str) -> dict | None:
+        return self._jobs.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+
+    def set_partial(self, job_id: str, stage: str, payload) -> None:
+        self.set_partials(job_id, {stage: payload})
+
+    def set_partials(self, job_id: str, stages: dict) -> None:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job["partial"].update(stages)
+
+    def claim_next(self) -> dict | None:
+        """Mark the oldest queued job running and return it."""
+        while self._queue:
+            job = self._jobs.get(self._queue.popleft())
+            if job is not None and job["status"] == QUEUED:
+                job.update(status=RUNNING, started_at=time.time())
+                return job
+        return None
+
+    def count(self, status: str) -> int:
+        if status == QUEUED:
+            return sum(1 for job_id in self._queue if self._jobs.get(job_id, {}).get("status") == QUEUED)
+        return sum(1 for job in self._jobs.values() if job["status"] == status)
+
+    def requeue(self, job_id: str) -> None:
+        """Put a job interrupted by shutdown back at the front of the queue."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.update(status=QUEUED, started_at=None, partial={})
+            self._queue.appendleft(job_id)
+
+    def requeue_running(self) -> int:
+        return 0  # nothing survives a restart
+
+    def prune(self, finished_before: float) -> int:
+        old = [k for k, job in self._jobs.items() if job["status"] in FINISHED and job["finished_at"] < finished_before]
+        for job_id in old:
+            del self._jobs[job_id]
+        return len(old)
+
+
+class SQLiteJobStore:
+    """Jobs in a SQLite table; the table itself is the queue."""
+
+    JSON_FIELDS = ("partial", "result")
+    blocking = True  # JobManager calls it through asyncio.to_thread
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, url TEXT NOT NULL, profile TEXT, force INTEGER NOT NULL,"
+            " status TEXT NOT NULL, created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+            " deadline_at REAL NOT NULL, partial TEXT NOT NULL, result TEXT, error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(row)
+        job["force"] = bool(job["force"])
+        for name in self.JSON_FIELDS:
+            job[name] = json.loads(job[name]) if job[name] is not None else None
+        return job
+
+    def create(self, job: dict) -> None:
+        row = {**job, "force": int(job["force"])}
+        for name in self.JSON_FIELDS:
+            row[name] = json.dumps(job[name]) if job[name] is not None else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})", tuple(row.values())
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        for name in self.JSON_FIELDS:
+            if name in fields and fields[name] is not None:
+                fields[name] = json.dumps(fields[name])
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+            self._conn.commit()
+
+    def set_partial(self, job_id: str, stage: str, payload) -> None:
+        self.set_partials(job_id, {stage: payload})
+
+    def set_partials(self, job_id: str, stages: dict) -> None:
+        """Write several stage results in one statement and one commit."""
+        args = []
+        for stage, payload in stages.items():
+            args += [f'$."{stage}"', json.dumps(payload)]
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET partial = json_set(partial, {', '.join('?, json(?)' for _ in stages)}) WHERE id = ?",
+                (*args, job_id),
+            )
+            self._conn.commit()
+
+    def claim_next(self) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ("
+                " SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) RETURNING *",
+                (RUNNING, time.time(), QUEUED),
+            ).fetchone()
+            self._conn.commit()
+        return self._row_to_job(row) if row is not None else None
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def requeue(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, partial = '{}' WHERE id = ?", (QUEUED, job_id)
+            )
+            self._conn.commit()
+
+    def requeue_running(self) -> int:
+        """Jobs left running by a previous process go back in the queue."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, partial = '{}' WHERE status = ?", (QUEUED, RUNNING)
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+    def prune(self, finished_before: float) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' for _ in FINISHED)}) AND finished_at < ?",
+                (*FINISHED, finished_before),
+            )
+            self._conn.commit()
+            return cur.rowcount
+
+
+def make_job_store(backend: str = JOB_BACKEND):
+    if backend == "sqlite":
+        return SQLiteJobStore(JOB_DB_PATH)
+    if backend == "memory":
+        return InMemoryJobStore()
+    raise ValueError(f"Unknown JOB_BACKEND '{backend}' (expected memory or sqlite)")
+
+
+class JobManager:
+    """Bounded worker pool over a JobStore. `runner(job, emit)` does the work."""
+
+    def __init__(self, runner, store=None, workers: int = JOB_WORKERS, max_queued: int = JOB_QUEUE_LIMIT):
+        self.runner = runner
+        self.store = store if store is not None else make_job_store()
+        self.workers = workers
+        self.max_queued = max_queued
+        self._wakeup = asyncio.Event()
+        self._worker_tasks: list[asyncio.Task] = []
+        self._running: dict[str, asyncio.Task] = {}
+        self._avg_duration = 30.0  # seconds, refined as jobs finish
+        self.completed = 0
+        self.rejected = 0
+
+    async def _io(self, fn, *args, **kwargs):
+        """Call a store method, in a worker thread if the store blocks."""
+        if getattr(self.store, "blocking", False):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return fn(*args, **kwargs)
+
+    async def start(self) -> None:
+        await self._io(self.store.requeue_running)
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def retry_after(self, queued: int) -> int:
+        """Rough seconds until a queue slot frees up with `queued` jobs waiting."""
+        return max(1, math.ceil(self._avg_duration * max(queued, 1) / max(self.workers, 1)))
+
+    def _admit(self, url: str, profile: str | None, force: bool, deadline: float | None) -> dict:
+        self.store.prune(time.time() - JOB_RETENTION)
+        queued = self.store.count(QUEUED)
+        if queued >= self.max_queued:
+            self.rejected += 1
+            raise QueueFull(self.retry_after(queued))
+        deadline = min(deadline or JOB_DEADLINE, JOB_MAX_DEADLINE)
+        job = new_job(url, profile, force, deadline)
+        self.store.create(job)
+        return job
+
+    async def submit(
+        self, url: str, profile: str | None = None, force: bool = False, deadline: float | None = None
+    ) -> dict:
+        """Queue a job; raises QueueFull when max_queued jobs are already waiting."""
+        job = await self._io(self._admit, url, profile, force, deadline)
+        self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> dict | None:
+        return await self._io(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> dict | None:
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        job = await self.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()  # the worker records the cancellation
+        else:
+            await self._io(self.store.update, job_id, status=CANCELLED, finished_at=time.time())
+        return await self.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._io(self.store.claim_next)
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        job_id = job["id"]
+        remaining = job["deadline_at"] - time.time()
+        if remaining <= 0:
+            fields = {"status": TIMED_OUT, "finished_at": time.time(), "error": "Deadline passed while queued"}
+            await self._io(self.store.update, job_id, **fields)
+            return
+
+        skipped: list[str] = []
+        pending: dict = {}
+        finishing = asyncio.Event()
+        flusher: asyncio.Task | None = None
+
+        async def flush_partials() -> None:
+            # Events arriving within one interval share a single write
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(finishing.wait(), PARTIAL_FLUSH_INTERVAL)
+            while pending:
+                batch = dict(pending)
+                pending.clear()
+                await self._io(self.store.set_partials, job_id, batch)
+
+        def emit(stage: str, payload) -> None:
+            nonlocal flusher
+            if finishing.is_set():
+                return
+            if stage == "skipped":
+                # One event per stage the deadline cut off; keep all of them
+                skipped.append(payload["stage"])
+                payload = list(skipped)
+            if not getattr(self.store, "blocking", False):
+                self.store.set_partial(job_id, stage, payload)
+                return
+            pending[stage] = payload
+            if flusher is None or flusher.done():
+                flusher = asyncio.create_task(flush_partials())
+
+        async def stop_flushing(keep_pending: bool = True) -> None:
+            finishing.set()
+            if not keep_pending:
+                pending.clear()
+            if flusher is not None:
+                await asyncio.gather(flusher, return_exceptions=True)
+
+        task = asyncio.create_task(self.runner(job, emit))
+        self._running[job_id] = task
+        started = time.monotonic()
+        try:
+            done, _ = await asyncio.wait({task}, timeout=remaining)
+        except asyncio.CancelledError:
+            # Worker shutdown: stop the job and leave it for the next start
+            task.cancel()
+            await stop_flushing(keep_pending=False)
+            await self._io(self.store.requeue, job_id)
+            raise
+        finally:
+            self._running.pop(job_id, None)
+
+        if not done:
+            task.cancel()
+            fields = {"status": TIMED_OUT, "error": "Job deadline exceeded"}
+        elif task.cancelled():
+            fields = {"status": CANCELLED}
+        elif task.exception() is not None:
+            error = task.exception()
+            fields = {"status": FAILED, "error": getattr(error, "detail", None) or str(error)}
+        else:
+            fields = {"status": SUCCEEDED, "result": task.result()}
+            self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - started)
+            self.completed += 1
+        await stop_flushing()
+        await self._io(self.store.update, job_id, finished_at=time.time(), **fields)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.store.count(QUEUED),
+            "running": len(self._running),
+            "maxQueued": self.max_queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avgJobSeconds": round(self._avg_duration, 1),
+        }
@@ -0,0 +1,468 @@
+"""
+Lookalike-domain and brand-impersonation checks.
+
+Every index is built once from a list of brands and their real domains
+(BRANDS, extended by the JSON file at LOOKALIKE_BRANDS_PATH), so checking a
+URL is a handful of dict lookups and one pass over the host:
+
+- skeletons: each domain name reduced to a confusable-free "skeleton"
+  (Cyrillic/Greek homoglyphs, accents, 0/1/3/5 for o/l/e/s, rn for m, ...).
+  A domain with a brand's skeleton but other letters (paypa1.com, an IDN
+  such as xn--pypal-4ve.com, decoded from punycode first) imitates it.
+- a symmetric-delete index over the skeletons finds names within one or
+  two edits of a brand, swapped letters included (amazom.com, paypla.com).
+  Ordinary words that happen to be that close (finance, discard) are not
+  hits, and two edits only count together with a credential cue in the URL
+  (login, verify, account, ...) or a punycode host.
+- an Aho-Corasick automaton over the brand keywords finds brand names
+  inside other domains and in URL paths (paypal-login.xyz). A brand in the
+  path needs a credential cue too (/paypal/verify), and "sign in with"
+  and OAuth callback paths (/auth/facebook/callback) don't count.
+
+Nothing on a brand's own domains, its infrastructure (INFRASTRUCTURE,
+e.g. amazonaws.com) or its other sites (OWNED_DOMAINS, e.g. googleblog.com)
+is flagged. The brand name under another suffix
+(amazon.de) isn't flagged either: big brands own most country domains.
+IP hosts have no domain name to compare, only their path is checked.
+"""
+import codecs
+import json
+import os
+import re
+import unicodedata
+from collections import deque
+from urllib.parse import urlparse
+
+LOOKALIKE_BRANDS_PATH = os.environ.get("LOOKALIKE_BRANDS_PATH", "")
+# Shorter names than this only match exactly (by skeleton), never by edit distance
+MIN_FUZZY_LENGTH = 6
+# Shorter keywords than this must be a whole token (chase-bank.com) rather than a substring (pineapple)
+MIN_SUBSTRING_KEYWORD = 6
+
+# Often impersonated brands: keyword -> domains the brand really uses
+BRANDS = {
+    "paypal": ("paypal.com", "paypal.me"),
+    "apple": ("apple.com",),
+    "icloud": ("icloud.com",),
+    "microsoft": ("microsoft.com", "microsoftonline.com", "office.com", "live.com"),
+    "outlook": ("outlook.com",),
+    "google": ("google.com",),
+    "gmail": ("gmail.com",),
+    "youtube": ("youtube.com", "youtu.be"),
+    "amazon": ("amazon.com", "amazon.co.uk", "amazon.de", "amazon.fr", "amazon.in", "amazon.co.jp"),
+    "facebook": ("facebook.com", "fb.com"),
+    "instagram": ("instagram.com",),
+    "whatsapp": ("whatsapp.com",),
+    "messenger": ("messenger.com",),
+    "netflix": ("netflix.com",),
+    "linkedin": ("linkedin.com",),
+    "twitter": ("twitter.com", "x.com"),
+    "dropbox": ("dropbox.com",),
+    "docusign": ("docusign.com", "docusign.net"),
+    "adobe": ("adobe.com",),
+    "ebay": ("ebay.com", "ebay.co.uk", "ebay.de"),
+    "chase": ("chase.com",),
+    "wellsfargo": ("wellsfargo.com",),
+    "bankofamerica": ("bankofamerica.com",),
+    "citibank": ("citibank.com", "citi.com"),
+    "americanexpress": ("americanexpress.com",),
+    "capitalone": ("capitalone.com",),
+    "hsbc": ("hsbc.com", "hsbc.co.uk"),
+    "barclays": ("barclays.co.uk", "barclays.com"),
+    "santander": ("santander.com", "santander.co.uk"),
+    "coinbase": ("coinbase.com",),
+    "binance": ("binance.com",),
+    "metamask": ("metamask.io",),
+    "steam": ("steampowered.com", "steamcommunity.com"),
+    "roblox": ("roblox.com",),
+    "discord": ("discord.com", "discord.gg"),
+    "telegram": ("telegram.org",),
+    "spotify": ("spotify.com",),
+    "yahoo": ("yahoo.com",),
+    "dhl": ("dhl.com", "dhl.de"),
+    "fedex": ("fedex.com",),
+    "usps": ("usps.com",),
+    "walmart": ("walmart.com",),
+    "costco": ("costco.com",),
+    "aliexpress": ("aliexpress.com",),
+    "venmo": ("venmo.com",),
+    "cashapp": ("cash.app",),
+    "zelle": ("zellepay.com",),
+    "github": ("github.com",),
+    "shopify": ("shopify.com",),
+    "norton": ("norton.com",),
+    "mcafee": ("mcafee.com",),
+    "quickbooks": ("quickbooks.intuit.com", "intuit.com"),
+    "airbnb": ("airbnb.com",),
+}
+
+# First-party domains a brand serves content, APIs and sign-in from. They are
+# never flagged, but nobody types them, so they aren't typo targets.
+INFRASTRUCTURE = {
+    "paypal": ("paypalobjects.com", "paypal-community.com"),
+    "apple": ("apple-cloudkit.com", "apple-dns.net"),
+    "icloud": ("icloud-content.com",),
+    "microsoft": ("microsoftstore.com", "microsoftazuread-sso.com", "microsoftonline-p.com"),
+    "google": (
+        "googleapis.com", "googleusercontent.com", "googlevideo.com", "googletagmanager.com",
+        "google-analytics.com", "googlesyndication.com", "googleadservices.com", "gstatic.com",
+    ),
+    "youtube": ("youtube-nocookie.com", "ytimg.com"),
+    "amazon": ("amazonaws.com", "amazontrust.com", "amazonpay.com"),
+    "facebook": ("facebook.net", "fbcdn.net"),
+    "instagram": ("cdninstagram.com",),
+    "whatsapp": ("whatsapp.net",),
+    "netflix": ("netflix.net",),
+    "dropbox": ("dropboxusercontent.com", "dropboxapi.com"),
+    "discord": ("discordapp.com", "discordapp.net"),
+    "spotify": ("spotifycdn.com",),
+    "github": ("githubusercontent.com", "githubassets.com", "github.io"),
+    "shopify": ("myshopify.com", "shopifycdn.com"),
+}
+
+# Product, regional and corporate sites a brand runs under a name containing
+# its keyword. Like INFRASTRUCTURE they are never flagged and aren't typo targets.
+OWNED_DOMAINS = {
+    "microsoft": ("microsoft365.com", "microsoftedge.com", "microsoftedgeinsider.com"),
+    "google": ("googleblog.com", "googlemail.com", "googlesource.com", "googledomains.com", "withgoogle.com"),
+    "youtube": ("youtubekids.com",),
+    "amazon": ("aboutamazon.com",),
+    "adobe": ("adobelogin.com", "adobestock.com"),
+    "github": ("githubstatus.com", "githubapp.com"),
+    "discord": ("discordstatus.com",),
+    "wellsfargo": ("wellsfargoadvisors.com", "wellsfargomedia.com"),
+    "capitalone": ("capitalone360.com",),
+    "costco": ("costcotravel.com", "costcobusinessdelivery.com"),
+    "walmart": ("walmartimages.com",),
+    "binance": ("binanceus.com",),
+    "yahoo": ("yahooinc.com",),
+    "quickbooks": ("quickbooksonline.com",),
+    "norton": ("nortonlifelock.com",),
+}
+
+# Ordinary words within an edit or two of a brand name (finance / binance).
+# A domain named after one of these is not a typo of the brand.
+COMMON_WORDS = frozenset({
+    "finance", "passenger", "passengers", "messengers", "discard", "discords", "twister",
+    "twisters", "titter", "twitted", "morton", "horton", "gorton", "goggle", "goggles",
+    "googly", "telegraph", "telegrams", "amazons",
+})
+
+# Words of a login / account-recovery page: the second signal a fuzzy or path hit needs
+CREDENTIAL_CUES = re.compile(
+    r"log[-_]?[io]n|sign[-_]?[io]n|verif|account|password|unlock|confirm|billing|wallet|recover"
+)
+# "Sign in with <brand>" buttons and OAuth routes name the brand legitimately
+SOCIAL_LOGIN = re.compile(r"(with|auth|oauth2?|connect|social|sso)[-_/]$")
+
+# Two-label public suffixes, so the registrable name of shop.amazon.co.uk is "amazon"
+MULTI_PART_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "com.au", "net.au", "org.au", "co.jp", "co.nz",
+    "co.in", "co.kr", "co.za", "com.br", "com.mx", "com.cn", "com.tr", "com.sg", "com.ar",
+}
+
+# Characters that render like a Latin letter or digit, mapped to it (after NFKD)
+CONFUSABLES = {
+    # Cyrillic
+    "а": "a", "в": "b", "е": "e", "ё": "e", "к": "k", "м": "m", "н": "h", "о": "o", "р": "p",
+    "с": "c", "т": "t", "у": "y", "х": "x", "ѕ": "s", "і": "i", "ї": "i", "ј": "j", "һ": "h",
+    "ԁ": "d", "ԛ": "q", "ԝ": "w", "ь": "b", "п": "n", "г": "r", "ӏ": "l",
+    # Greek
+    "α": "a", "β": "b", "ε": "e", "η": "n", "ι": "i", "κ": "k", "ν": "v", "ο": "o", "ρ": "p",
+    "τ": "t", "υ": "u", "χ": "x", "ω": "w",
+    # Latin look-alikes
+    "ı": "i", "ɡ": "g", "ɑ": "a", "ſ": "s", "ł": "l", "ø": "o", "đ": "d", "ħ": "h",
+    # Digits, and i / l which are hard to tell apart in many fonts
+    "0": "o", "1": "l", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "i": "l", "|": "l",
+}
+MULTI_CHAR_CONFUSABLES = (("rn", "m"), ("vv", "w"))
+
+
+def skeleton(text: str) -> str:
+    """Lowercase form with accents dropped and every confusable replaced by its prototype."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(CONFUSABLES.get(c, c) for c in text if not unicodedata.combining(c))
+    for sequence, prototype in MULTI_CHAR_CONFUSABLES:
+        text = text.replace(sequence, prototype)
+    return text
+
+
+def decode_host(host: str) -> tuple[str, bool]:
+    """Host with punycode labels decoded; the flag says whether any were."""
+    labels, decoded = [], False
+    for label in host.split("."):
+        if label.startswith("xn--"):
+            try:
+                # Plain punycode, not the idna codec: we only need the Unicode
+                # form to compare, and idna's nameprep round trip costs 10x more
+                label = label[4:].encode("ascii").decode("punycode")
+                decoded = True
+            except UnicodeError:
+                pass
+        labels.append(label)
+    return ".".join(labels), decoded
+
+
+def split_host(host: str) -> tuple[list[str], str, str]:
+    """(subdomain labels, registrable name, public suffix) for a host name."""
+    labels = host.removeprefix("www.").split(".")
+    suffix_len = 2 if len(labels) > 2 and ".".join(labels[-2:]) in MULTI_PART_SUFFIXES else 1
+    if len(labels) <= suffix_len:
+        return [], labels[0], ""
+    return labels[:-suffix_len - 1], labels[-suffix_len - 1], ".".join(labels[-suffix_len:])
+
+
+def levenshtein(a: str, b: str, limit: int | None = None) -> int:
+    """Edit distance; with `limit`, anything above it comes back as limit + 1."""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def swaps(word: str):
+    """Every variant of word with two adjacent letters swapped."""
+    for i in range(len(word) - 1):
+        if word[i] != word[i + 1]:
+            yield word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def deletions(word: str, depth: int) -> set[str]:
+    """word and every string made by deleting up to `depth` of its characters."""
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+class DeletionIndex:
+    """
+    Symmetric-delete index (as in SymSpell) for near matches. Two words
+    within n edits share a string reachable by deleting at most n characters
+    from each, so a search is a few dict probes plus an exact check of the
+    handful of candidates, instead of a distance computation per stored word.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._words: dict[str, list] = {}
+        self._deletes: dict[str, set] = {}
+        self._shortest, self._longest = 0, 0
+
+    def add(self, word: str, value) -> None:
+        self._words.setdefault(word, []).append(value)
+        for variant in deletions(word, self.max_distance):
+            self._deletes.setdefault(variant, set()).add(word)
+        self._shortest = min(self._shortest, len(word)) if self._longest else len(word)
+        self._longest = max(self._longest, len(word))
+
+    def search(self, word: str, radius: int) -> list[tuple[int, str, list]]:
+        """(distance, word, values) for every stored word at most `radius` (<= max_distance) edits away."""
+        if not self._words or len(word) + radius < self._shortest or len(word) - radius > self._longest:
+            return []
+        candidates = set()
+        for variant in deletions(word, radius):
+            words = self._deletes.get(variant)
+            if words:
+                candidates |= words
+        found = []
+        for candidate in candidates:
+            distance = levenshtein(word, candidate, radius)
+            if distance <= radius:
+                found.append((distance, candidate, self._words[candidate]))
+        return found
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton: every keyword occurrence in one pass over a text."""
+
+    def __init__(self, keywords):
+        self._goto: list[dict] = [{}]
+        self._fail = [0]
+        self._out: list[list[str]] = [[]]
+        for keyword in keywords:
+            state = 0
+            for c in keyword:
+                if c not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][c] = len(self._goto) - 1
+                state = self._goto[state][c]
+            self._out[state].append(keyword)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, target in self._goto[state].items():
+                queue.append(target)
+                fail = self._fail[state]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[target] = self._goto[fail].get(c, 0)
+                self._out[target] = self._out[target] + self._out[self._fail[target]]
+
+    def find(self, text: str) -> list[tuple[int, int, str]]:
+        """(start, end, keyword) for every occurrence, overlapping ones included."""
+        matches = []
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(c, 0)
+            for keyword in self._out[state]:
+                matches.append((i + 1 - len(keyword), i + 1, keyword))
+        return matches
+
+
+def _is_token(text: str, start: int, end: int) -> bool:
+    """Whether text[start:end] is bounded by non-letters (or the ends of text)."""
+    return (start == 0 or not text[start - 1].isalpha()) and (end == len(text) or not text[end].isalpha())
+
+
+def _social_login(path: str, start: int) -> bool:
+    """Whether the brand at path[start:] names a sign-in provider rather than the site."""
+    return bool(SOCIAL_LOGIN.search(path[:start])) or "oauth" in path or "callback" in path
+
+
+class LookalikeDetector:
+    """Precomputed indexes over a brand list; check() scans one URL."""
+
+    def __init__(self, brands: dict[str, tuple], infrastructure: dict[str, tuple] | None = None):
+        self.brands = {brand: tuple(domains) for brand, domains in brands.items()}
+        self.owner: dict[str, set] = {}  # registrable domain -> brands it belongs to
+        self.skeletons: dict[str, list] = {}  # skeleton -> [(brand, domain, name)]
+        self.near = DeletionIndex(max_distance=2)
+        for brand, domains in self.brands.items():
+            for domain in domains:
+                _, name, suffix = split_host(domain)
+                self.owner.setdefault(f"{name}.{suffix}", set()).add(brand)
+                key = skeleton(name).replace("-", "")
+                entry = (brand, domain, name)
+                if entry not in self.skeletons.get(key, []):
+                    self.skeletons.setdefault(key, []).append(entry)
+                    if len(key) >= MIN_FUZZY_LENGTH:
+                        self.near.add(key, entry)
+        owned = (INFRASTRUCTURE, OWNED_DOMAINS) if infrastructure is None else (infrastructure,)
+        for brand, domains in (item for table in owned for item in table.items()):
+            for domain in domains:
+                _, name, suffix = split_host(domain)
+                self.owner.setdefault(f"{name}.{suffix}", set()).add(brand)
+        self.keywords = {skeleton(brand): brand for brand in self.brands}
+        codecs.lookup("punycode")  # load the codec now rather than on the first IDN host
+        self.host_matcher = KeywordMatcher(self.keywords)
+        self.path_matcher = KeywordMatcher(self.brands)
+
+    def check(self, url: str) -> list[dict]:
+        """
+        Impersonation hits for a URL, at most one per (kind, brand). Kinds:
+        homoglyph, typo (the domain name), brandInDomain, brandInPath.
+        """
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").rstrip(".")
+        if not host:
+            return []
+        ip_host = host.replace(".", "").isdigit() or ":" in host
+        decoded, punycode = (host, False) if ip_host else decode_host(host)
+        subdomains, name, suffix = split_host(decoded)
+        if not ip_host and f"{name}.{suffix}" in self.owner:
+            return []  # a brand's own site (or another known brand's)
+        path = parsed.path.lower()
+        cue = punycode or bool(CREDENTIAL_CUES.search(decoded) or CREDENTIAL_CUES.search(path))
+
+        hits: dict[tuple, dict] = {}
+
+        def hit(kind: str, brand: str, **details) -> None:
+            if kind == "typo" and ("homoglyph", brand) in hits:
+                return
+            if (kind, brand) not in hits:
+                hits[(kind, brand)] = {"kind": kind, "brand": brand, "host": decoded, "punycode": punycode, **details}
+
+        if not ip_host:
+            self._check_name(subdomains, name, cue, hit)
+        for start, end, brand in self.path_matcher.find(path):
+            if len(brand) >= MIN_SUBSTRING_KEYWORD or _is_token(path, start, end):
+                if cue and not _social_login(path, start):
+                    hit("brandInPath", brand, imitates=self.brands[brand][0])
+        return list(hits.values())
+
+    def _check_name(self, subdomains: list[str], name: str, cue: bool, hit) -> None:
+        """Homoglyph, typo and brandInDomain hits for the domain name."""
+        key = skeleton(name).replace("-", "")
+        found = set()  # brands already matched by the name itself
+        for brand, domain, brand_name in self.skeletons.get(key, []):
+            if name != brand_name:
+                hit("homoglyph", brand, imitates=domain)
+                found.add(brand)
+        if len(key) >= MIN_FUZZY_LENGTH and name.replace("-", "") not in COMMON_WORDS:
+            for distance, _, entries in self.near.search(key, 1 if len(key) < 9 else 2):
+                if distance == 0 or (distance == 2 and not cue):
+                    continue  # same skeleton is handled above; two edits alone are too common
+                for brand, domain, _ in entries:
+                    hit("typo", brand, imitates=domain, distance=distance)
+                    found.add(brand)
+            # Levenshtein counts a swapped pair as two edits; look those up directly
+            for swapped in swaps(key):
+                for brand, domain, _ in self.skeletons.get(swapped, []):
+                    hit("typo", brand, imitates=domain, distance=1)
+                    found.add(brand)
+
+        host_text = skeleton(".".join(subdomains + [name]))
+        for start, end, keyword in self.host_matcher.find(host_text):
+            brand = self.keywords[keyword]
+            if len(keyword) >= MIN_SUBSTRING_KEYWORD or _is_token(host_text, start, end):
+                if brand not in found and name != brand:
+                    hit("brandInDomain", brand, imitates=self.brands[brand][0])
+
+
+def load_brands(path: str = LOOKALIKE_BRANDS_PATH) -> dict[str, tuple]:
+    """BRANDS plus any {brand: [domains]} from the JSON file at path."""
+    brands = dict(BRANDS)
+    if path:
+        with open(path) as f:
+            brands.update({brand.lower(): tuple(domains) for brand, domains in json.load(f).items()})
+    return brands
+
+
+_detector: LookalikeDetector | None = None
+
+
+def get_detector() -> LookalikeDetector:
+    """The process-wide detector; the app builds it at startup, anything else on first use."""
+    global _detector
+    if _detector is None:
+        _detector = LookalikeDetector(load_brands())
+    return _detector
+
+
+def brand_hits(*urls: str) -> list[dict]:
+    """Hits over several URLs of one scan (e.g. input and final URL), de-duplicated."""
+    hits = {}
+    for url in urls:
+        for found in get_detector().check(url):
+            hits.setdefault((found["kind"], found["brand"]), found)
+    return list(hits.values())
+
+
+def hit_reason(found: dict) -> str:
+    """Risk reason text for one hit."""
+    host = found["host"] + (" (punycode)" if found["punycode"] else "")
+    if found["kind"] == "homoglyph":
+        return f"Domain {host} imitates {found['imitates']} with look-alike characters"
+    if found["kind"] == "typo":
+        edits = "one edit" if found["distance"] == 1 else f"{found['distance']} edits"
+        return f"Domain {host} is {edits} away from {found['imitates']}"
+    if found["kind"] == "brandInDomain":
+        return f"Brand name \"{found['brand']}\" in {host}, which is not {found['imitates']}"
+    return f"Brand name \"{found['brand']}\" in the URL path of {host}, which is not {found['imitates']}"
@@ -1,24 +1,78 @@
 import asyncio
 import base64
+import hashlib
 import os
-import tempfile
+from contextlib import asynccontextmanager
 from datetime import datetime
 from urllib.parse import urlparse
 
 import json
 import logging
 import re
-import requests
+import time
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from agent import analyze_url
-
+# Load .env before importing modules that read their settings at import time
 load_dotenv()
 
-app = FastAPI(title="LinkScout API")
+from agent import analyze_url_async
+from browser_pool import BrowserPool
+from cache import LookupCache, LookupUnavailable, ResultCache, get_store
+from capture import resolve_profile
+from deadlines import Deadline
+from extractor import features_for
+from history import LABELS, get_history
+from http_client import close_client, get_client, register_upstream
+from jobs import FINISHED, JOB_DEADLINE_MARGIN, JOB_MAX_DEADLINE, JobManager, QueueFull
+from lookalike import get_detector, hit_reason
+import metrics
+from responses import CompressionMiddleware, FastJSONResponse, dumps
+from safe_browsing import get_threat_db
+from scan_workers import SCAN_WORKERS, ScanWorkerPool
+from scoring import risk_features, risk_label, score_batch, score_features, url_features
+from screenshots import STORE_TTL, ScreenshotStore
+from singleflight import SingleFlight
+from urls import ensure_scheme, normalize_url
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep warm browsers around for the lifetime of the process: in this
+    # process, or in SCAN_WORKERS separate worker processes
+    if SCAN_WORKERS > 0:
+        pool = ScanWorkerPool()
+        app.state.browser_pool = None
+        app.state.scan_workers = pool
+    else:
+        pool = BrowserPool()
+        app.state.browser_pool = pool
+        app.state.scan_workers = None
+    await pool.start()
+    await job_manager.start()
+    # Build the lookalike indexes now so the first scan doesn't pay for them
+    get_detector()
+    # Local Safe Browsing lists, kept current in the background
+    threat_db = get_threat_db()
+    update_task = asyncio.create_task(threat_db.update_loop()) if threat_db is not None else None
+    try:
+        yield
+    finally:
+        if update_task is not None:
+            update_task.cancel()
+        await job_manager.stop()
+        await pool.close()
+        await close_client()
+        if get_store() is not None:
+            await asyncio.to_thread(get_store().close)  # flushes queued lookup-cache writes
+
+
+app = FastAPI(title="LinkScout API", lifespan=lifespan, default_response_class=FastJSONResponse)
+app.add_middleware(CompressionMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -28,30 +82,170 @@ app.add_middleware(
 )
 
 
+# WHOIS and PageRank only depend on the domain and change over days
+whois_cache = LookupCache(
+    "whois", ttl=float(os.environ.get("WHOIS_CACHE_TTL", str(7 * 24 * 3600))), store=get_store()
+)
+pagerank_cache = LookupCache(
+    "pagerank", ttl=float(os.environ.get("PAGERANK_CACHE_TTL", str(3 * 24 * 3600))), store=get_store()
+)
+# Gemini privacy analyses, keyed by a hash of the normalized policy text so a
+# policy shared across sites/subdomains is analyzed once. Failures aren't kept.
+privacy_analysis_cache = LookupCache(
+    "privacyAnalysis",
+    ttl=float(os.environ.get("PRIVACY_ANALYSIS_CACHE_TTL", str(30 * 24 * 3600))),
+    negative_ttl=0,
+    store=get_store(),
+)
+
+# Full preview responses, keyed by capture profile and normalized URL
+result_cache = ResultCache(
+    fresh_for=float(os.environ.get("RESULT_CACHE_FRESH", "300")),
+    stale_for=float(os.environ.get("RESULT_CACHE_STALE", "3600")),
+    max_entries=int(os.environ.get("RESULT_CACHE_SIZE", "200")),
+)
+_background_tasks: set[asyncio.Task] = set()
+# Concurrent requests for the same normalized URL share one scan
+scan_flight = SingleFlight("scans")
+
+# Outlive cached results so their screenshot references keep resolving
+screenshot_store = ScreenshotStore(ttl=max(result_cache.stale_for, STORE_TTL))
+
+
 class PreviewRequest(BaseModel):
     url: str
+    force: bool = False
+    profile: str | None = None  # capture profile: "full" (default) or "fast"
+    timings: bool = False  # include per-stage timings (ms) in the response
+    fields: list[str] | None = None  # only compute and return these PREVIEW_FIELDS
+    # Whole-preview deadline: default SCAN_DEADLINE, must be > 0, clamped to SCAN_MAX_DEADLINE
+    deadlineSeconds: float | None = None
+
+
+class BatchPreviewRequest(BaseModel):
+    urls: list[str]
+    force: bool = False
+    profile: str | None = None
+    timings: bool = False
+    fields: list[str] | None = None
+    deadlineSeconds: float | None = None  # per URL, not counting time queued behind others; as above
+
+
+class TriageRequest(BaseModel):
+    urls: list[str]
+
+
+class JobRequest(BaseModel):
+    url: str
+    force: bool = False
+    profile: str | None = None
+    deadlineSeconds: float | None = None  # default JOB_DEADLINE, must be > 0, clamped to JOB_MAX_DEADLINE
+
+
+# Upstream endpoints; overridable so benchmarks can point them at local stubs
+WHOIS_API_URL = os.environ.get("WHOIS_API_URL", "https://www.whoisxmlapi.com/whoisserver/WhoisService")
+PAGERANK_API_URL = os.environ.get("PAGERANK_API_URL", "https://openpagerank.com/api/v1.0/getPageRank")
+SAFE_BROWSING_API_URL = os.environ.get("SAFE_BROWSING_API_URL", "https://safebrowsing.googleapis.com/v4")
+GEMINI_API_URL = os.environ.get(
+    "GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash"
+)
+register_upstream("whois", WHOIS_API_URL)
+register_upstream("pageRank", PAGERANK_API_URL)
+register_upstream("safeBrowsing", SAFE_BROWSING_API_URL)
+register_upstream("gemini", GEMINI_API_URL)
+
+MAX_BATCH_URLS = int(os.environ.get("MAX_BATCH_URLS", "500"))
+MAX_TRIAGE_URLS = int(os.environ.get("MAX_TRIAGE_URLS", "10000"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))  # browser scans at once
+# Enrichment (WHOIS, Gemini, ...) of finished scans at once; separate from the browser limit
+BATCH_UPSTREAM_CONCURRENCY = int(os.environ.get("BATCH_UPSTREAM_CONCURRENCY", "8"))
+# Scans finishing within this many seconds of each other share one bulk Safe Browsing / PageRank call
+BATCH_LOOKUP_WINDOW = float(os.environ.get("BATCH_LOOKUP_WINDOW", "0.05"))
 
 
 @app.get("/health")
 def health():
-    return {"ok": True}
+    pool, workers = app.state.browser_pool, app.state.scan_workers
+    return {
+        "ok": True,
+        "browserPool": pool.stats() if pool else None,
+        "scanWorkers": workers.stats() if workers else None,
+        "jobs": job_manager.stats(),
+        "safeBrowsingDb": get_threat_db().stats() if get_threat_db() else None,
+    }
 
 
-def fetch_whois(domain: str) -> dict | None:
-    """Call the WhoisXML API and return the raw JSON, or None on failure."""
-    api_key = os.environ.get("WHOIS_API_KEY", "")
-    if not api_key:
-        return None
+def _pool_usage() -> dict:
+    """Browser pool gauges, summed over scan workers when they are enabled."""
+    pool, workers = app.state.browser_pool, app.state.scan_workers
+    if workers is not None:
+        pools = [w["browserPool"] for w in workers.stats()["perWorker"] if w["browserPool"]]
+    else:
+        pools = [pool.stats()] if pool is not None else []
+    return {
+        (field,): sum(p.get(field, 0) for p in pools)
+        for field in ("size", "alive", "busy", "maxConcurrent", "queued")
+    }
+
+
+metrics.Gauge("safelink_browser_pool", "Browser pool usage", ("state",), collect=_pool_usage)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    return {
+        "whois": whois_cache.stats(),
+        "pageRank": pagerank_cache.stats(),
+        "privacyAnalysis": privacy_analysis_cache.stats(),
+        "results": result_cache.stats(),
+        "screenshots": screenshot_store.stats(),
+        "coalescing": {"scans": scan_flight.stats()},
+    }
+
+
+@app.get("/api/screenshots/{screenshot_id}")
+def get_screenshot(screenshot_id: str, request: Request):
+    item = screenshot_store.get(screenshot_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found or expired")
+    data, mime_type = item
+    # Ids are content hashes, so a given URL never changes, but it only
+    # resolves until the store expires the image: cache it no longer than that
+    max_age = int(screenshot_store.expires_in(screenshot_id))
+    headers = {"Cache-Control": f"public, max-age={max_age}, immutable", "ETag": f'"{screenshot_id}"'}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=data, media_type=mime_type, headers=headers)
+
+
+async def fetch_whois(domain: str) -> dict:
+    """
+    Call the WhoisXML API and return the raw JSON. Timeouts, network errors,
+    rate limiting and 5xx answers raise LookupUnavailable so they aren't
+    cached as "no record".
+    """
     try:
-        resp = requests.get(
-            "https://www.whoisxmlapi.com/whoisserver/WhoisService",
-            params={"apiKey": api_key, "domainName": domain, "outputFormat": "JSON"},
+        resp = await get_client().get(
+            WHOIS_API_URL,
+            params={"apiKey": os.environ.get("WHOIS_API_KEY", ""), "domainName": domain, "outputFormat": "JSON"},
             timeout=10,
         )
-        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        raise LookupUnavailable(f"WHOIS request failed: {e!r}") from e
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise LookupUnavailable(f"WHOIS API answered {resp.status_code}")
+    if resp.is_error:
+        return {}
+    try:
         return resp.json()
-    except Exception:
-        return None
+    except ValueError as e:
+        raise LookupUnavailable("WHOIS API sent a malformed body") from e
 
 
 def extract_whois_relevant_data(whois_json: dict) -> dict | None:
@@ -107,61 +301,141 @@ def extract_whois_relevant_data(whois_json: dict) -> dict | None:
     }
 
 
-def fetch_pagerank(domain: str) -> dict | None:
-    """Call the Open PageRank API and return rank data, or None on failure."""
-    api_key = os.environ.get("OPEN_PAGERANK_KEY", "")
-    if not api_key:
-        return None
+async def _lookup_whois_uncached(domain: str) -> dict | None:
+    raw_whois = await fetch_whois(domain)
     try:
-        resp = requests.get(
-            "https://openpagerank.com/api/v1.0/getPageRank",
-            params={"domains[]": domain},
-            headers={"API-OPR": api_key},
-            timeout=10,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        results = data.get("response", [])
-        if not results:
-            return None
-        entry = results[0]
-        return {
-            "pageRankDecimal": entry.get("page_rank_decimal"),
-            "pageRankInteger": entry.get("page_rank_integer"),
-            "rank": entry.get("rank"),
-        }
+        return extract_whois_relevant_data(raw_whois) if raw_whois else None
     except Exception:
         return None
 
 
-def fetch_safe_browsing(url: str) -> dict:
+async def lookup_whois(domain: str) -> dict | None:
+    """Cached WHOIS lookup reduced to the fields shown in the UI, or None."""
+    if not os.environ.get("WHOIS_API_KEY"):
+        return None  # not configured: nothing to look up, and nothing to cache
+    try:
+        return await whois_cache.get_or_fetch(domain.lower(), _lookup_whois_uncached)
+    except LookupUnavailable as e:
+        logging.warning(f"WHOIS lookup for {domain} failed: {e}")
+        return None
+
+
+async def lookup_pagerank(domain: str) -> dict | None:
+    """Cached Open PageRank lookup, or None."""
+    return await pagerank_cache.get_or_fetch(domain.lower(), fetch_pagerank)
+
+
+async def lookup_pagerank_many(domains: list[str]) -> dict[str, dict | None]:
+    """Cached PageRank for many domains; misses share bulk API requests."""
+    return await pagerank_cache.get_or_fetch_many([d.lower() for d in domains], fetch_pagerank_batch)
+
+
+PAGERANK_BATCH_SIZE = 100  # Open PageRank accepts up to 100 domains[] per request
+SAFE_BROWSING_BATCH_SIZE = 500  # threatMatches:find accepts up to 500 threatEntries
+SAFE_BROWSING_THREAT_TYPES = [
+    "MALWARE",
+    "SOCIAL_ENGINEERING",
+    "UNWANTED_SOFTWARE",
+    "POTENTIALLY_HARMFUL_APPLICATION",
+]
+
+
+async def fetch_pagerank(domain: str) -> dict | None:
+    """Call the Open PageRank API and return rank data, or None on failure."""
+    return (await fetch_pagerank_batch([domain])).get(domain)
+
+
+async def fetch_pagerank_batch(domains: list[str]) -> dict[str, dict | None]:
+    """Look up many domains with as few Open PageRank requests as possible."""
+    results: dict[str, dict | None] = {d: None for d in domains}
+    api_key = os.environ.get("OPEN_PAGERANK_KEY", "")
+    if not api_key or not domains:
+        return results
+
+    async def fetch_chunk(chunk: list[str]) -> None:
+        try:
+            resp = await get_client().get(
+                PAGERANK_API_URL,
+                params=[("domains[]", d) for d in chunk],
+                headers={"API-OPR": api_key},
+                timeout=10,
+            )
+            resp.raise_for_status()
+            entries = resp.json().get("response", [])
+        except Exception:
+            return
+        for i, entry in enumerate(entries):
+            # Entries echo their domain; fall back to request order
+            domain = entry.get("domain") or (chunk[i] if i < len(chunk) else None)
+            if domain not in results:
+                continue
+            results[domain] = {
+                "pageRankDecimal": entry.get("page_rank_decimal"),
+                "pageRankInteger": entry.get("page_rank_integer"),
+                "rank": entry.get("rank"),
+            }
+
+    chunks = [domains[i:i + PAGERANK_BATCH_SIZE] for i in range(0, len(domains), PAGERANK_BATCH_SIZE)]
+    await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+    return results
+
+
+async def fetch_safe_browsing(url: str) -> dict:
     """Call the Google Safe Browsing Lookup API v4 and return extracted data."""
+    return (await fetch_safe_browsing_batch([url]))[url]
+
+
+async def fetch_safe_browsing_batch(urls: list[str]) -> dict[str, dict]:
+    """
+    Check many URLs against Safe Browsing: locally when a threat list database
+    is loaded, otherwise batching threatEntries per Lookup API request.
+    is_flagged is None (with an "error") when a URL could not be checked.
+    """
+    threat_db = get_threat_db()
+    if threat_db is not None and threat_db.ready:
+        return await threat_db.check_urls(urls)
+
+    results = {u: {"is_flagged": False, "threat_types": []} for u in urls}
     api_key = os.environ.get("GOOGLE_SAFE_BROWSING_KEY", "")
-    if not api_key:
-        return {"is_flagged": False, "threat_types": []}
-    try:
-        resp = requests.post(
-            f"https://safebrowsing.googleapis.com/v4/threatMatches:find?key={api_key}",
-            json={
-                "client": {"clientId": "safelink", "clientVersion": "1.0"},
-                "threatInfo": {
-                    "threatTypes": [
-                        "MALWARE",
-                        "SOCIAL_ENGINEERING",
-                        "UNWANTED_SOFTWARE",
-                        "POTENTIALLY_HARMFUL_APPLICATION",
-                    ],
-                    "platformTypes": ["ANY_PLATFORM"],
-                    "threatEntryTypes": ["URL"],
-                    "threatEntries": [{"url": url}],
+    if not api_key or not urls:
+        return results
+
+    async def fetch_chunk(chunk: list[str]) -> None:
+        try:
+            resp = await get_client().post(
+                f"{SAFE_BROWSING_API_URL}/threatMatches:find?key={api_key}",
+                json={
+                    "client": {"clientId": "safelink", "clientVersion": "1.0"},
+                    "threatInfo": {
+                        "threatTypes": SAFE_BROWSING_THREAT_TYPES,
+                        "platformTypes": ["ANY_PLATFORM"],
+                        "threatEntryTypes": ["URL"],
+                        "threatEntries": [{"url": u} for u in chunk],
+                    },
                 },
-            },
-            timeout=10,
-        )
-        resp.raise_for_status()
-        return extract_safe_browsing_data(resp.json())
-    except Exception:
-        return {"is_flagged": False, "threat_types": []}
+                timeout=10,
+            )
+            resp.raise_for_status()
+            response_json = resp.json()
+        except Exception as e:
+            # Unknown is not the same as safe
+            for u in chunk:
+                results[u] = {"is_flagged": None, "threat_types": [], "error": f"Safe Browsing lookup failed: {e}"}
+            return
+        if len(chunk) == 1:
+            results[chunk[0]] = extract_safe_browsing_data(response_json)
+            return
+        by_url: dict[str, list] = {}
+        for match in response_json.get("matches", []):
+            by_url.setdefault(match.get("threat", {}).get("url"), []).append(match)
+        for u, matches in by_url.items():
+            if u in results:
+                results[u] = extract_safe_browsing_data({"matches": matches})
+
+    unique = list(dict.fromkeys(urls))
+    chunks = [unique[i:i + SAFE_BROWSING_BATCH_SIZE] for i in range(0, len(unique), SAFE_BROWSING_BATCH_SIZE)]
+    await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+    return results
 
 
 def extract_safe_browsing_data(response_json: dict) -> dict:
@@ -173,7 +447,12 @@ def extract_safe_browsing_data(response_json: dict) -> dict:
     return {"is_flagged": True, "threat_types": threat_types}
 
 
-def ask_gemini_for_score(
+def _flag_text(safe_browsing: dict) -> str:
+    flagged = safe_browsing.get("is_flagged", False)
+    return "Unknown (lookup failed)" if flagged is None else str(flagged)
+
+
+async def ask_gemini_for_score(
     url: str,
     final_url: str,
     whois_data: dict | None,
@@ -195,7 +474,7 @@ Final URL after redirects: {final_url}
 {json.dumps(whois_data, indent=2) if whois_data else "Not available"}
 
 === Google Safe Browsing ===
-Flagged: {safe_browsing.get("is_flagged", False)}
+Flagged: {_flag_text(safe_browsing)}
 Threat types: {", ".join(safe_browsing.get("threat_types", [])) or "None"}
 
 === OpenPageRank ===
@@ -206,6 +485,7 @@ SSL/TLS: {signals.get("ssl", False)}
 Has login form: {signals.get("hasLoginForm", False)}
 Third-party scripts count: {signals.get("thirdPartyScriptsCount", 0)}
 Has privacy policy: {signals.get("hasPrivacyLink", False)}
+Brand impersonation: {"; ".join(signals.get("brandImpersonation", [])) or "None detected"}
 
 Instructions:
 1. Provide an overall safety score from 0 to 100 where 0 is extremely dangerous and 100 is very safe.
@@ -217,8 +497,8 @@ Respond ONLY in this exact JSON format with no other text:
 {{"score": <number>, "tier": "<LOW|MEDIUM|HIGH>", "reasoning": "<2 sentences>", "domainTrustScore": <number>}}"""
 
     try:
-        resp = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
+        resp = await get_client().post(
+            f"{GEMINI_API_URL}:generateContent?key={api_key}",
             json={
                 "contents": [{"parts": [{"text": prompt}]}],
                 "generationConfig": {"temperature": 0.2},
@@ -257,7 +537,7 @@ Respond ONLY in this exact JSON format with no other text:
         return {"score": None, "tier": None, "reasoning": None, "domainTrustScore": None}
 
 
-def ask_gemini_site_summary(url: str, final_url: str, html_snippet: str) -> str | None:
+async def ask_gemini_site_summary(url: str, final_url: str, html_snippet: str) -> str | None:
     """Ask Gemini for a concise summary of what the website/company does."""
     api_key = os.environ.get("GEMINI_API", "")
     if not api_key:
@@ -274,8 +554,8 @@ HTML content (first 3000 chars):
 Respond with ONLY the summary text, no formatting, no quotes, no markdown."""
 
     try:
-        resp = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
+        resp = await get_client().post(
+            f"{GEMINI_API_URL}:generateContent?key={api_key}",
             json={
                 "contents": [{"parts": [{"text": prompt}]}],
                 "generationConfig": {"temperature": 0.3, "maxOutputTokens": 200},
@@ -291,25 +571,25 @@ Respond with ONLY the summary text, no formatting, no quotes, no markdown."""
         return None
 
 
-def ask_gemini_image_caption(screenshot_b64: str) -> str | None:
+async def ask_gemini_image_caption(screenshot: dict | None) -> str | None:
     """Ask Gemini to describe the screenshot for an accessible caption."""
     api_key = os.environ.get("GEMINI_API", "")
-    if not api_key or not screenshot_b64:
+    if not api_key or not screenshot:
         return None
 
     prompt = "Describe this website screenshot in one concise sentence for someone who cannot see the image. Focus on the main content and layout visible on the page."
 
     try:
-        resp = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
+        resp = await get_client().post(
+            f"{GEMINI_API_URL}:generateContent?key={api_key}",
             json={
                 "contents": [{
                     "parts": [
                         {"text": prompt},
                         {
                             "inline_data": {
-                                "mime_type": "image/png",
-                                "data": screenshot_b64,
+                                "mime_type": screenshot["mime_type"],
+                                "data": base64.b64encode(screenshot["data"]).decode(),
                             }
                         },
                     ]
@@ -327,7 +607,7 @@ def ask_gemini_image_caption(screenshot_b64: str) -> str | None:
         return None
 
 
-def ask_gemini_privacy_analysis(privacy_text: str, privacy_link: str | None) -> dict | None:
+async def ask_gemini_privacy_analysis(privacy_text: str, privacy_link: str | None) -> dict | None:
     """Ask Gemini for a concise privacy policy summary and key phrases to highlight."""
     api_key = os.environ.get("GEMINI_API", "")
     if not api_key or not privacy_text:
@@ -345,8 +625,8 @@ Respond ONLY in this exact JSON format:
 {{"summary": "<2-3 sentence summary>", "highlights": ["<short key phrase 1>", "<short key phrase 2>", "<short key phrase 3>"]}}"""
 
     try:
-        resp = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}",
+        resp = await get_client().post(
+            f"{GEMINI_API_URL}:generateContent?key={api_key}",
             json={
                 "contents": [{"parts": [{"text": prompt}]}],
                 "generationConfig": {"temperature": 0.2, "maxOutputTokens": 500},
@@ -369,166 +649,1062 @@ Respond ONLY in this exact JSON format:
         return None
 
 
+def privacy_text_key(privacy_text: str) -> str:
+    """Cache key for a policy: whitespace-insensitive hash of its text."""
+    return hashlib.sha256(" ".join(privacy_text.split()).encode("utf-8")).hexdigest()
+
+
+async def lookup_privacy_analysis(privacy_text: str, privacy_link: str | None) -> dict | None:
+    """Cached ask_gemini_privacy_analysis; identical policies are analyzed once."""
+    if not privacy_text:
+        return None
+    return await privacy_analysis_cache.get_or_fetch(
+        privacy_text_key(privacy_text),
+        lambda _key: ask_gemini_privacy_analysis(privacy_text, privacy_link),
+    )
+
+
+GEMINI_MODE = os.environ.get("GEMINI_MODE", "separate").lower()
+
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "score": {"type": "INTEGER"},
+        "tier": {"type": "STRING", "enum": ["LOW", "MEDIUM", "HIGH"]},
+        "reasoning": {"type": "STRING"},
+        "domainTrustScore": {"type": "INTEGER"},
+        "summary": {"type": "STRING"},
+        "caption": {"type": "STRING"},
+        "privacySummary": {"type": "STRING"},
+        "privacyHighlights": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["score", "tier", "reasoning", "domainTrustScore", "summary", "caption"],
+}
+
+
+async def ask_gemini_combined(
+    url: str,
+    final_url: str,
+    html_snippet: str,
+    screenshot: dict | None,
+    privacy_text: str,
+    whois_data: dict | None,
+    safe_browsing: dict,
+    pagerank_data: dict | None,
+    signals: dict,
+) -> dict | None:
+    """
+    One multimodal, schema-constrained Gemini request that replaces the score,
+    summary, caption and privacy prompts. Returns None on any failure so the
+    caller can fall back to the per-call path.
+    """
+    api_key = os.environ.get("GEMINI_API", "")
+    if not api_key:
+        return None
+
+    prompt = f"""You are a cybersecurity analyst reviewing a website for a non-technical user. Use the data below (and the attached screenshot, if any) to fill in every field of the JSON response.
+
+URL submitted: {url}
+Final URL after redirects: {final_url}
+
+=== WHOIS Data ===
+{json.dumps(whois_data, indent=2) if whois_data else "Not available"}
+
+=== Google Safe Browsing ===
+Flagged: {_flag_text(safe_browsing)}
+Threat types: {", ".join(safe_browsing.get("threat_types", [])) or "None"}
+
+=== OpenPageRank ===
+{json.dumps(pagerank_data, indent=2) if pagerank_data else "Not available"}
+
+=== Page Signals ===
+SSL/TLS: {signals.get("ssl", False)}
+Has login form: {signals.get("hasLoginForm", False)}
+Third-party scripts count: {signals.get("thirdPartyScriptsCount", 0)}
+Has privacy policy: {signals.get("hasPrivacyLink", False)}
+Brand impersonation: {"; ".join(signals.get("brandImpersonation", [])) or "None detected"}
+
+=== HTML content (first 3000 chars) ===
+{html_snippet[:3000]}
+
+=== Privacy policy text ===
+{privacy_text[:4000] if privacy_text else "Not available"}
+
+Fields:
+- score: overall safety from 0 (extremely dangerous) to 100 (very safe).
+- tier: "HIGH" (score 61-100), "MEDIUM" (31-60) or "LOW" (0-30).
+- reasoning: exactly 2 plain-English sentences explaining the score.
+- domainTrustScore: 0-100 trust in the domain from WHOIS data, domain age, registrar reputation and privacy policy presence.
+- summary: 2-3 sentences on what this company, product or service is and does.
+- caption: one concise sentence describing the screenshot for someone who cannot see it (empty if there is no screenshot).
+- privacySummary: 2-3 sentences on what data the privacy policy collects, how it is used and whether it is shared (empty if not available).
+- privacyHighlights: exactly 3 short exact quotes (under 15 words each) from the privacy policy worth attention (empty if not available)."""
+
+    parts = [{"text": prompt}]
+    if screenshot:
+        parts.append({
+            "inline_data": {
+                "mime_type": screenshot["mime_type"],
+                "data": base64.b64encode(screenshot["data"]).decode(),
+            }
+        })
+
+    try:
+        resp = await get_client().post(
+            f"{GEMINI_API_URL}:generateContent?key={api_key}",
+            json={
+                "contents": [{"parts": parts}],
+                "generationConfig": {
+                    "temperature": 0.2,
+                    "maxOutputTokens": 1000,
+                    "responseMimeType": "application/json",
+                    "responseSchema": COMBINED_RESPONSE_SCHEMA,
+                },
+            },
+            timeout=30,
+        )
+        resp.raise_for_status()
+        result = resp.json()
+        text = result["candidates"][0]["content"]["parts"][0]["text"]
+        parsed = json.loads(text)
+        score = min(max(int(parsed["score"]), 0), 100)
+        tier = str(parsed.get("tier", "")).upper()
+        if tier not in ("LOW", "MEDIUM", "HIGH"):
+            tier = "HIGH" if score >= 61 else "MEDIUM" if score >= 31 else "LOW"
+        domain_trust = parsed.get("domainTrustScore")
+        privacy_summary = str(parsed.get("privacySummary") or "")
+        return {
+            "risk": {
+                "score": score,
+                "tier": tier,
+                "reasoning": str(parsed.get("reasoning", "")),
+                "domainTrustScore": min(max(int(domain_trust), 0), 100) if domain_trust is not None else None,
+            },
+            "summary": str(parsed.get("summary") or "") or None,
+            "caption": (str(parsed.get("caption") or "") or None) if screenshot else None,
+            "privacyAnalysis": {
+                "summary": privacy_summary,
+                "highlights": [str(h) for h in parsed.get("privacyHighlights", [])][:3],
+            } if privacy_text and privacy_summary else None,
+        }
+    except Exception as e:
+        logging.error(f"Gemini combined analysis error: {e}")
+        return None
+
+
 def compute_risk(agent_data: dict, url: str) -> dict:
     """Simple heuristic risk scoring based on agent scan data."""
-    score = 0
-    reasons: list[str] = []
+    return score_features(risk_features(agent_data, url))
 
-    final_url = agent_data.get("final_url", "")
-    redirects = agent_data.get("redirects", [])
-    scripts = agent_data.get("scripts", [])
-    html = agent_data.get("html", "").lower()
-    privacy = agent_data.get("privacy_policy", {})
 
-    # SSL check
-    ssl = final_url.startswith("https://")
-    if not ssl:
-        score += 20
-        reasons.append("No SSL/TLS encryption")
+def _capture_profile(name: str | None) -> str:
+    """Validated capture profile name; 400 for unknown profiles."""
+    try:
+        return resolve_profile(name).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-    # Third-party scripts
-    parsed_final = urlparse(final_url)
-    final_domain = parsed_final.netloc
-    third_party_scripts = [
-        s for s in scripts
-        if s and urlparse(s).netloc and urlparse(s).netloc != final_domain
-    ]
-    tp_count = len(third_party_scripts)
-    if tp_count > 10:
-        score += 15
-        reasons.append(f"High number of third-party scripts ({tp_count})")
-    elif tp_count > 5:
-        score += 8
-        reasons.append(f"Moderate third-party scripts ({tp_count})")
-
-    # Redirect chain
-    redirect_count = len(redirects)
-    if redirect_count > 3:
-        score += 20
-        reasons.append(f"Long redirect chain ({redirect_count} hops)")
-    elif redirect_count > 1:
-        score += 10
-        reasons.append(f"Redirect chain ({redirect_count} hops)")
-
-    # Privacy policy
-    has_privacy = bool(privacy and privacy.get("link"))
-    if not has_privacy:
-        score += 10
-        reasons.append("No privacy policy found")
-
-    # Domain analysis
-    domain_parts = final_domain.split(".")
-    if len(domain_parts) > 3:
-        score += 5
-        reasons.append("Deeply nested subdomain")
-
-    suspicious_tlds = [".xyz", ".top", ".click", ".buzz", ".tk", ".ml", ".ga", ".cf"]
-    if any(final_domain.endswith(tld) for tld in suspicious_tlds):
-        score += 15
-        reasons.append("Suspicious top-level domain")
-
-    # URL mismatch (input vs final)
-    input_domain = urlparse(url).netloc
-    if input_domain and final_domain and input_domain != final_domain:
-        score += 10
-        reasons.append(f"Final domain ({final_domain}) differs from input ({input_domain})")
-
-    score = min(score, 100)
-
-    if score >= 70:
-        tier = "HIGH"
-    elif score >= 40:
-        tier = "MEDIUM"
-    else:
-        tier = "LOW"
+def _normalized_url(url: str) -> str:
+    """Cache key for a request URL; 400 when it can't be parsed (e.g. a bad port)."""
+    normalized = normalize_url(url)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail="Invalid URL")
+    return normalized
+
+
+def _deadline_seconds(seconds: float | None) -> float | None:
+    """Validated deadlineSeconds; 400 unless it is positive. Callers clamp the upper end."""
+    if seconds is not None and not seconds > 0:
+        raise HTTPException(status_code=400, detail="deadlineSeconds must be greater than 0")
+    return seconds
+
+
+# Top-level preview keys a request can ask for with `fields`
+PREVIEW_FIELDS = (
+    "finalUrl", "redirectCount", "redirects", "screenshot", "signals", "privacy", "scripts",
+    "capture", "settle", "risk", "whois", "safeBrowsing", "pageRank", "aiSummary", "aiCaption",
+    "privacyAnalysis", "timings",
+)
+
+
+def _preview_fields(fields: list[str] | None) -> frozenset | None:
+    """Validated projection (None = everything); entries may be comma-separated."""
+    if not fields:
+        return None
+    names = frozenset(name.strip() for item in fields for name in item.split(",") if name.strip())
+    unknown = names - set(PREVIEW_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))} (expected any of {', '.join(PREVIEW_FIELDS)})",
+        )
+    return names or None
+
+
+def result_key(normalized_url: str, profile: str, fields: frozenset | None = None) -> str:
+    """
+    Result cache / coalescing key: scans with different profiles differ, and
+    a projected result is only complete for its own set of fields.
+    """
+    if fields is None:
+        return f"{profile}:{normalized_url}"
+    return f"{profile}:{','.join(sorted(fields))}:{normalized_url}"
+
+
+async def scan_coalesced(
+    url: str, key: str, emit=None, profile: str | None = None, fields: frozenset | None = None,
+    deadline: Deadline | None = None,
+) -> dict:
+    """
+    run_preview for url, shared with every concurrent request for the same
+    key (the first request's deadline applies to all of them). Complete
+    results are cached; `emit` receives stage events.
+    """
+    async def work(publish):
+        result = await run_preview(url, emit=publish, profile=profile, fields=fields, deadline=deadline)
+        # A partial result only answers this request; the next one scans again
+        if not result["partial"]:
+            result_cache.set(key, result)
+        return result
+
+    return await scan_flight.do(key, work, listener=emit)
+
+
+async def _refresh_cached_result(url: str, key: str, profile: str | None, fields: frozenset | None) -> None:
+    try:
+        await scan_coalesced(url, key, profile=profile, fields=fields)
+    except Exception as e:
+        logging.warning(f"Background rescan of {url} failed: {e}")
+    finally:
+        result_cache.end_refresh(key)
 
-    return {"score": score, "tier": tier, "reasons": reasons}
+
+def _from_result_cache(
+    url: str, key: str, profile: str | None = None, fields: frozenset | None = None
+) -> dict | None:
+    """Cached response for key, scheduling a background rescan when stale."""
+    cached = result_cache.get(key)
+    if cached is None:
+        return None
+    result, age, fresh = cached
+    if not fresh and result_cache.begin_refresh(key):
+        # Serve the stale copy now and rescan in the background
+        task = asyncio.create_task(_refresh_cached_result(url, key, profile, fields))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return {**result, "cache": {"status": "fresh" if fresh else "stale", "ageSeconds": round(age, 1)}}
+
+
+def _cached_preview(url: str, normalized: str, profile: str, fields: frozenset | None) -> dict | None:
+    """A full cached result serves any projection; otherwise try this projection's own entry."""
+    cached = _from_result_cache(url, result_key(normalized, profile), profile)
+    if cached is None and fields is not None:
+        cached = _from_result_cache(url, result_key(normalized, profile, fields), profile, fields)
+    return cached
+
+
+# Keys every preview response carries, whatever fields were asked for
+RESPONSE_META = ("ok", "partial", "skippedStages", "cache")
+
+
+def _shape(result: dict, fields: frozenset | None, timings: bool) -> dict:
+    """
+    Project a result onto the requested fields (RESPONSE_META always stays).
+    Stage timings are kept with every result but only returned on request.
+    """
+    if fields is not None:
+        timings = timings or "timings" in fields
+        result = {k: v for k, v in result.items() if k in fields or k in RESPONSE_META}
+    if timings or "timings" not in result:
+        return result
+    return {k: v for k, v in result.items() if k != "timings"}
+
+
+async def _disconnected(request: Request) -> None:
+    """Return once the client has closed the connection (the request body is already read)."""
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _unless_disconnected(request: Request, coro):
+    """
+    Await coro, cancelling it as soon as the client disconnects: a scan
+    nobody waits for anymore releases its browser and upstream calls.
+    """
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(_disconnected(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        abandoned = not work.done()
+        if abandoned:
+            work.cancel()
+    if abandoned:
+        logging.info(f"Client left {request.url.path}; scan cancelled")
+        # nginx's "client closed request"; nobody is there to read it
+        raise HTTPException(status_code=499, detail="Client closed request")
+    return work.result()
 
 
 @app.post("/api/preview")
-async def preview(req: PreviewRequest):
-    url = req.url.strip()
+async def preview(req: PreviewRequest, request: Request):
+    url = ensure_scheme(req.url)
     if not url:
         raise HTTPException(status_code=400, detail="URL is required")
 
-    if not url.startswith("http://") and not url.startswith("https://"):
-        url = "https://" + url
+    profile = _capture_profile(req.profile)
+    fields = _preview_fields(req.fields)
+    deadline = Deadline(_deadline_seconds(req.deadlineSeconds))
+    normalized = _normalized_url(url)
+    if not req.force:
+        cached = _cached_preview(url, normalized, profile, fields)
+        if cached is not None:
+            return FastJSONResponse(_shape(cached, fields, req.timings))
+
+    result = await _unless_disconnected(request, scan_coalesced(
+        url, result_key(normalized, profile, fields), profile=profile, fields=fields, deadline=deadline,
+    ))
+    return FastJSONResponse(_shape(
+        {**result, "cache": {"status": "bypass" if req.force else "miss", "ageSeconds": 0}}, fields, req.timings
+    ))
+
+
+@app.post("/api/preview/batch")
+async def preview_batch(req: BatchPreviewRequest, request: Request):
+    """
+    Scan many URLs at once. Duplicate URLs are scanned once, browser scans run
+    with bounded parallelism, and Safe Browsing / PageRank use bulk requests
+    for every final URL and domain in the batch. A URL another request is
+    already scanning shares that scan. Results keep input order. Every URL
+    gets its own deadline; the batch stops when the client leaves.
+    """
+    return await _unless_disconnected(request, _preview_batch(req))
+
+
+async def _preview_batch(req: BatchPreviewRequest) -> FastJSONResponse:
+    if not req.urls:
+        raise HTTPException(status_code=400, detail="At least one URL is required")
+    if len(req.urls) > MAX_BATCH_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_URLS} URLs per batch")
+
+    profile = _capture_profile(req.profile)
+    fields = _preview_fields(req.fields)
+    deadline_seconds = Deadline(_deadline_seconds(req.deadlineSeconds)).seconds
+    inputs = [ensure_scheme(u) for u in req.urls]
+    keys = [normalize_url(u) if u else None for u in inputs]
+    unique = {}
+    for u, key in zip(inputs, keys):
+        if key is not None and key not in unique:
+            unique[key] = u
+
+    outcomes: dict[str, dict] = {}
+    to_scan = {}
+    for key, u in unique.items():
+        cached = None if req.force else _cached_preview(u, key, profile, fields)
+        if cached is not None:
+            outcomes[key] = {"status": "ok", "result": _shape(cached, fields, req.timings)}
+        else:
+            to_scan[key] = u
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    upstream = asyncio.Semaphore(BATCH_UPSTREAM_CONCURRENCY)
+    # Finished scans waiting for the next bulk lookup: key -> (final URL, future for its lookups)
+    waiting: dict[str, tuple[str, asyncio.Future]] = {}
+    unfinished = set(to_scan)  # keys whose scan may still join a bulk lookup
+    flush_timer: asyncio.TimerHandle | None = None
+
+    async def bulk_lookups(batch: dict[str, tuple[str, asyncio.Future]]) -> None:
+        """Safe Browsing / PageRank for a group of finished scans, one bulk request each."""
+        final_urls = {key: final_url for key, (final_url, _) in batch.items()}
+        domains = {key: urlparse(f).netloc.removeprefix("www.").lower() for key, f in final_urls.items()}
+        try:
+            safe_browsing_map, pagerank_map = await asyncio.gather(
+                fetch_safe_browsing_batch(list(set(final_urls.values()))),
+                lookup_pagerank_many(list(set(domains.values()))),
+            )
+            found = {
+                key: {"safeBrowsing": safe_browsing_map[final_urls[key]], "pageRank": pagerank_map.get(domains[key])}
+                for key in batch
+            }
+        except Exception as e:
+            logging.warning(f"Bulk lookups for {len(batch)} URLs failed: {e}")
+            found = {}  # each preview then looks its own URL up
+        for key, (_, future) in batch.items():
+            if not future.done():
+                future.set_result(found.get(key, {}))
+
+    def flush() -> None:
+        nonlocal flush_timer
+        if flush_timer is not None:
+            flush_timer.cancel()
+            flush_timer = None
+        if waiting:
+            # Outlives the batch if a flight it feeds still has other waiters
+            task = asyncio.create_task(bulk_lookups(dict(waiting)))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+            waiting.clear()
+
+    def scan_finished(key: str, data: dict | None = None) -> asyncio.Future | None:
+        """Record a scan as done; with its data, returns the future for its bulk lookups."""
+        nonlocal flush_timer
+        unfinished.discard(key)
+        future = None
+        if data is not None:
+            future = loop.create_future()
+            waiting[key] = (data.get("final_url", to_scan[key]), future)
+        if not unfinished:
+            flush()  # nothing else will join this group
+        elif waiting and flush_timer is None:
+            flush_timer = loop.call_later(BATCH_LOOKUP_WINDOW, flush)
+        return future
+
+    async def preview_one(key: str) -> dict:
+        u = to_scan[key]
+
+        async def work(_publish):
+            try:
+                async with semaphore:
+                    data = await scan_url(u, profile, Deadline(deadline_seconds))
+            except BaseException:
+                scan_finished(key)
+                raise
+            # Lookups start as soon as this scan (and any finishing with it) is done
+            lookups = await asyncio.shield(scan_finished(key, data))
+            async with upstream:
+                # What the URL's own scan left of its deadline; waiting on the lookups doesn't count
+                deadline = Deadline(deadline_seconds - data["timings"]["wall"] / 1000)
+                result = await build_preview(u, data, lookups=lookups, fields=fields, deadline=deadline)
+            if not result["partial"]:
+                result_cache.set(flight_key, result)
+            record_history(u, data, result, profile, source="batch")
+            return result
+
+        flight_key = result_key(key, profile, fields)
+        if scan_flight.in_flight(flight_key):
+            # /api/preview, the stream or a job is scanning it already: share that scan
+            scan_finished(key)
+        try:
+            result = await scan_flight.do(flight_key, work)
+        finally:
+            if key in unfinished:
+                scan_finished(key)
+        return _shape(
+            {**result, "cache": {"status": "bypass" if req.force else "miss", "ageSeconds": 0}}, fields, req.timings
+        )
+
+    previews = await asyncio.gather(*(preview_one(key) for key in to_scan), return_exceptions=True)
+    for key, outcome in zip(to_scan, previews):
+        if isinstance(outcome, BaseException):
+            detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            outcomes[key] = {"status": "error", "error": detail}
+        else:
+            outcomes[key] = {"status": "ok", "result": outcome}
+
+    items = []
+    for original, key in zip(req.urls, keys):
+        if key is None:
+            error = "Invalid URL" if original.strip() else "URL is required"
+            items.append({"url": original, "status": "invalid", "error": error})
+        else:
+            items.append({"url": original, "normalizedUrl": key, **outcomes[key]})
+    return FastJSONResponse({
+        "ok": True,
+        "count": len(items),
+        "unique": len(unique),
+        "scanned": len(to_scan),
+        "results": items,
+    })
+
+
+async def run_job(job: dict, emit) -> dict:
+    """Job runner: same cache and coalescing path as /api/preview."""
+    url, profile = job["url"], job["profile"]
+    key = result_key(normalize_url(url), profile)
+    if not job["force"]:
+        cached = _from_result_cache(url, key, profile)
+        if cached is not None:
+            return _shape(cached, None, False)
+    # Stop a little short of the job deadline so a partial result is still kept. Jobs
+    # may run longer than a preview, so the limit is JOB_MAX_DEADLINE, not SCAN_MAX_DEADLINE.
+    remaining = job["deadline_at"] - time.time()
+    deadline = Deadline(remaining * (1 - JOB_DEADLINE_MARGIN), max_seconds=JOB_MAX_DEADLINE)
+    result = await scan_coalesced(url, key, emit=emit, profile=profile, deadline=deadline)
+    return _shape({**result, "cache": {"status": "bypass" if job["force"] else "miss", "ageSeconds": 0}}, None, False)
+
+
+job_manager = JobManager(run_job)
+
+def job_view(job: dict) -> dict:
+    """Public shape of a job: status, partial stage results and the final result."""
+    view = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "url": job["url"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "deadline_at": job["deadline_at"],
+        "partial": job["partial"] if job["status"] not in FINISHED else {},
+        "error": job["error"],
+        "result": None,
+    }
+    preview = job["result"]
+    if preview:
+        risk = preview.get("risk") or {}
+        view["result"] = {
+            "score": risk.get("score"),
+            "label": risk_label(risk),
+            "flags": risk.get("reasons", []),
+            "explanation": risk.get("reasoning") or preview.get("aiSummary"),
+            "screenshot_url": (preview.get("screenshot") or {}).get("url"),
+            "preview": preview,
+        }
+    return view
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        screenshot_path = tmp.name
 
+@app.post("/api/jobs", status_code=202)
+async def create_job(req: JobRequest, response: Response):
+    """Queue a scan and return its job id right away; poll GET /api/jobs/{id}."""
+    url = ensure_scheme(req.url)
+    if not url:
+        raise HTTPException(status_code=400, detail="URL is required")
+    _normalized_url(url)
+    profile = _capture_profile(req.profile)
+    deadline = _deadline_seconds(req.deadlineSeconds)
     try:
-        data = await asyncio.to_thread(analyze_url, url, screenshot_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Agent error: {e}")
+        job = await job_manager.submit(url, profile=profile, force=req.force, deadline=deadline)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    response.headers["Location"] = f"/api/jobs/{job['id']}"
+    return job_view(job)
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
+
+
+@app.post("/api/triage")
+def triage(req: TriageRequest):
+    """
+    Heuristic pre-triage from the URLs alone (no browser, no lookups), scored
+    in one vectorized pass. Page-level signals count as neutral.
+    """
+    if len(req.urls) > MAX_TRIAGE_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TRIAGE_URLS} URLs per request")
+    urls = [ensure_scheme(u) for u in req.urls]
+    valid = [u for u in urls if u]
+    batch = score_batch([url_features(u) for u in valid])
+    scored = dict(zip(valid, zip(batch["scores"].tolist(), batch["tiers"].tolist())))
+    results = []
+    for original, u in zip(req.urls, urls):
+        if not u:
+            results.append({"url": original, "score": None, "tier": None})
+        else:
+            score, tier = scored[u]
+            results.append({"url": original, "score": score, "tier": tier})
+    return FastJSONResponse({"ok": True, "count": len(results), "results": results})
+
+
+def _history_or_503():
+    history = get_history()
+    if history is None:
+        raise HTTPException(status_code=503, detail="Scan history is disabled")
+    return history
+
+
+@app.get("/api/history")
+def list_history(
+    url: str | None = None,
+    domain: str | None = None,
+    final_domain: str | None = None,
+    redirected: bool = False,
+    label: str | None = None,
+    flagged: bool = False,
+    since: float | None = None,
+    until: float | None = None,
+    cursor: int | None = None,
+    limit: int = 50,
+):
+    """
+    Past scans, newest first, filtered by any of: URL, input domain, final
+    domain (with redirected=true: only scans that ended up on another
+    domain), label, flagged, and a since/until window in Unix seconds. Pass
+    the returned next_cursor as `cursor` for the next page.
+    """
+    history = _history_or_503()
+    if label is not None and label not in LABELS:
+        raise HTTPException(status_code=400, detail=f"label must be one of {', '.join(LABELS)}")
+    return history.query(
+        normalized_url=_normalized_url(ensure_scheme(url)) if url else None,
+        domain=domain,
+        final_domain=final_domain,
+        redirected=redirected,
+        label=label,
+        flagged=flagged,
+        since=since,
+        until=until,
+        before=cursor,
+        limit=limit,
+    )
 
-    if data is None:
-        raise HTTPException(status_code=502, detail="Failed to load the URL")
 
-    # Read screenshot as base64
-    screenshot_b64 = ""
-    if os.path.exists(screenshot_path):
-        with open(screenshot_path, "rb") as f:
-            screenshot_b64 = base64.b64encode(f.read()).decode()
-        os.unlink(screenshot_path)
+@app.get("/api/history/{scan_id}")
+def get_history_scan(scan_id: int):
+    scan = _history_or_503().get(scan_id)
+    if scan is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    html_blob, screenshot_blob = scan.pop("html_blob"), scan.pop("screenshot_blob")
+    scan.pop("screenshot_mime")
+    scan["html_url"] = f"/api/history/{scan_id}/html" if html_blob else None
+    scan["screenshot_url"] = f"/api/history/{scan_id}/screenshot" if screenshot_blob else None
+    return scan
+
+
+@app.get("/api/history/{scan_id}/html")
+def get_history_html(scan_id: int):
+    history = _history_or_503()
+    scan = history.get(scan_id)
+    data = history.blobs.get(scan["html_blob"]) if scan and scan["html_blob"] else None
+    if data is None:
+        raise HTTPException(status_code=404, detail="HTML not found")
+    # Scanned pages are untrusted: never let the browser render them here
+    return Response(
+        content=data,
+        media_type="text/plain; charset=utf-8",
+        headers={"X-Content-Type-Options": "nosniff", "Cache-Control": "public, max-age=31536000, immutable"},
+    )
 
-    final_url = data.get("final_url", url)
-    redirects = data.get("redirects", [])
-    scripts = data.get("scripts", [])
-    privacy = data.get("privacy_policy", {})
-    html = data.get("html", "").lower()
 
-    has_login_form = any(
-        kw in html
-        for kw in ['type="password"', "type='password'", 'input type="email"', "login", "sign in"]
+@app.get("/api/history/{scan_id}/screenshot")
+def get_history_screenshot(scan_id: int):
+    history = _history_or_503()
+    scan = history.get(scan_id)
+    data = history.blobs.get(scan["screenshot_blob"]) if scan and scan["screenshot_blob"] else None
+    if data is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    return Response(
+        content=data,
+        media_type=scan["screenshot_mime"],
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
     )
 
-    parsed_final = urlparse(final_url)
-    final_domain = parsed_final.netloc
-    third_party_scripts = [
-        s for s in scripts
-        if s and urlparse(s).netloc and urlparse(s).netloc != final_domain
+
+def _sse(event: str, payload) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(payload) + b"\n\n"
+
+
+NAVIGATION_FIELDS = ("finalUrl", "redirectCount", "redirects", "signals", "privacy", "scripts", "capture", "settle")
+
+
+def _replay_events(result: dict, fields: frozenset | None = None) -> list[tuple[str, object]]:
+    """The stage events a cached result would have produced, in pipeline order."""
+    want = lambda name: fields is None or name in fields
+    events = [
+        ("navigation", {k: result.get(k) for k in NAVIGATION_FIELDS if want(k)}),
+        ("screenshot", {"screenshot": result.get("screenshot")}),
+        ("risk", result.get("risk")),
+        ("whois", result.get("whois")),
+        ("pageRank", result.get("pageRank")),
+        ("safeBrowsing", result.get("safeBrowsing")),
+        ("aiScore", result.get("risk")),
+        ("aiSummary", result.get("aiSummary")),
+        ("aiCaption", result.get("aiCaption")),
+        ("privacyAnalysis", result.get("privacyAnalysis")),
+    ]
+    return [
+        (event, payload) for event, payload in events
+        if (payload if event == "navigation" else want("risk" if event == "aiScore" else event))
     ]
 
-    ssl = final_url.startswith("https://")
-    has_privacy = bool(privacy and privacy.get("link"))
 
-    risk = compute_risk(data, url)
+@app.post("/api/preview/stream")
+async def preview_stream(req: PreviewRequest):
+    """
+    Server-Sent Events version of /api/preview. Each stage is sent as a typed
+    event as soon as it finishes (navigation, screenshot, risk, whois,
+    pageRank, safeBrowsing, aiScore, aiSummary, aiCaption, privacyAnalysis),
+    or as `skipped` ({"stage": name}) when the deadline cut it off, followed
+    by `done` with the full response, or `error`.
+    """
+    url = ensure_scheme(req.url)
+    if not url:
+        raise HTTPException(status_code=400, detail="URL is required")
 
-    # WHOIS lookup
-    whois_data = None
+    profile = _capture_profile(req.profile)
+    fields = _preview_fields(req.fields)
+    normalized = _normalized_url(url)
+    deadline = Deadline(_deadline_seconds(req.deadlineSeconds))
+    events: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: str, payload) -> None:
+        events.put_nowait((event, payload))
+
+    async def pipeline():
+        try:
+            cached = None if req.force else _cached_preview(url, normalized, profile, fields)
+            if cached is not None:
+                for event, payload in _replay_events(cached, fields):
+                    emit(event, payload)
+                emit("done", _shape(cached, fields, req.timings))
+                return
+            result = await scan_coalesced(
+                url, result_key(normalized, profile, fields), emit=emit, profile=profile, fields=fields,
+                deadline=deadline,
+            )
+            emit("done", _shape(
+                {**result, "cache": {"status": "bypass" if req.force else "miss", "ageSeconds": 0}}, fields, req.timings
+            ))
+        except HTTPException as e:
+            emit("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            emit("error", {"status": 500, "detail": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    async def stream():
+        task = asyncio.create_task(pipeline())
+        try:
+            while (item := await events.get()) is not None:
+                yield _sse(*item)
+        finally:
+            # Client went away: stop the scan instead of finishing it for nobody
+            task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def run_preview(
+    url: str, emit=None, profile: str | None = None, fields: frozenset | None = None,
+    deadline: Deadline | None = None,
+) -> dict:
+    """
+    Scan a URL and run the enrichment stages `fields` needs within `deadline`
+    (default SCAN_DEADLINE); raises HTTPException on failure.
+    """
+    deadline = deadline or Deadline()
+    data = await scan_url(url, profile, deadline)
+    result = await build_preview(url, data, emit=emit, fields=fields, deadline=deadline)
+    record_history(url, data, result, profile)
+    return result
+
+
+def record_history(url: str, data: dict, result: dict, profile: str | None, source: str = "api") -> None:
+    """Append a finished scan to the history store without holding up the response."""
+    history = get_history()
+    if history is None:
+        return
+
+    async def write():
+        try:
+            await asyncio.to_thread(history.record, url, data, result, profile, source)
+        except Exception as e:
+            logging.warning(f"Recording {url} in scan history failed: {e}")
+
+    task = asyncio.create_task(write())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def scan_url(url: str, profile: str | None = None, deadline: Deadline | None = None) -> dict:
+    """
+    Browser stage: returns the agent data, screenshot bytes included. The
+    agent keeps to its share of `deadline`; a scan still running when the
+    whole deadline has passed is cancelled (504).
+    """
+    started = time.monotonic()
+    deadline = deadline or Deadline()
+    budget = deadline.scan_budget()
+    metrics.SCANS_IN_FLIGHT.inc()
     try:
-        whois_domain = final_domain.removeprefix("www.")
-        raw_whois = fetch_whois(whois_domain)
-        if raw_whois:
-            whois_data = extract_whois_relevant_data(raw_whois)
-    except Exception:
-        pass
+        if app.state.scan_workers is not None:
+            scan = app.state.scan_workers.scan(url, profile, budget)
+        else:
+            scan = analyze_url_async(url, pool=app.state.browser_pool, profile=profile, budget=budget)
+        data = await asyncio.wait_for(scan, deadline.remaining())
+    except asyncio.TimeoutError:
+        metrics.SCANS.inc(outcome="timeout")
+        raise HTTPException(status_code=504, detail=f"Page did not load within the {deadline.seconds:g}s deadline")
+    except Exception as e:
+        metrics.SCANS.inc(outcome="error")
+        raise HTTPException(status_code=500, detail=f"Agent error: {e}")
+    finally:
+        metrics.SCANS_IN_FLIGHT.dec()
+
+    if data is None:
+        metrics.SCANS.inc(outcome="failed")
+        raise HTTPException(status_code=502, detail="Failed to load the URL")
 
-    # OpenPageRank lookup
-    pagerank_data = None
+    # Agent stage timings plus the wall time seen from here (queueing, IPC)
+    timings = data.setdefault("timings", {})
+    timings["wall"] = _elapsed_ms(started)
+    for stage, ms in timings.items():
+        metrics.STAGE_SECONDS.observe(ms / 1000, stage=f"scan.{stage}")
+    metrics.SCANS.inc(outcome="ok")
+    return data
+
+
+async def _resolved(value):
+    return value
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+def _skip(name: str, emit=None, skipped: list | None = None):
+    """Record a stage the deadline cut off; returns the value that stands in for its result."""
+    metrics.STAGE_SKIPPED.inc(stage=name)
+    if skipped is not None:
+        skipped.append(name)
+    if emit:
+        emit("skipped", {"stage": name})
+    if name == "safeBrowsing":
+        # Same shape as a failed lookup: unknown, not clean
+        return {"is_flagged": None, "threat_types": [], "error": "Skipped: scan deadline reached"}
+    return None
+
+
+async def _stage(
+    name: str, coro, emit=None, timings: dict | None = None,
+    deadline: Deadline | None = None, skipped: list | None = None,
+):
+    """
+    Await one pipeline stage and report its result as soon as it is ready.
+    Its duration goes to the stage histogram and, if given, into `timings`.
+    With a `deadline` the stage is cancelled when its budget runs out (or not
+    started when none is left) and listed in `skipped`.
+    """
+    budget = deadline.stage_budget(name) if deadline is not None else None
+    if budget == 0:
+        coro.close()
+        return _skip(name, emit, skipped)
+    started = time.monotonic()
     try:
-        pr_domain = final_domain.removeprefix("www.")
-        pagerank_data = fetch_pagerank(pr_domain)
+        value = await (coro if budget is None else asyncio.wait_for(coro, budget))
+    except asyncio.TimeoutError:
+        return _skip(name, emit, skipped)
     except Exception:
-        pass
+        metrics.STAGE_ERRORS.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        metrics.STAGE_SECONDS.observe(elapsed, stage=name)
+        if timings is not None:
+            timings[name] = round(elapsed * 1000, 1)
+    if emit:
+        emit(name, value)
+    return value
+
+
+async def build_preview(
+    url: str, data: dict, lookups: dict | None = None, emit=None, fields: frozenset | None = None,
+    deadline: Deadline | None = None,
+) -> dict:
+    """
+    Enrichment stages for a finished browser scan. `lookups` may carry
+    already-resolved "safeBrowsing" / "pageRank" results (e.g. from a batch).
+    `emit(event, payload)` is called as each stage finishes. With `fields`,
+    only those response keys (and the stages they depend on) are computed.
+    Stages still running when `deadline` passes are cancelled; the response
+    then has "partial": true and lists them under "skippedStages".
+    """
+    started = time.monotonic()
+    stage_timings: dict[str, float] = {}
+    lookups = lookups or {}
+    deadline = deadline or Deadline()
+    emit = emit or (lambda event, payload: None)
+    want = lambda name: fields is None or name in fields
+    # Browser steps the agent dropped for lack of budget count too
+    skipped = [
+        name for name in data.get("skipped") or []
+        if name != "privacyPolicy" or want("privacy") or want("privacyAnalysis")
+    ]
+    # The Gemini score is built on all three lookups
+    want_lookup = lambda name: want(name) or want("risk")
+    final_url = data.get("final_url", url)
+    redirects = data.get("redirects", [])
+    privacy = data.get("privacy_policy", {})
+    features = features_for(data)
+    scripts = features.scripts
+    has_login_form = features.has_login_form
+    third_party_scripts = features.third_party_scripts
+    final_domain = urlparse(final_url).netloc
+
+    ssl = final_url.startswith("https://")
+    has_privacy = bool(privacy and privacy.get("link"))
 
-    # Google Safe Browsing lookup
-    safe_browsing = fetch_safe_browsing(final_url)
+    signals = {
+        "title": features.title[:200],
+        "ssl": ssl,
+        "hasPrivacyLink": has_privacy,
+        "hasLoginForm": has_login_form,
+        "thirdPartyScriptsCount": len(third_party_scripts),
+        "hasMetaRefresh": features.meta_refresh is not None,
+        "iframeCount": len(features.iframes),
+    }
+    privacy_summary = {
+        "link": privacy.get("link") if privacy else None,
+        "snippet": (privacy.get("text") or "")[:500] if privacy else None,
+    }
+    # Capture profile, bytes transferred and blocked/tracker requests
+    capture = data.get("capture")
+    # How long the agent waited for the page to go quiet
+    settle = data.get("settle")
+    navigation = {
+        "finalUrl": final_url,
+        "redirectCount": len(redirects),
+        "redirects": redirects,
+        "signals": signals,
+        "privacy": privacy_summary,
+        "scripts": scripts[:20],
+        "capture": capture,
+        "settle": settle,
+    }
+    if any(want(k) for k in navigation):
+        emit("navigation", {k: v for k, v in navigation.items() if want(k)})
+    # The image itself is served by /api/screenshots; responses only carry a reference
+    screenshot = data.get("screenshot")
+    screenshot_ref = screenshot_store.save(screenshot) if want("screenshot") else None
+    if want("screenshot"):
+        emit("screenshot", {"screenshot": screenshot_ref})
+
+    stage_started = time.monotonic()
+    risk_record = risk_features(data, url)
+    risk = score_features(risk_record)
+    stage_timings["risk"] = _elapsed_ms(stage_started)
+    if want("risk"):
+        emit("risk", risk)
 
-    # Gemini AI risk assessment
     signals_for_gemini = {
         "ssl": ssl,
         "hasLoginForm": has_login_form,
         "thirdPartyScriptsCount": len(third_party_scripts),
         "hasPrivacyLink": has_privacy,
+        "brandImpersonation": [hit_reason(h) for h in risk_record["brandHits"]],
     }
-    gemini_risk = ask_gemini_for_score(
-        url, final_url, whois_data, safe_browsing, pagerank_data, signals_for_gemini
+    lookup_domain = final_domain.removeprefix("www.")
+    html_raw = data.get("html", "")
+    privacy_text = (privacy.get("text") or "") if privacy else ""
+    privacy_link_val = privacy.get("link") if privacy else None
+
+    # Enrichment runs as a dependency graph: WHOIS, PageRank, Safe Browsing and
+    # the three independent Gemini prompts start right away, and the Gemini
+    # score prompt only waits for the three lookups it feeds on.
+    # Stages nobody asked for resolve to None without running.
+    whois_task = asyncio.create_task(
+        _stage("whois", lookup_whois(lookup_domain), emit, stage_timings, deadline, skipped)
+        if want_lookup("whois") else _resolved(None)
+    )
+    pagerank_task = asyncio.create_task(_stage(
+        "pageRank",
+        _resolved(lookups["pageRank"]) if "pageRank" in lookups else lookup_pagerank(lookup_domain),
+        emit,
+        stage_timings,
+        None if "pageRank" in lookups else deadline,
+        skipped,
+    ) if want_lookup("pageRank") else _resolved(None))
+    safe_browsing_task = asyncio.create_task(_stage(
+        "safeBrowsing",
+        _resolved(lookups["safeBrowsing"]) if "safeBrowsing" in lookups else fetch_safe_browsing(final_url),
+        emit,
+        stage_timings,
+        None if "safeBrowsing" in lookups else deadline,
+        skipped,
+    ) if want_lookup("safeBrowsing") else _resolved(None))
+
+    async def separate_ai():
+        summary_task = asyncio.create_task(
+            _stage(
+                "aiSummary", ask_gemini_site_summary(url, final_url, html_raw), emit, stage_timings, deadline, skipped
+            )
+            if want("aiSummary") else _resolved(None)
+        )
+        caption_task = asyncio.create_task(
+            _stage("aiCaption", ask_gemini_image_caption(screenshot), emit, stage_timings, deadline, skipped)
+            if want("aiCaption") else _resolved(None)
+        )
+        privacy_task = asyncio.create_task(
+            _stage(
+                "privacyAnalysis", lookup_privacy_analysis(privacy_text, privacy_link_val),
+                emit, stage_timings, deadline, skipped,
+            )
+            if want("privacyAnalysis") else _resolved(None)
+        )
+
+        async def score_stage():
+            if not want("risk"):
+                return None
+            whois_data, pagerank_data, safe_browsing = await asyncio.gather(
+                whois_task, pagerank_task, safe_browsing_task
+            )
+            return await _stage("aiScore", ask_gemini_for_score(
+                url, final_url, whois_data, safe_browsing, pagerank_data, signals_for_gemini
+            ), emit, stage_timings, deadline, skipped)
+
+        return await asyncio.gather(score_stage(), summary_task, caption_task, privacy_task)
+
+    async def combined_ai():
+        # One request for all four answers; it needs the lookups first
+        whois_data, pagerank_data, safe_browsing = await asyncio.gather(
+            whois_task, pagerank_task, safe_browsing_task
+        )
+        # A policy analyzed before doesn't need to go into the prompt again
+        privacy_key = privacy_text_key(privacy_text) if privacy_text else None
+        cached_privacy = await privacy_analysis_cache.get(privacy_key) if privacy_key else None
+        known_privacy = isinstance(cached_privacy, dict)
+        combined = await _stage("aiCombined", ask_gemini_combined(
+            url, final_url, html_raw, screenshot,
+            "" if known_privacy or not want("privacyAnalysis") else privacy_text,
+            whois_data, safe_browsing, pagerank_data, signals_for_gemini,
+        ), timings=stage_timings, deadline=deadline, skipped=skipped)
+        if combined is None:
+            return await separate_ai()
+        if known_privacy:
+            combined["privacyAnalysis"] = cached_privacy
+        elif privacy_key and want("privacyAnalysis") and combined["privacyAnalysis"] is not None:
+            privacy_analysis_cache.set(privacy_key, combined["privacyAnalysis"])
+        answers = {
+            "risk": combined["risk"],
+            "aiSummary": combined["summary"],
+            "aiCaption": combined["caption"],
+            "privacyAnalysis": combined["privacyAnalysis"] if want("privacyAnalysis") else None,
+        }
+        for name, value in answers.items():
+            if want(name):
+                emit("aiScore" if name == "risk" else name, value)
+        return tuple(answers.values())
+
+    # The combined prompt answers all four at once and needs the lookups the
+    # score is built on, so it only pays off when risk and more are wanted
+    ai_fields = sum(want(k) for k in ("risk", "aiSummary", "aiCaption", "privacyAnalysis"))
+    gemini_risk, ai_summary, ai_caption, privacy_analysis = await (
+        combined_ai() if GEMINI_MODE == "combined" and want("risk") and ai_fields > 1 else separate_ai()
     )
+    # Already done when the score used them; still running if only they were asked for
+    whois_data, pagerank_data, safe_browsing = await asyncio.gather(whois_task, pagerank_task, safe_browsing_task)
+
     # Use Gemini score if available, fall back to heuristic
-    if gemini_risk["score"] is not None:
+    if gemini_risk is not None and gemini_risk["score"] is not None:
         risk = {
             "score": gemini_risk["score"],
             "tier": gemini_risk["tier"],
@@ -540,34 +1716,22 @@ async def preview(req: PreviewRequest):
         risk["reasoning"] = None
         risk["domainTrustScore"] = None
 
-    # Gemini AI site summary and image caption
-    html_raw = data.get("html", "")
-    ai_summary = ask_gemini_site_summary(url, final_url, html_raw)
-    ai_caption = ask_gemini_image_caption(screenshot_b64)
-
-    # Gemini privacy policy analysis
-    privacy_text = (privacy.get("text") or "") if privacy else ""
-    privacy_link_val = privacy.get("link") if privacy else None
-    privacy_analysis = ask_gemini_privacy_analysis(privacy_text, privacy_link_val)
+    enrichment_ms = _elapsed_ms(started)
+    metrics.STAGE_SECONDS.observe(enrichment_ms / 1000, stage="enrichment")
+    scan_timings = data.get("timings") or {}
+    timings = {
+        "scan": scan_timings,
+        "stages": stage_timings,
+        "enrichment": enrichment_ms,
+        "total": round(scan_timings.get("wall", 0) + enrichment_ms, 1),
+    }
 
-    return {
+    result = {
         "ok": True,
-        "finalUrl": final_url,
-        "redirectCount": len(redirects),
-        "redirects": redirects,
-        "screenshotBase64": screenshot_b64,
-        "signals": {
-            "title": data.get("html", "")[:200],
-            "ssl": ssl,
-            "hasPrivacyLink": has_privacy,
-            "hasLoginForm": has_login_form,
-            "thirdPartyScriptsCount": len(third_party_scripts),
-        },
-        "privacy": {
-            "link": privacy.get("link") if privacy else None,
-            "snippet": (privacy.get("text") or "")[:500] if privacy else None,
-        },
-        "scripts": scripts[:20],
+        "partial": bool(skipped),
+        "skippedStages": skipped,
+        **navigation,
+        "screenshot": screenshot_ref,
         "risk": risk,
         "whois": whois_data,
         "safeBrowsing": safe_browsing,
@@ -575,4 +1739,8 @@ async def preview(req: PreviewRequest):
         "aiSummary": ai_summary,
         "aiCaption": ai_caption,
         "privacyAnalysis": privacy_analysis,
+        "timings": timings,
     }
+    if fields is None:
+        return result
+    return {k: v for k, v in result.items() if k in RESPONSE_META or k in fields or k == "timings"}
@@ -0,0 +1,143 @@
+"""
+Minimal Prometheus metrics: counters, gauges and histograms with labels,
+rendered in the text exposition format by render() for GET /metrics.
+"""
+import math
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry: list = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple, extra: dict | None = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        return self.header() + [
+            f"{self.name}{_label_str(self.labelnames, k)} {v}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time by `collect() -> {labels tuple: value}`."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), collect=None):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        values = dict(self._values)
+        if self.collect is not None:
+            try:
+                values.update(self.collect())
+            except Exception:
+                pass
+        return self.header() + [f"{self.name}{_label_str(self.labelnames, k)} {v}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._series: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, key, {'le': le})} {count}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+def render() -> str:
+    """Every registered metric in Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- SafeLink metrics ---
+STAGE_SECONDS = Histogram(
+    "safelink_stage_duration_seconds", "Time spent in each scan/preview stage", ("stage",)
+)
+STAGE_ERRORS = Counter("safelink_stage_errors_total", "Stages that raised an error", ("stage",))
+STAGE_SKIPPED = Counter(
+    "safelink_stage_skipped_total", "Stages cancelled or not started because the scan deadline ran out", ("stage",)
+)
+UPSTREAM_SECONDS = Histogram(
+    "safelink_upstream_request_duration_seconds", "Upstream HTTP request latency", ("upstream",)
+)
+UPSTREAM_ERRORS = Counter(
+    "safelink_upstream_errors_total", "Upstream requests that failed or returned an error status", ("upstream",)
+)
+SCANS = Counter("safelink_scans_total", "Finished browser scans by outcome", ("outcome",))
+SCANS_IN_FLIGHT = Gauge("safelink_scans_in_flight", "Browser scans currently running")
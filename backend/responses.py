@@ -0,0 +1,156 @@
+"""
+Response encoding: fast JSON serialization and negotiated compression.
+
+FastJSONResponse renders with orjson when it is installed (plain json
+otherwise). Endpoints that build large dicts return it directly, which also
+skips FastAPI's recursive jsonable_encoder pass over the content.
+
+CompressionMiddleware compresses single-body responses with brotli (when the
+brotli package is installed) or gzip, whichever the client prefers in
+Accept-Encoding. Streaming responses (SSE) and already-compressed media such
+as screenshots pass through untouched, their headers sent without delay.
+"""
+import gzip
+import json
+import os
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "image/svg+xml", "application/javascript")
+
+
+def dumps(content) -> bytes:
+    """JSON bytes for `content`; NumPy scalars and arrays are accepted too."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def _json_default(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}."""
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> str | None:
+    """Best supported coding for an Accept-Encoding header; br wins ties."""
+    accepted = _accepted_encodings(header)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing whole (non-streamed) responses."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                if self._streamed_or_ineligible(message["headers"]):
+                    # Headers go out right away: an SSE client is waiting for them
+                    passthrough = True
+                    return await send(message)
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough or start is None:
+                return await send(message)
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                passthrough = True
+                await send(start)
+                return await send(message)
+
+            response_headers = start["headers"]
+            compressed = compress(body, encoding)
+            kept = [(k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"vary", b"etag")]
+            vary = [v for k, v in response_headers if k.lower() == b"vary"]
+            kept += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send({**start, "headers": kept})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_compressed)
+
+    def _streamed_or_ineligible(self, response_headers) -> bool:
+        """
+        Whether a response can be passed on without looking at its body.
+        Only single-body responses carry a Content-Length; streamed ones
+        (SSE, StreamingResponse) don't and are never held back.
+        """
+        headers = {k.lower(): v for k, v in response_headers}
+        content_type = headers.get(b"content-type", b"").decode("latin-1")
+        length = headers.get(b"content-length")
+        return (
+            length is None
+            or int(length) < self.minimum_size
+            or content_type.startswith("text/event-stream")
+            or not content_type.startswith(COMPRESSIBLE_TYPES)
+            or b"content-encoding" in headers
+        )
@@ -0,0 +1,456 @@
+"""
+Local Safe Browsing threat lists (Update API v4 model).
+
+URLs are canonicalized and expanded into host-suffix/path-prefix expressions
+as the Safe Browsing spec describes; each expression is SHA-256 hashed and
+its leading bytes looked up in locally stored hash prefixes. Prefixes are
+kept per threat list as one sorted byte string per prefix length and
+searched with bisect, so a URL with no prefix hit is answered locally in
+microseconds. Only prefix hits need a fullHashes:find round trip, and the
+full hashes it returns are cached for the duration the API allows.
+
+The lists live in a JSON file (SAFE_BROWSING_DB) and are kept current with
+threatListUpdates:fetch partial updates, verified against the list checksum.
+32-byte "prefixes" are full hashes and need no confirmation, which lets a
+small hand-made fixture file stand in for the real lists when testing.
+"""
+import asyncio
+import base64
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import sys
+import time
+from urllib.parse import unquote
+
+from cache import TTLCache
+from http_client import get_client, register_upstream
+
+SAFE_BROWSING_DB = os.environ.get("SAFE_BROWSING_DB", "")
+UPDATE_INTERVAL = float(os.environ.get("SAFE_BROWSING_UPDATE_INTERVAL", "1800"))
+API_BASE = os.environ.get("SAFE_BROWSING_API_URL", "https://safebrowsing.googleapis.com/v4")
+register_upstream("safeBrowsing", API_BASE)
+CLIENT_INFO = {"clientId": "safelink", "clientVersion": "1.0"}
+PLATFORM_TYPE = "ANY_PLATFORM"
+THREAT_ENTRY_TYPE = "URL"
+DEFAULT_THREAT_TYPES = ["MALWARE", "SOCIAL_ENGINEERING", "UNWANTED_SOFTWARE", "POTENTIALLY_HARMFUL_APPLICATION"]
+FULL_HASH_SIZE = 32
+
+logger = logging.getLogger(__name__)
+
+
+# --- Canonicalization ---
+def _unescape_fully(s: str) -> str:
+    """Percent-unescape until nothing changes (bytes kept 1:1 as latin-1 chars)."""
+    while True:
+        unescaped = unquote(s, encoding="latin-1")
+        if unescaped == s:
+            return s
+        s = unescaped
+
+
+def _escape(s: str) -> str:
+    return "".join(f"%{ord(c):02X}" if ord(c) <= 32 or ord(c) >= 127 or c in "#%" else c for c in s)
+
+
+def _canonical_host(host: str) -> str:
+    # ASCII-only lowercasing: other chars are raw bytes here
+    host = re.sub(r"\.{2,}", ".", host.strip(".")).encode("latin-1").lower().decode("latin-1")
+    try:
+        # Decimal, octal, hex and short-form IPv4 all become a dotted quad
+        if re.fullmatch(r"[0-9a-fx.]+", host) and any(c.isdigit() for c in host):
+            return socket.inet_ntoa(socket.inet_aton(host))
+    except OSError:
+        pass
+    return host
+
+
+def _canonical_path(path: str) -> str:
+    segments: list[str] = []
+    for segment in path.split("/")[1:]:
+        if segment == "..":
+            if segments:
+                segments.pop()
+        elif segment not in (".", ""):
+            segments.append(segment)
+    trailing = path.endswith("/") or path.endswith("/.") or path.endswith("/..")
+    canonical = "/" + "/".join(segments)
+    return canonical + "/" if trailing and segments else canonical
+
+
+def canonicalize(url: str) -> tuple[str, str, str | None]:
+    """
+    Canonical (host, path, query) of a URL per the Safe Browsing spec; the
+    query is None when the URL has no "?".
+    """
+    url = url.strip().encode("utf-8").decode("latin-1")
+    url = re.sub(r"[\t\r\n]", "", url).split("#", 1)[0]
+    url = _unescape_fully(url)
+    if "://" not in url:
+        url = "http://" + url
+    rest = url.split("://", 1)[1]
+
+    end = len(rest)
+    for sep in "/?":
+        i = rest.find(sep)
+        if i != -1:
+            end = min(end, i)
+    authority, remainder = rest[:end], rest[end:]
+    host = authority.rsplit("@", 1)[-1]
+    if not host.startswith("["):
+        host = host.split(":", 1)[0]
+
+    query = None
+    if "?" in remainder:
+        remainder, query = remainder.split("?", 1)
+    path = _canonical_path(remainder or "/")
+    return (
+        _escape(_canonical_host(host)),
+        _escape(path),
+        _escape(query) if query is not None else None,
+    )
+
+
+def url_expressions(url: str) -> list[str]:
+    """The host-suffix x path-prefix expressions to look up for a URL."""
+    host, path, query = canonicalize(url)
+
+    hosts = [host]
+    if not re.fullmatch(r"[0-9.]+", host):
+        parts = host.split(".")
+        # Last five components, dropping leading ones, never the bare TLD
+        for n in range(min(len(parts) - 1, 5), 1, -1):
+            hosts.append(".".join(parts[-n:]))
+
+    paths = []
+    if query is not None:
+        paths.append(f"{path}?{query}")
+    paths.append(path)
+    directories = path.split("/")[1:-1]
+    for i in range(min(len(directories), 3) + 1):
+        paths.append("/" + "".join(d + "/" for d in directories[:i]))
+
+    return list(dict.fromkeys(h + p for h in dict.fromkeys(hosts) for p in paths))
+
+
+def full_hash(expression: str) -> bytes:
+    return hashlib.sha256(expression.encode("latin-1")).digest()
+
+
+# --- Local store ---
+class _Fixed:
+    """Sequence view of a blob of equal-size prefixes, for bisect."""
+
+    def __init__(self, blob: bytes, size: int):
+        self.blob = blob
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.blob) // self.size
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.blob[i * self.size:(i + 1) * self.size]
+
+
+class ThreatList:
+    """Sorted hash prefixes for one threat type, grouped by prefix length."""
+
+    def __init__(self, threat_type: str, state: str = "", groups: dict[int, bytes] | None = None):
+        self.threat_type = threat_type
+        self.state = state
+        self.groups = groups or {}
+
+    def __len__(self) -> int:
+        return sum(len(blob) // size for size, blob in self.groups.items())
+
+    def match(self, digest: bytes) -> bytes | None:
+        """The stored prefix of digest, if any."""
+        for size, blob in self.groups.items():
+            prefix = digest[:size]
+            view = _Fixed(blob, size)
+            i = bisect.bisect_left(view, prefix)
+            if i < len(view) and view[i] == prefix:
+                return prefix
+        return None
+
+    def prefixes(self) -> list[bytes]:
+        """Every prefix in lexicographic order (the order update indices use)."""
+        return sorted(blob[i:i + size] for size, blob in self.groups.items() for i in range(0, len(blob), size))
+
+    def set_prefixes(self, prefixes) -> None:
+        grouped: dict[int, list[bytes]] = {}
+        for prefix in set(prefixes):
+            grouped.setdefault(len(prefix), []).append(prefix)
+        self.groups = {size: b"".join(sorted(items)) for size, items in grouped.items()}
+
+    def with_update(self, update: dict) -> "ThreatList":
+        """
+        A new list with one listUpdateResponses entry applied; this one is left
+        as it is. Raises ValueError on a checksum mismatch.
+        """
+        current = [] if update.get("responseType") == "FULL_UPDATE" else self.prefixes()
+        removed = set()
+        for removal in update.get("removals", []):
+            removed.update(removal.get("rawIndices", {}).get("indices", []))
+        prefixes = [p for i, p in enumerate(current) if i not in removed]
+        for addition in update.get("additions", []):
+            raw = addition.get("rawHashes", {})
+            size = int(raw.get("prefixSize", 4))
+            blob = base64.b64decode(raw.get("rawHashes", ""))
+            prefixes.extend(blob[i:i + size] for i in range(0, len(blob), size))
+        updated = ThreatList(self.threat_type, update.get("newClientState", self.state))
+        updated.set_prefixes(prefixes)
+
+        expected = update.get("checksum", {}).get("sha256")
+        if expected and hashlib.sha256(b"".join(updated.prefixes())).digest() != base64.b64decode(expected):
+            raise ValueError(f"Checksum mismatch for {self.threat_type} list")
+        return updated
+
+
+class ThreatListStore:
+    """All threat lists, loadable from and savable to a JSON file."""
+
+    def __init__(self, lists: dict[str, ThreatList] | None = None):
+        self.lists = lists or {}
+
+    def __len__(self) -> int:
+        return sum(len(lst) for lst in self.lists.values())
+
+    @classmethod
+    def load(cls, path: str) -> "ThreatListStore":
+        with open(path) as f:
+            raw = json.load(f)
+        lists = {}
+        for threat_type, entry in raw.get("lists", {}).items():
+            groups = {int(size): base64.b64decode(blob) for size, blob in entry.get("prefixes", {}).items()}
+            lists[threat_type] = ThreatList(threat_type, entry.get("state", ""), groups)
+        return cls(lists)
+
+    def save(self, path: str) -> None:
+        raw = {"lists": {
+            threat_type: {
+                "state": lst.state,
+                "prefixes": {str(size): base64.b64encode(blob).decode() for size, blob in lst.groups.items()},
+            }
+            for threat_type, lst in self.lists.items()
+        }}
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(raw, f)
+        os.replace(tmp, path)
+
+    def add_urls(self, threat_type: str, urls: list[str]) -> None:
+        """Add full hashes of the URLs' exact expressions (for fixtures)."""
+        lst = self.lists.setdefault(threat_type, ThreatList(threat_type))
+        added = []
+        for url in urls:
+            host, path, query = canonicalize(url)
+            added.append(full_hash(host + path + (f"?{query}" if query is not None else "")))
+        lst.set_prefixes(lst.prefixes() + added)
+
+    def match(self, digest: bytes) -> list[tuple[str, bytes]]:
+        """(threat type, prefix) for every list holding a prefix of digest."""
+        hits = []
+        for threat_type, lst in self.lists.items():
+            prefix = lst.match(digest)
+            if prefix is not None:
+                hits.append((threat_type, prefix))
+        return hits
+
+
+def _seconds(duration: str | None, default: float) -> float:
+    """Parse an API duration like "300.5s"."""
+    try:
+        return float(str(duration).rstrip("s"))
+    except (TypeError, ValueError):
+        return default
+
+
+class ThreatDatabase:
+    """Local lookups with full-hash confirmation and incremental list updates."""
+
+    def __init__(self, store: ThreatListStore, path: str = "", threat_types: list[str] | None = None):
+        self.store = store
+        self.path = path
+        self.threat_types = threat_types or list(store.lists) or DEFAULT_THREAT_TYPES
+        self._full_hashes = TTLCache(50000)  # full hash -> threat types
+        self._negative = TTLCache(50000)  # prefix -> True while known not to match
+        self.lookups = 0
+        self.prefix_hits = 0
+        self.full_hash_requests = 0
+        self.last_update: float | None = None
+
+    @classmethod
+    def from_file(cls, path: str) -> "ThreatDatabase":
+        store = ThreatListStore.load(path) if os.path.exists(path) else ThreatListStore()
+        return cls(store, path)
+
+    @property
+    def ready(self) -> bool:
+        return len(self.store) > 0
+
+    async def check_urls(self, urls: list[str]) -> dict[str, dict]:
+        """Safe Browsing verdicts for many URLs; is_flagged is None if unconfirmed."""
+        results: dict[str, dict] = {}
+        to_confirm: dict[str, list[tuple[bytes, str, bytes]]] = {}
+        for url in dict.fromkeys(urls):
+            self.lookups += 1
+            confirmed: set[str] = set()
+            pending = []
+            for expression in url_expressions(url):
+                digest = full_hash(expression)
+                for threat_type, prefix in self.store.match(digest):
+                    self.prefix_hits += 1
+                    cached = self._full_hashes.get(digest, None)
+                    if len(prefix) == FULL_HASH_SIZE:
+                        confirmed.add(threat_type)
+                    elif cached is not None:
+                        if threat_type in cached:
+                            confirmed.add(threat_type)
+                    elif self._negative.get(prefix, None) is None:
+                        pending.append((digest, threat_type, prefix))
+            results[url] = {"is_flagged": bool(confirmed), "threat_types": sorted(confirmed)}
+            if pending:
+                to_confirm[url] = pending
+
+        if to_confirm:
+            try:
+                await self._confirm({p for pending in to_confirm.values() for _, _, p in pending})
+            except Exception as e:
+                for url in to_confirm:
+                    if not results[url]["is_flagged"]:
+                        results[url] = {"is_flagged": None, "threat_types": [], "error": f"Full-hash check failed: {e}"}
+                return results
+            for url, pending in to_confirm.items():
+                types = set(results[url]["threat_types"])
+                for digest, threat_type, _ in pending:
+                    if threat_type in (self._full_hashes.get(digest, None) or ()):
+                        types.add(threat_type)
+                results[url] = {"is_flagged": bool(types), "threat_types": sorted(types)}
+        return results
+
+    async def _confirm(self, prefixes: set[bytes]) -> None:
+        """fullHashes:find for prefix hits; fills the positive/negative caches."""
+        api_key = os.environ.get("GOOGLE_SAFE_BROWSING_KEY", "")
+        if not api_key:
+            raise RuntimeError("GOOGLE_SAFE_BROWSING_KEY is not set")
+        self.full_hash_requests += 1
+        resp = await get_client().post(
+            f"{API_BASE}/fullHashes:find?key={api_key}",
+            json={
+                "client": CLIENT_INFO,
+                "clientStates": [lst.state for lst in self.store.lists.values() if lst.state],
+                "threatInfo": {
+                    "threatTypes": self.threat_types,
+                    "platformTypes": [PLATFORM_TYPE],
+                    "threatEntryTypes": [THREAT_ENTRY_TYPE],
+                    "threatEntries": [{"hash": base64.b64encode(p).decode()} for p in prefixes],
+                },
+            },
+            timeout=10,
+        )
+        resp.raise_for_status()
+        body = resp.json()
+        found: dict[bytes, tuple[set, float]] = {}
+        for match in body.get("matches", []):
+            digest = base64.b64decode(match.get("threat", {}).get("hash", ""))
+            types, ttl = found.setdefault(digest, (set(), 0.0))
+            types.add(match.get("threatType"))
+            found[digest] = (types, max(ttl, _seconds(match.get("cacheDuration"), 300)))
+        for digest, (types, ttl) in found.items():
+            self._full_hashes.set(digest, types, ttl)
+        # Any full hash under a queried prefix that wasn't returned is safe for
+        # negativeCacheDuration, but not past the expiry of a returned one
+        negative_ttl = _seconds(body.get("negativeCacheDuration"), 300)
+        for prefix in prefixes:
+            ttls = [ttl for digest, (_, ttl) in found.items() if digest.startswith(prefix)]
+            self._negative.set(prefix, True, min([negative_ttl, *ttls]))
+
+    async def update(self) -> float:
+        """Fetch and apply list updates; returns seconds to wait before the next one."""
+        api_key = os.environ.get("GOOGLE_SAFE_BROWSING_KEY", "")
+        if not api_key:
+            return UPDATE_INTERVAL
+        resp = await get_client().post(
+            f"{API_BASE}/threatListUpdates:fetch?key={api_key}",
+            json={
+                "client": CLIENT_INFO,
+                "listUpdateRequests": [
+                    {
+                        "threatType": threat_type,
+                        "platformType": PLATFORM_TYPE,
+                        "threatEntryType": THREAT_ENTRY_TYPE,
+                        "state": self.store.lists[threat_type].state if threat_type in self.store.lists else "",
+                        "constraints": {"supportedCompressions": ["RAW"]},
+                    }
+                    for threat_type in self.threat_types
+                ],
+            },
+            timeout=60,
+        )
+        resp.raise_for_status()
+        # A full update is megabytes of prefixes: decode, merge, checksum and
+        # save in a thread so lookups keep being answered meanwhile
+        body = await asyncio.to_thread(resp.json)
+        for update in body.get("listUpdateResponses", []):
+            threat_type = update.get("threatType")
+            lst = self.store.lists.get(threat_type) or ThreatList(threat_type)
+            try:
+                lst = await asyncio.to_thread(lst.with_update, update)
+            except ValueError as e:
+                # Spec: drop the list, so the next update is a full one
+                logger.warning(f"Safe Browsing update rejected: {e}")
+                lst = ThreatList(threat_type)
+            self.store.lists[threat_type] = lst  # swapped in whole; lookups never see half a merge
+        self._negative = TTLCache(50000)
+        self.last_update = time.time()
+        if self.path:
+            await asyncio.to_thread(self.store.save, self.path)
+        return max(_seconds(body.get("minimumWaitDuration"), 0), UPDATE_INTERVAL)
+
+    async def update_loop(self) -> None:
+        while True:
+            try:
+                wait = await self.update()
+            except Exception as e:
+                logger.error(f"Safe Browsing list update failed: {e}")
+                wait = UPDATE_INTERVAL
+            await asyncio.sleep(wait)
+
+    def stats(self) -> dict:
+        return {
+            "prefixes": len(self.store),
+            "lists": {t: len(lst) for t, lst in self.store.lists.items()},
+            "lookups": self.lookups,
+            "prefixHits": self.prefix_hits,
+            "fullHashRequests": self.full_hash_requests,
+            "lastUpdate": self.last_update,
+        }
+
+
+_db: ThreatDatabase | None = None
+
+
+def get_threat_db() -> ThreatDatabase | None:
+    """The local threat database configured via SAFE_BROWSING_DB, or None."""
+    global _db
+    if _db is None and SAFE_BROWSING_DB:
+        _db = ThreatDatabase.from_file(SAFE_BROWSING_DB)
+    return _db
+
+
+# --- Fixture CLI ---
+if __name__ == "__main__":
+    # python safe_browsing.py fixture.json SOCIAL_ENGINEERING http://evil.example/login ...
+    if len(sys.argv) < 4:
+        print("usage: safe_browsing.py <db.json> <THREAT_TYPE> <url> [<url> ...]")
+        sys.exit(1)
+    db_path, threat, *entries = sys.argv[1:]
+    fixture = ThreatListStore.load(db_path) if os.path.exists(db_path) else ThreatListStore()
+    fixture.add_urls(threat, entries)
+    fixture.save(db_path)
+    print(f"{db_path}: {len(fixture)} hashes")
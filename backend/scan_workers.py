@@ -0,0 +1,291 @@
+"""
+Multi-process scan workers.
+
+With SCAN_WORKERS > 0 the API process stops driving browsers itself. It
+starts N worker processes instead; each one runs its own event loop and
+BrowserPool and performs whole scans (navigation, screenshot, HTML feature
+extraction, privacy fetch). Requests and results travel over a duplex
+multiprocessing Pipe per worker. The parent routes each scan to the worker
+with the fewest scans in flight, and restarts workers that exit or stop
+answering heartbeats; scans that were in flight on them fail with an error.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", "0"))
+BROWSERS_PER_WORKER = int(os.environ.get("SCAN_WORKER_BROWSERS", "1"))
+SCANS_PER_WORKER = int(os.environ.get("SCAN_WORKER_CONCURRENCY", "4"))
+HEARTBEAT_INTERVAL = float(os.environ.get("SCAN_WORKER_HEARTBEAT", "5"))
+HANG_TIMEOUT = float(os.environ.get("SCAN_WORKER_HANG_TIMEOUT", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+# --- Worker process side ---
+def _worker_main(conn, browsers: int, concurrency: int) -> None:
+    """Entry point of a worker process: serve scan requests until told to stop."""
+    asyncio.run(_serve(conn, browsers, concurrency))
+
+
+async def _serve(conn, browsers: int, concurrency: int) -> None:
+    from agent import analyze_url_async
+    from browser_pool import BrowserPool
+
+    loop = asyncio.get_running_loop()
+    pool = BrowserPool(size=browsers, max_concurrent=concurrency)
+    await pool.start()
+    send_lock = threading.Lock()
+    tasks: dict[int, asyncio.Task] = {}
+    stopped = asyncio.Event()
+
+    def send(message) -> None:
+        with send_lock:
+            conn.send(message)
+
+    async def scan(req_id: int, url: str, profile: str | None, budget: float | None) -> None:
+        try:
+            data = await analyze_url_async(url, pool=pool, profile=profile, budget=budget)
+            reply = ("result", req_id, data, None)
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            reply = ("result", req_id, None, str(e) or type(e).__name__)
+        finally:
+            tasks.pop(req_id, None)
+        # Screenshots make replies large; don't block the loop on the pipe
+        await asyncio.to_thread(send, reply)
+
+    def dispatch(message) -> None:
+        kind = message[0]
+        if kind == "scan":
+            _, req_id, url, profile, budget = message
+            tasks[req_id] = asyncio.create_task(scan(req_id, url, profile, budget))
+        elif kind == "cancel":
+            task = tasks.get(message[1])
+            if task is not None:
+                task.cancel()
+        elif kind == "ping":
+            send(("pong", message[1], pool.stats()))
+        elif kind == "stop":
+            stopped.set()
+
+    def read() -> None:
+        try:
+            while True:
+                loop.call_soon_threadsafe(dispatch, conn.recv())
+        except (EOFError, OSError):
+            # Parent went away
+            loop.call_soon_threadsafe(stopped.set)
+
+    threading.Thread(target=read, daemon=True).start()
+    try:
+        await stopped.wait()
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
+        await pool.close()
+
+
+# --- API process side ---
+class _Worker:
+    """Parent-side handle for one worker process."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.pending: dict[int, asyncio.Future] = {}
+        self.last_pong = 0.0
+        self.scans = 0
+        self.restarts = 0
+        self.pool_stats: dict | None = None
+
+    @property
+    def inflight(self) -> int:
+        return len(self.pending)
+
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+
+class ScanWorkerPool:
+    """Routes scans to worker processes by load and keeps the workers alive."""
+
+    def __init__(
+        self,
+        workers: int = SCAN_WORKERS,
+        browsers: int = BROWSERS_PER_WORKER,
+        concurrency: int = SCANS_PER_WORKER,
+        heartbeat: float = HEARTBEAT_INTERVAL,
+        hang_timeout: float = HANG_TIMEOUT,
+    ):
+        self.browsers = browsers
+        self.concurrency = concurrency
+        self.heartbeat = heartbeat
+        self.hang_timeout = hang_timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._workers = [_Worker(i) for i in range(max(1, workers))]
+        self._ids = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._monitor_task: asyncio.Task | None = None
+
+    # --- Lifecycle ---
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        for worker in self._workers:
+            self._spawn(worker)
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def close(self) -> None:
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        for worker in self._workers:
+            self._send(worker, ("stop",))
+        await asyncio.gather(*(asyncio.to_thread(self._stop_process, w) for w in self._workers))
+
+    # --- Scanning ---
+    async def scan(self, url: str, profile: str | None = None, budget: float | None = None) -> dict | None:
+        """
+        Run analyze_url_async in the least loaded worker and return its data.
+        `budget` is the scan's time budget in seconds, counted from here.
+        """
+        worker = self._pick_worker()
+        req_id = next(self._ids)
+        future = self._loop.create_future()
+        worker.pending[req_id] = future
+        worker.scans += 1
+        if not self._send(worker, ("scan", req_id, url, profile, budget)):
+            worker.pending.pop(req_id, None)
+            raise WorkerCrashed(f"Scan worker {worker.index} is not running")
+        try:
+            data, error = await future
+        except asyncio.CancelledError:
+            # Caller gave up: stop the scan in the worker as well
+            self._send(worker, ("cancel", req_id))
+            raise
+        finally:
+            worker.pending.pop(req_id, None)
+        if error is not None:
+            raise RuntimeError(error)
+        return data
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "alive": sum(1 for w in self._workers if w.alive()),
+            "inFlight": sum(w.inflight for w in self._workers),
+            "perWorker": [
+                {
+                    "pid": w.process.pid if w.process else None,
+                    "alive": w.alive(),
+                    "inFlight": w.inflight,
+                    "scans": w.scans,
+                    "restarts": w.restarts,
+                    "browserPool": w.pool_stats,
+                }
+                for w in self._workers
+            ],
+        }
+
+    # --- Internals ---
+    def _pick_worker(self) -> _Worker:
+        candidates = [w for w in self._workers if w.alive()]
+        if not candidates:
+            raise WorkerCrashed("No scan worker available")
+        return min(candidates, key=lambda w: w.inflight)
+
+    def _send(self, worker: _Worker, message) -> bool:
+        if worker.conn is None:
+            return False
+        try:
+            worker.conn.send(message)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _spawn(self, worker: _Worker) -> None:
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.browsers, self.concurrency),
+            name=f"scan-worker-{worker.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        worker.process = process
+        worker.conn = parent_conn
+        worker.last_pong = time.monotonic()
+        threading.Thread(target=self._read, args=(worker, parent_conn), daemon=True).start()
+        logger.info(f"Scan worker {worker.index} started (pid {process.pid})")
+
+    def _read(self, worker: _Worker, conn) -> None:
+        """Reader thread: hand every message to the event loop."""
+        try:
+            while True:
+                message = conn.recv()
+                self._loop.call_soon_threadsafe(self._on_message, worker, conn, message)
+        except (EOFError, OSError):
+            pass
+
+    def _on_message(self, worker: _Worker, conn, message) -> None:
+        if conn is not worker.conn:
+            return  # late message from a process that was already replaced
+        kind = message[0]
+        if kind == "result":
+            _, req_id, data, error = message
+            future = worker.pending.get(req_id)
+            if future is not None and not future.done():
+                future.set_result((data, error))
+        elif kind == "pong":
+            worker.last_pong = time.monotonic()
+            worker.pool_stats = message[2]
+
+    @staticmethod
+    def _stop_process(worker: _Worker) -> None:
+        process = worker.process
+        if process is None:
+            return
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+            process.join(timeout=5)
+
+    async def _restart(self, worker: _Worker, reason: str) -> None:
+        logger.warning(f"Restarting scan worker {worker.index}: {reason}")
+        old_conn = worker.conn
+        worker.conn = None
+        for future in worker.pending.values():
+            if not future.done():
+                future.set_exception(WorkerCrashed(f"Scan worker {worker.index} {reason}"))
+        worker.pending.clear()
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.kill()
+        await asyncio.to_thread(self._stop_process, worker)
+        if old_conn is not None:
+            old_conn.close()
+        worker.restarts += 1
+        self._spawn(worker)
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for worker in self._workers:
+                try:
+                    if not worker.alive():
+                        await self._restart(worker, f"exited with code {worker.process.exitcode}")
+                    elif time.monotonic() - worker.last_pong > self.hang_timeout:
+                        await self._restart(worker, f"missed heartbeats for {self.hang_timeout:.0f}s")
+                    else:
+                        self._send(worker, ("ping", next(self._ids)))
+                except Exception as e:
+                    logger.error(f"Scan worker {worker.index} health check failed: {e}")
@@ -0,0 +1,260 @@
+"""
+Heuristic risk scoring over feature vectors.
+
+A scan is reduced to a small fixed feature vector (SSL, third-party script
+count, redirect count, privacy link, domain depth, suspicious TLD, domain
+mismatch, and the lookalike / brand-impersonation hits from lookalike.py).
+score_features() scores one vector with reasons, exactly like the original
+compute_risk; score_batch() scores thousands of vectors at once with NumPy.
+Weights and thresholds come from RISK_CONFIG_PATH (JSON, merged over the
+defaults), so history can be rescored whenever they change.
+"""
+import json
+import os
+from urllib.parse import urlparse
+
+import numpy as np
+
+from extractor import features_for
+from lookalike import brand_hits, hit_reason
+
+RISK_CONFIG_PATH = os.environ.get("RISK_CONFIG_PATH", "")
+
+DEFAULT_RISK_CONFIG = {
+    "weights": {
+        "noSsl": 20,
+        "thirdPartyHigh": 15,
+        "thirdPartyModerate": 8,
+        "redirectLong": 20,
+        "redirectChain": 10,
+        "noPrivacyLink": 10,
+        "deepSubdomain": 5,
+        "suspiciousTld": 15,
+        "domainMismatch": 10,
+        # Each below tierMedium: one impersonation signal alone isn't enough, but a
+        # lookalike or brand-named domain on a suspicious TLD reaches it
+        "lookalikeDomain": 30,
+        "brandInDomain": 25,
+        "brandInPath": 10,
+    },
+    "thresholds": {
+        "thirdPartyHigh": 10,  # more than this many scripts
+        "thirdPartyModerate": 5,
+        "redirectLong": 3,  # more than this many hops
+        "redirectChain": 1,
+        "domainParts": 3,  # more than this many labels
+        "maxScore": 100,
+        "tierHigh": 70,  # score at or above
+        "tierMedium": 40,
+    },
+    "suspiciousTlds": [".xyz", ".top", ".click", ".buzz", ".tk", ".ml", ".ga", ".cf"],
+}
+
+# Column order of a feature matrix
+FEATURES = (
+    "ssl",
+    "thirdPartyScripts",
+    "redirects",
+    "hasPrivacyLink",
+    "domainParts",
+    "suspiciousTld",
+    "domainMismatch",
+    "lookalikeDomain",
+    "brandInDomain",
+    "brandInPath",
+)
+# Hit kinds behind each impersonation feature
+BRAND_FEATURES = {
+    "lookalikeDomain": ("homoglyph", "typo"),
+    "brandInDomain": ("brandInDomain",),
+    "brandInPath": ("brandInPath",),
+}
+TIERS = np.array(["LOW", "MEDIUM", "HIGH"])
+
+# Gemini tiers rate safety (HIGH = safe, as the UI shows them); the heuristic
+# fallback's tiers rate risk (HIGH = risky)
+TIER_LABELS = {"HIGH": "Safe", "MEDIUM": "Suspicious", "LOW": "Dangerous"}
+HEURISTIC_TIER_LABELS = {"HIGH": "Dangerous", "MEDIUM": "Suspicious", "LOW": "Safe"}
+
+
+def load_risk_config(path: str = RISK_CONFIG_PATH) -> dict:
+    """Default config with any weights/thresholds/TLDs from the JSON file merged in."""
+    config = {
+        "weights": dict(DEFAULT_RISK_CONFIG["weights"]),
+        "thresholds": dict(DEFAULT_RISK_CONFIG["thresholds"]),
+        "suspiciousTlds": list(DEFAULT_RISK_CONFIG["suspiciousTlds"]),
+    }
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        config["weights"].update(overrides.get("weights", {}))
+        config["thresholds"].update(overrides.get("thresholds", {}))
+        if "suspiciousTlds" in overrides:
+            config["suspiciousTlds"] = list(overrides["suspiciousTlds"])
+    return config
+
+
+RISK_CONFIG = load_risk_config()
+
+
+def _domain_features(final_url: str, url: str, config: dict) -> dict:
+    final_domain = urlparse(final_url).netloc
+    input_domain = urlparse(url).netloc
+    # Both ends count: a lookalike link that redirects elsewhere is still one
+    hits = brand_hits(final_url, url) if final_url != url else brand_hits(final_url)
+    return {
+        "ssl": final_url.startswith("https://"),
+        "domainParts": len(final_domain.split(".")),
+        "suspiciousTld": any(final_domain.endswith(tld) for tld in config["suspiciousTlds"]),
+        "domainMismatch": bool(input_domain and final_domain and input_domain != final_domain),
+        **{name: any(h["kind"] in kinds for h in hits) for name, kinds in BRAND_FEATURES.items()},
+        "brandHits": hits,
+        "finalDomain": final_domain,
+        "inputDomain": input_domain,
+    }
+
+
+def risk_features(agent_data: dict, url: str, config: dict | None = None) -> dict:
+    """Feature record for one scan (plus the domains used in reason text)."""
+    config = config or RISK_CONFIG
+    privacy = agent_data.get("privacy_policy", {})
+    return {
+        **_domain_features(agent_data.get("final_url", ""), url, config),
+        "thirdPartyScripts": len(features_for(agent_data).third_party_scripts),
+        "redirects": len(agent_data.get("redirects", [])),
+        "hasPrivacyLink": bool(privacy and privacy.get("link")),
+    }
+
+
+def url_features(url: str, config: dict | None = None) -> dict:
+    """
+    Pre-triage features from the URL alone: page-level signals are unknown
+    and left neutral (no scripts, no redirects, privacy link assumed present).
+    """
+    config = config or RISK_CONFIG
+    return {
+        **_domain_features(url, url, config),
+        "thirdPartyScripts": 0,
+        "redirects": 0,
+        "hasPrivacyLink": True,
+    }
+
+
+def tier_for(score, config: dict | None = None) -> str:
+    thresholds = (config or RISK_CONFIG)["thresholds"]
+    if score >= thresholds["tierHigh"]:
+        return "HIGH"
+    if score >= thresholds["tierMedium"]:
+        return "MEDIUM"
+    return "LOW"
+
+
+def risk_label(risk: dict) -> str:
+    """Safe / Suspicious / Dangerous for a preview's risk block, whichever scorer made it."""
+    labels = TIER_LABELS if risk.get("reasoning") is not None else HEURISTIC_TIER_LABELS
+    return labels.get(risk.get("tier"), "Unknown")
+
+
+def score_features(f: dict, config: dict | None = None) -> dict:
+    """Score one feature record; returns {"score", "tier", "reasons"}."""
+    config = config or RISK_CONFIG
+    w, t = config["weights"], config["thresholds"]
+    score = 0
+    reasons: list[str] = []
+
+    # SSL check
+    if not f["ssl"]:
+        score += w["noSsl"]
+        reasons.append("No SSL/TLS encryption")
+
+    # Third-party scripts
+    tp_count = f["thirdPartyScripts"]
+    if tp_count > t["thirdPartyHigh"]:
+        score += w["thirdPartyHigh"]
+        reasons.append(f"High number of third-party scripts ({tp_count})")
+    elif tp_count > t["thirdPartyModerate"]:
+        score += w["thirdPartyModerate"]
+        reasons.append(f"Moderate third-party scripts ({tp_count})")
+
+    # Redirect chain
+    redirect_count = f["redirects"]
+    if redirect_count > t["redirectLong"]:
+        score += w["redirectLong"]
+        reasons.append(f"Long redirect chain ({redirect_count} hops)")
+    elif redirect_count > t["redirectChain"]:
+        score += w["redirectChain"]
+        reasons.append(f"Redirect chain ({redirect_count} hops)")
+
+    # Privacy policy
+    if not f["hasPrivacyLink"]:
+        score += w["noPrivacyLink"]
+        reasons.append("No privacy policy found")
+
+    # Domain analysis
+    if f["domainParts"] > t["domainParts"]:
+        score += w["deepSubdomain"]
+        reasons.append("Deeply nested subdomain")
+
+    if f["suspiciousTld"]:
+        score += w["suspiciousTld"]
+        reasons.append("Suspicious top-level domain")
+
+    # URL mismatch (input vs final)
+    if f["domainMismatch"]:
+        score += w["domainMismatch"]
+        reasons.append(f"Final domain ({f.get('finalDomain')}) differs from input ({f.get('inputDomain')})")
+
+    # Brand impersonation (records scored before it existed have none)
+    for name, kinds in BRAND_FEATURES.items():
+        if f.get(name):
+            score += w[name]
+            reasons.extend(hit_reason(h) for h in f.get("brandHits", []) if h["kind"] in kinds)
+
+    score = min(score, t["maxScore"])
+    return {"score": score, "tier": tier_for(score, config), "reasons": reasons}
+
+
+def feature_matrix(records: list[dict]) -> np.ndarray:
+    """Stack feature records into an (n, len(FEATURES)) int64 matrix."""
+    matrix = np.zeros((len(records), len(FEATURES)), dtype=np.int64)
+    for i, f in enumerate(records):
+        matrix[i] = [int(f.get(name, 0)) for name in FEATURES]
+    return matrix
+
+
+def score_batch(features, config: dict | None = None) -> dict:
+    """
+    Score many records at once. `features` is a list of feature records or
+    a matrix with FEATURES columns; a matrix with fewer (the seven from
+    before the brand features) has the missing columns read as 0. Returns
+    {"scores": array, "tiers": array}; for the same config these equal
+    score_features() record by record.
+    """
+    config = config or RISK_CONFIG
+    w, t = config["weights"], config["thresholds"]
+    X = features if isinstance(features, np.ndarray) else feature_matrix(features)
+    if X.shape[1] < len(FEATURES):
+        X = np.pad(X, ((0, 0), (0, len(FEATURES) - X.shape[1])))
+    ssl, tp, redirects, privacy, parts, tld, mismatch, lookalike, brand_domain, brand_path = (
+        X[:, i] for i in range(len(FEATURES))
+    )
+
+    integral = all(float(v).is_integer() for v in (*w.values(), t["maxScore"]))
+    dtype = np.int64 if integral else np.float64
+    scores = np.zeros(len(X), dtype=dtype)
+    scores += np.where(ssl == 0, w["noSsl"], 0).astype(dtype)
+    scores += np.where(tp > t["thirdPartyHigh"], w["thirdPartyHigh"],
+                       np.where(tp > t["thirdPartyModerate"], w["thirdPartyModerate"], 0)).astype(dtype)
+    scores += np.where(redirects > t["redirectLong"], w["redirectLong"],
+                       np.where(redirects > t["redirectChain"], w["redirectChain"], 0)).astype(dtype)
+    scores += np.where(privacy == 0, w["noPrivacyLink"], 0).astype(dtype)
+    scores += np.where(parts > t["domainParts"], w["deepSubdomain"], 0).astype(dtype)
+    scores += np.where(tld != 0, w["suspiciousTld"], 0).astype(dtype)
+    scores += np.where(mismatch != 0, w["domainMismatch"], 0).astype(dtype)
+    scores += np.where(lookalike != 0, w["lookalikeDomain"], 0).astype(dtype)
+    scores += np.where(brand_domain != 0, w["brandInDomain"], 0).astype(dtype)
+    scores += np.where(brand_path != 0, w["brandInPath"], 0).astype(dtype)
+    scores = np.minimum(scores, t["maxScore"])
+
+    tier_index = np.where(scores >= t["tierHigh"], 2, np.where(scores >= t["tierMedium"], 1, 0))
+    return {"scores": scores, "tiers": TIERS[tier_index]}
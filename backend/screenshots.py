@@ -0,0 +1,134 @@
+"""
+In-memory screenshot capture and storage.
+
+Screenshots are captured straight into memory through the Chrome DevTools
+Protocol, which supports PNG, JPEG and WebP with a quality setting and can
+render a downscaled thumbnail in the same browser. Captured images are kept
+in a byte-bounded LRU keyed by content hash and served by their own endpoint
+instead of being inlined into every JSON response.
+"""
+import base64
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+SCREENSHOT_FORMAT = os.environ.get("SCREENSHOT_FORMAT", "jpeg").lower()
+SCREENSHOT_QUALITY = int(os.environ.get("SCREENSHOT_QUALITY", "70"))
+THUMBNAIL_WIDTH = int(os.environ.get("SCREENSHOT_THUMBNAIL_WIDTH", "320"))
+STORE_MAX_MB = int(os.environ.get("SCREENSHOT_STORE_MB", "256"))
+STORE_TTL = float(os.environ.get("SCREENSHOT_STORE_TTL", "3600"))
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+
+async def capture_screenshot(page, fmt: str = SCREENSHOT_FORMAT, quality: int = SCREENSHOT_QUALITY,
+                             thumbnail_width: int = THUMBNAIL_WIDTH) -> dict | None:
+    """
+    Capture the viewport as bytes. Returns a dict with data, mime_type, width,
+    height and (when thumbnail_width > 0) a thumbnail, or None on failure.
+    """
+    if fmt not in MIME_TYPES:
+        fmt = "jpeg"
+    viewport = page.viewport_size or {"width": 1280, "height": 720}
+    width, height = viewport["width"], viewport["height"]
+    params = {"format": fmt}
+    if fmt != "png":
+        params["quality"] = quality
+
+    try:
+        session = await page.context.new_cdp_session(page)
+        try:
+            shot = await session.send("Page.captureScreenshot", params)
+            data = base64.b64decode(shot["data"])
+            thumbnail = None
+            if thumbnail_width and thumbnail_width < width:
+                scale = thumbnail_width / width
+                thumb = await session.send("Page.captureScreenshot", {
+                    **params,
+                    "clip": {"x": 0, "y": 0, "width": width, "height": height, "scale": scale},
+                })
+                thumbnail = base64.b64decode(thumb["data"])
+        finally:
+            await session.detach()
+    except Exception:
+        # Non-Chromium engines: plain Playwright capture, PNG/JPEG only
+        try:
+            fmt = "png" if fmt == "png" else "jpeg"
+            data = await page.screenshot(type=fmt, quality=None if fmt == "png" else quality)
+            thumbnail = None
+        except Exception as e:
+            print(f"Screenshot failed: {e}")
+            return None
+
+    return {
+        "data": data,
+        "mime_type": MIME_TYPES[fmt],
+        "width": width,
+        "height": height,
+        "thumbnail": thumbnail,
+    }
+
+
+class ScreenshotStore:
+    """Content-addressed LRU of image bytes with a total size budget and TTL."""
+
+    def __init__(self, max_bytes: int = STORE_MAX_MB * 1024 * 1024, ttl: float = STORE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items: OrderedDict = OrderedDict()
+        self._size = 0
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """Store an image and return its id (a hash of the bytes)."""
+        image_id = hashlib.sha256(data).hexdigest()[:32]
+        if image_id in self._items:
+            # Same bytes again: a new response links to it, so it lives another ttl
+            self._items[image_id] = (data, mime_type, time.time() + self.ttl)
+            self._items.move_to_end(image_id)
+            return image_id
+        self._items[image_id] = (data, mime_type, time.time() + self.ttl)
+        self._size += len(data)
+        while self._size > self.max_bytes and len(self._items) > 1:
+            _, (old, _, _) = self._items.popitem(last=False)
+            self._size -= len(old)
+        return image_id
+
+    def get(self, image_id: str) -> tuple[bytes, str] | None:
+        item = self._items.get(image_id)
+        if item is None:
+            return None
+        data, mime_type, expires_at = item
+        if expires_at <= time.time():
+            del self._items[image_id]
+            self._size -= len(data)
+            return None
+        self._items.move_to_end(image_id)
+        return data, mime_type
+
+    def expires_in(self, image_id: str) -> float:
+        """Seconds until the image expires from the store (0 if it is gone)."""
+        item = self._items.get(image_id)
+        return max(0.0, item[2] - time.time()) if item else 0.0
+
+    def save(self, shot: dict | None) -> dict | None:
+        """Store a capture_screenshot() result and return its public reference."""
+        if not shot:
+            return None
+        image_id = self.put(shot["data"], shot["mime_type"])
+        ref = {
+            "id": image_id,
+            "url": f"/api/screenshots/{image_id}",
+            "thumbnailUrl": None,
+            "mimeType": shot["mime_type"],
+            "width": shot["width"],
+            "height": shot["height"],
+            "bytes": len(shot["data"]),
+        }
+        if shot.get("thumbnail"):
+            thumb_id = self.put(shot["thumbnail"], shot["mime_type"])
+            ref["thumbnailUrl"] = f"/api/screenshots/{thumb_id}"
+        return ref
+
+    def stats(self) -> dict:
+        return {"entries": len(self._items), "bytes": self._size, "maxBytes": self.max_bytes}
@@ -0,0 +1,92 @@
+"""
+Adaptive page-settle detection.
+
+Instead of sleeping a fixed two seconds after DOMContentLoaded, a scan waits
+until the page is quiet: no (countable) network requests in flight for a
+short window, no DOM mutations for a short window, and no main-frame
+navigation (JS redirects) recently. A hard budget caps the wait for pages
+that never go quiet (analytics beacons, long polling, animations).
+"""
+import asyncio
+import os
+import time
+
+SETTLE_MAX_MS = int(os.environ.get("SETTLE_MAX_MS", "5000"))
+SETTLE_QUIET_MS = int(os.environ.get("SETTLE_QUIET_MS", "500"))
+SETTLE_NETWORK_IDLE_MS = int(os.environ.get("SETTLE_NETWORK_IDLE_MS", "500"))
+# Requests still allowed in flight when idle (long polls, slow beacons)
+SETTLE_MAX_INFLIGHT = int(os.environ.get("SETTLE_MAX_INFLIGHT", "2"))
+POLL_INTERVAL = 0.1
+
+# Long-lived connections never "finish" and should not hold the page open
+IGNORED_RESOURCE_TYPES = {"websocket", "eventsource"}
+
+# Installed before any page script runs, on every document (JS redirects too)
+MUTATION_OBSERVER_SCRIPT = """
+(() => {
+  window.__safelinkLastMutation = performance.now();
+  new MutationObserver(() => { window.__safelinkLastMutation = performance.now(); })
+    .observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+})();
+"""
+MUTATION_QUIET_JS = "() => performance.now() - (window.__safelinkLastMutation || 0)"
+
+
+class PageSettler:
+    """Watches one page's network, DOM and navigations to tell when it is quiet."""
+
+    def __init__(self, page):
+        self.page = page
+        self.inflight: set = set()
+        self.last_activity = time.monotonic()
+        self.last_navigation = time.monotonic()
+
+    async def install(self) -> None:
+        """Attach listeners; call before page.goto()."""
+        await self.page.add_init_script(MUTATION_OBSERVER_SCRIPT)
+        self.page.on("request", self._on_request)
+        self.page.on("requestfinished", self._on_request_done)
+        self.page.on("requestfailed", self._on_request_done)
+        self.page.on("framenavigated", self._on_navigated)
+
+    def _on_request(self, request) -> None:
+        if request.resource_type not in IGNORED_RESOURCE_TYPES:
+            self.inflight.add(request)
+            self.last_activity = time.monotonic()
+
+    def _on_request_done(self, request) -> None:
+        if request in self.inflight:
+            self.inflight.discard(request)
+            self.last_activity = time.monotonic()
+
+    def _on_navigated(self, frame) -> None:
+        if frame == self.page.main_frame:
+            self.last_navigation = time.monotonic()
+
+    async def _dom_quiet_ms(self) -> float:
+        try:
+            return await self.page.evaluate(MUTATION_QUIET_JS)
+        except Exception:
+            # Context destroyed mid-navigation: not quiet yet
+            return 0.0
+
+    async def wait(self, max_ms: int = SETTLE_MAX_MS, quiet_ms: int = SETTLE_QUIET_MS,
+                   idle_ms: int = SETTLE_NETWORK_IDLE_MS) -> dict:
+        """
+        Wait until the page is quiet or max_ms has passed.
+        Returns {"ms": time waited, "timedOut": whether the budget ran out}.
+        """
+        start = time.monotonic()
+        deadline = start + max_ms / 1000
+        while True:
+            now = time.monotonic()
+            network_idle = (
+                len(self.inflight) <= SETTLE_MAX_INFLIGHT
+                and (now - self.last_activity) * 1000 >= idle_ms
+            )
+            navigation_quiet = (now - self.last_navigation) * 1000 >= quiet_ms
+            if network_idle and navigation_quiet and await self._dom_quiet_ms() >= quiet_ms:
+                return {"ms": round((time.monotonic() - start) * 1000), "timedOut": False}
+            if now >= deadline:
+                return {"ms": round((now - start) * 1000), "timedOut": True}
+            await asyncio.sleep(min(POLL_INTERVAL, max(deadline - now, 0)))
@@ -0,0 +1,105 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one in-flight task instead
+of each starting their own. A flight can also publish progress events; every
+caller attached to it receives them, late joiners get the events they missed
+replayed first. The shared task is cancelled only when every caller waiting
+on it has gone away.
+"""
+import asyncio
+
+
+class _Flight:
+    def __init__(self):
+        self.task: asyncio.Future | None = None
+        self.waiters = 0
+        self.history: list[tuple[str, object]] = []
+        self.listeners: list = []
+
+    def publish(self, event: str, payload) -> None:
+        self.history.append((event, payload))
+        for listener in list(self.listeners):
+            listener(event, payload)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one task."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: dict[str, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        """Whether a call for key is running now (a do() would join it)."""
+        return key in self._inflight
+
+    async def do(self, key: str, fn, listener=None):
+        """
+        Return the result of `await fn(publish)` for key, sharing it with any
+        concurrent caller. `listener(event, payload)` receives published events.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._start(key, lambda f: fn(f.publish))
+        else:
+            self.coalesced += 1
+        return await self._wait(flight, listener)
+
+    async def do_many(self, keys: list[str], fn_many) -> dict:
+        """
+        Like do() for many keys at once: keys already in flight are joined and
+        the rest are fetched together with one `await fn_many(new_keys)`, which
+        must return a dict keyed by those keys.
+        """
+        keys = list(dict.fromkeys(keys))
+        new = [k for k in keys if k not in self._inflight]
+        self.coalesced += len(keys) - len(new)
+        if new:
+            bulk = asyncio.ensure_future(fn_many(new))
+            self.executions += 1
+            for key in new:
+                self._start(key, lambda f, key=key: self._pick(bulk, key), count=False)
+        flights = [self._inflight[k] for k in keys]
+        values = await asyncio.gather(*(self._wait(f) for f in flights))
+        return dict(zip(keys, values))
+
+    @staticmethod
+    async def _pick(bulk: asyncio.Future, key: str):
+        return (await asyncio.shield(bulk)).get(key)
+
+    def _start(self, key: str, factory, count: bool = True) -> _Flight:
+        flight = _Flight()
+        self._inflight[key] = flight
+        flight.task = asyncio.ensure_future(factory(flight))
+        flight.task.add_done_callback(lambda _: self._inflight.pop(key, None) if self._inflight.get(key) is flight else None)
+        if count:
+            self.executions += 1
+        return flight
+
+    async def _wait(self, flight: _Flight, listener=None):
+        if listener is not None:
+            for event, payload in flight.history:
+                listener(event, payload)
+            flight.listeners.append(listener)
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                # Last interested caller left: stop the shared work too
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+            if listener is not None:
+                flight.listeners.remove(listener)
+
+    def stats(self) -> dict:
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "inFlight": len(self._inflight),
+        }
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+# Backend modules are imported flat (from cache import ...), as main.py does
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+CORPUS_DIR = BACKEND_DIR / "bench" / "corpus"
+
+
+class StubScanner:
+    """
+    Stands in for the browser: "scans" http://site.test/<page> by returning
+    the bench corpus page as the agent would. ?delay=<seconds> makes it slow,
+    ?fail=1 makes the page fail to load.
+    """
+
+    def __init__(self):
+        self.scanned: list[str] = []
+        self.finished: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def __call__(self, url: str, pool=None, profile=None, budget=None, **kwargs):
+        self.scanned.append(url)
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        try:
+            await asyncio.sleep(float(query.get("delay", ["0"])[0]))
+        except asyncio.CancelledError:
+            self.cancelled.append(url)
+            raise
+        self.finished.append(url)
+        if query.get("fail"):
+            return None
+        page = CORPUS_DIR / (parts.path.strip("/") or "index.html")
+        html = page.read_text() if page.is_file() else "<html><head><title>Stub</title></head><body></body></html>"
+        return {
+            "final_url": url,
+            "redirects": [url],
+            "html": html,
+            "screenshot": None,
+            "downloads": [],
+            "privacy_policy": {},
+            "timings": {"navigation": 1.0},
+        }
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    """
+    main wired to the bench upstream stubs (bench/stubs.py, no latency) and a
+    StubScanner instead of the browser, with empty caches. Returns the scanner.
+    """
+    monkeypatch.syspath_prepend(str(BACKEND_DIR / "bench"))
+    import http_client
+    import main
+    import stubs
+    from cache import LookupCache, ResultCache
+    from singleflight import SingleFlight
+
+    monkeypatch.setattr(stubs, "LATENCY_MS", {name: 0 for name in stubs.DEFAULT_LATENCY_MS})
+    monkeypatch.setattr(stubs, "ERROR_RATE", {})
+    for name, path in [("WHOIS", "whois"), ("PAGERANK", "pagerank"), ("SAFE_BROWSING", "safebrowsing/v4"),
+                       ("GEMINI", "gemini")]:
+        monkeypatch.setattr(main, f"{name}_API_URL", f"http://stubs.test/{path}")
+    for key in ("WHOIS_API_KEY", "OPEN_PAGERANK_KEY", "GOOGLE_SAFE_BROWSING_KEY", "GEMINI_API"):
+        monkeypatch.setenv(key, "test")
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.ASGITransport(app=stubs.app)))
+
+    scanner = StubScanner()
+    monkeypatch.setattr(main, "analyze_url_async", scanner)
+    monkeypatch.setattr(main.app.state, "browser_pool", None, raising=False)
+    monkeypatch.setattr(main.app.state, "scan_workers", None, raising=False)
+    monkeypatch.setattr(main, "scan_flight", SingleFlight("scans"))
+    monkeypatch.setattr(main, "result_cache", ResultCache(fresh_for=300, stale_for=3600, max_entries=100))
+    for name in ("whois_cache", "pagerank_cache", "privacy_analysis_cache"):
+        monkeypatch.setattr(main, name, LookupCache(getattr(main, name).name, ttl=60))
+    return scanner
@@ -0,0 +1,40 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client():
+    # No lifespan: nothing here reaches a browser or an upstream API
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize("deadline", [0, -1])
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/api/preview", {"url": "https://example.com"}),
+        ("/api/preview/stream", {"url": "https://example.com"}),
+        ("/api/preview/batch", {"urls": ["https://example.com"]}),
+        ("/api/jobs", {"url": "https://example.com"}),
+    ],
+)
+def test_non_positive_deadline_is_rejected(client, path, body, deadline):
+    resp = client.post(path, json={**body, "deadlineSeconds": deadline})
+    assert resp.status_code == 400
+    assert "deadlineSeconds" in resp.json()["detail"]
+
+
+@pytest.mark.parametrize(
+    "path, body",
+    [
+        ("/api/preview", {"url": "https://example.com:99999/"}),
+        ("/api/preview/stream", {"url": "https://example.com:99999/"}),
+        ("/api/jobs", {"url": "https://example.com:99999/"}),
+    ],
+)
+def test_url_with_bad_port_is_rejected(client, path, body):
+    resp = client.post(path, json=body)
+    assert resp.status_code == 400
+    assert resp.json()["detail"] == "Invalid URL"
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import main
+
+SLOW = "http://site.test/index.html?delay=0.3"
+FAST = "http://site.test/login.html"
+
+
+def run_batch(urls: list[str], **options) -> dict:
+    async def scenario():
+        return await main._preview_batch(main.BatchPreviewRequest(urls=urls, **options))
+
+    return json.loads(asyncio.run(scenario()).body)
+
+
+def test_items_come_back_in_input_order_with_a_status_each(stubbed):
+    body = run_batch([
+        SLOW,
+        "",
+        FAST,
+        SLOW + "&utm_source=mail",  # the same page once tracking parameters are gone
+        "http://site.test/gone.html?fail=1",
+        "http://site.test:99999/",
+    ])
+    assert [item["status"] for item in body["results"]] == ["ok", "invalid", "ok", "ok", "error", "invalid"]
+    assert [item["url"] for item in body["results"]][:3] == [SLOW, "", FAST]
+    assert body["results"][1]["error"] == "URL is required"
+    assert body["results"][5]["error"] == "Invalid URL"
+    assert body["results"][4]["error"] == "Failed to load the URL"
+    assert body["results"][0]["normalizedUrl"] == body["results"][3]["normalizedUrl"]
+    assert (body["count"], body["unique"], body["scanned"]) == (6, 3, 3)
+    assert len(stubbed.scanned) == 3  # the duplicate was scanned once
+
+
+def test_bulk_lookups_reach_each_preview(stubbed):
+    import stubs
+
+    before = dict(stubs.calls)
+    body = run_batch([FAST, "http://site.test/index.html"])
+    # Both scans finish together, so they share one bulk request per upstream
+    assert stubs.calls["pagerank"] - before.get("pagerank", 0) == 1
+    assert stubs.calls["safebrowsing"] - before.get("safebrowsing", 0) == 1
+    login, index = (item["result"] for item in body["results"])
+    # The Safe Browsing stub flags every URL containing "login"
+    assert login["safeBrowsing"]["is_flagged"] is True
+    assert index["safeBrowsing"]["is_flagged"] is False
+    assert login["pageRank"] and index["pageRank"]
+
+
+def test_enrichment_starts_before_slower_scans_finish(stubbed, monkeypatch):
+    enriched = []
+    build_preview = main.build_preview
+
+    async def recording_build_preview(url, data, **kwargs):
+        enriched.append((url, list(stubbed.finished)))
+        return await build_preview(url, data, **kwargs)
+
+    monkeypatch.setattr(main, "build_preview", recording_build_preview)
+    body = run_batch([SLOW, FAST])
+    assert [item["status"] for item in body["results"]] == ["ok", "ok"]
+    url, finished_by_then = enriched[0]
+    assert url == FAST and SLOW not in finished_by_then
+
+
+def test_cached_results_are_not_rescanned(stubbed):
+    run_batch([FAST])
+    body = run_batch([FAST, FAST])
+    assert [item["result"]["cache"]["status"] for item in body["results"]] == ["fresh", "fresh"]
+    assert body["scanned"] == 0 and len(stubbed.scanned) == 1
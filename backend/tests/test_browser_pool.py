@@ -0,0 +1,92 @@
+import asyncio
+
+from browser_pool import BrowserPool
+
+
+class FakeContext:
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        return FakeContext()
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launches = 0
+        self.launching = 0
+        self.most_at_once = 0
+        self.release = asyncio.Event()
+
+    async def launch(self, **kwargs):
+        self.launches += 1
+        self.launching += 1
+        self.most_at_once = max(self.most_at_once, self.launching)
+        try:
+            await self.release.wait()
+            return FakeBrowser()
+        finally:
+            self.launching -= 1
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+
+def make_pool(**kwargs) -> BrowserPool:
+    pool = BrowserPool(**kwargs)
+    pool._playwright = FakePlaywright()
+    for slot in pool._slots:
+        slot.browser = FakeBrowser()
+    return pool
+
+
+def test_recycling_happens_after_the_lease_is_released():
+    async def scenario():
+        pool = make_pool(size=2, max_concurrent=1, max_scans=1)
+        async with pool.lease():
+            pass
+        # The drained browser relaunches in the background; the semaphore is free already
+        assert pool._semaphore._value == 1
+        async with asyncio.timeout(1):
+            async with pool.lease():
+                pass  # served by the other browser while the first one relaunches
+        await asyncio.sleep(0)
+        assert pool._playwright.chromium.launches == 2
+        pool._playwright.chromium.release.set()
+        await asyncio.gather(*(slot.relaunching for slot in pool._slots))
+        assert all(slot.browser.is_connected() and not slot.draining for slot in pool._slots)
+        assert pool.stats()["recycles"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_waiting_leases_share_one_relaunch():
+    async def scenario():
+        pool = make_pool(size=1, max_concurrent=4, max_scans=1)
+        async with pool.lease():
+            pass
+
+        async def lease_once():
+            async with pool.lease() as context:
+                return context
+
+        waiting = asyncio.gather(*(lease_once() for _ in range(3)))
+        await asyncio.sleep(0.01)
+        pool._playwright.chromium.release.set()
+        assert all(isinstance(context, FakeContext) for context in await waiting)
+        assert pool._playwright.chromium.most_at_once == 1
+
+    asyncio.run(scenario())
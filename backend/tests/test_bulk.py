@@ -0,0 +1,20 @@
+import io
+
+from agent import read_urls
+
+
+def test_read_urls_adds_a_scheme_only_where_missing():
+    source = io.StringIO(
+        "# targets\n"
+        "httpbin.org/get\n"
+        "\n"
+        "  example.com  \n"
+        "HTTP://Example.org/\n"
+        "https://already.example/\n"
+    )
+    assert list(read_urls(source)) == [
+        "https://httpbin.org/get",
+        "https://example.com",
+        "HTTP://Example.org/",
+        "https://already.example/",
+    ]
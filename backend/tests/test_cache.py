@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+import pytest
+
+from cache import LookupCache, ResultCache, SQLiteStore, TTLCache, _MISSING
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_ttl_cache_expires_entries(clock):
+    cache = TTLCache(10)
+    cache.set("a", 1, ttl=5)
+    clock[0] += 4
+    assert cache.get("a") == 1
+    clock[0] += 2
+    assert cache.get("a", None) is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+    cache.set("c", 3, ttl=60)
+    assert cache.get("b", None) is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def test_lookup_cache_ttl_and_negative_ttl(clock):
+    async def scenario():
+        cache = LookupCache("test", ttl=100, negative_ttl=10)
+        cache.set("found.example", {"rank": 3})
+        cache.set("missing.example", None)
+        assert await cache.get("missing.example") is None  # a cached "no answer", not a miss
+        clock[0] += 11
+        assert await cache.get("missing.example") is _MISSING
+        assert await cache.get("found.example") == {"rank": 3}
+        clock[0] += 90
+        assert await cache.get("found.example") is _MISSING
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["hits"], stats["misses"], stats["negativeHits"]) == (2, 2, 1)
+
+
+def test_lookup_cache_reads_through_to_disk(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+
+    async def scenario():
+        store = SQLiteStore(path)
+        LookupCache("whois", ttl=100, store=store).set("a.example", {"age": 5})
+        store.close()  # queued writes are committed before the database closes
+
+        store = SQLiteStore(path)
+        restarted = LookupCache("whois", ttl=100, store=store)
+        assert await restarted.get("a.example") == {"age": 5}
+        assert restarted.stats()["diskHits"] == 1
+        assert await LookupCache("pageRank", ttl=100, store=store).get("a.example") is _MISSING
+        many = await LookupCache("whois", ttl=100, store=store).get_or_fetch_many(["a.example"], None)
+        assert many == {"a.example": {"age": 5}}
+        clock[0] += 101
+        assert await LookupCache("whois", ttl=100, store=store).get("a.example") is _MISSING
+        assert store.prune() == 1
+        store.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_store_batches_queued_writes(tmp_path):
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    for i in range(50):
+        store.set_later("test", f"k{i}", i, time.time() + 60)
+    store.set_later("test", "k0", "last write wins", time.time() + 60)
+    store.close()
+    store = SQLiteStore(str(tmp_path / "cache.db"))
+    assert store.get("test", "k0")[0] == "last write wins"
+    assert store.get("test", "k49")[0] == 49
+    store.close()
+
+
+def test_get_or_fetch_caches_and_coalesces():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return None if key == "none.example" else key.upper()
+
+    async def scenario():
+        cache = LookupCache("test", ttl=100)
+        first = await asyncio.gather(*(cache.get_or_fetch("a.example", fetch) for _ in range(3)))
+        assert first == ["A.EXAMPLE"] * 3
+        assert await cache.get_or_fetch("a.example", fetch) == "A.EXAMPLE"
+        assert await cache.get_or_fetch("none.example", fetch) is None
+        assert await cache.get_or_fetch("none.example", fetch) is None
+
+    asyncio.run(scenario())
+    assert calls == ["a.example", "none.example"]
+
+
+def test_get_or_fetch_many_only_fetches_misses():
+    batches = []
+
+    async def fetch_many(keys):
+        batches.append(sorted(keys))
+        return {k: len(k) for k in keys if k != "gone.example"}
+
+    async def scenario():
+        cache = LookupCache("test", ttl=100)
+        cache.set("a.example", 1)
+        results = await cache.get_or_fetch_many(["a.example", "bb.example", "gone.example", "bb.example"], fetch_many)
+        assert results == {"a.example": 1, "bb.example": 10, "gone.example": None}
+        assert await cache.get_or_fetch_many(["gone.example"], fetch_many) == {"gone.example": None}
+
+    asyncio.run(scenario())
+    assert batches == [["bb.example", "gone.example"]]
+
+
+def test_result_cache_fresh_then_stale_then_gone(clock):
+    cache = ResultCache(fresh_for=10, stale_for=60, max_entries=10)
+    cache.set("k", {"ok": True})
+    assert cache.get("k")[2] is True
+    clock[0] += 30
+    value, age, fresh = cache.get("k")
+    assert value == {"ok": True} and age == 30 and fresh is False
+    assert cache.begin_refresh("k") and not cache.begin_refresh("k")
+    cache.end_refresh("k")
+    clock[0] += 31
+    assert cache.get("k") is None
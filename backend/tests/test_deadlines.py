@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import pytest
+
+import deadlines
+from deadlines import Deadline
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_default_and_clamped_deadlines(clock):
+    assert Deadline().seconds == deadlines.SCAN_DEADLINE
+    assert Deadline(5).seconds == 5
+    assert Deadline(deadlines.SCAN_MAX_DEADLINE * 10).seconds == deadlines.SCAN_MAX_DEADLINE
+    assert Deadline(-3).seconds == 0 and Deadline(-3).expired()
+    assert Deadline(300, max_seconds=600).seconds == 300
+
+
+def test_remaining_counts_down(clock):
+    deadline = Deadline(10)
+    clock[0] += 4
+    assert deadline.remaining() == pytest.approx(6)
+    clock[0] += 7
+    assert deadline.remaining() == 0 and deadline.expired()
+
+
+def test_scan_budget_is_a_share_of_the_deadline(clock):
+    deadline = Deadline(20)
+    assert deadline.scan_budget() == pytest.approx(20 * deadlines.SCAN_BUDGET_SHARE)
+    clock[0] += 19
+    assert deadline.scan_budget() == pytest.approx(1)
+
+
+def test_stage_budget_is_capped_and_shared(clock):
+    deadline = Deadline(100)
+    assert deadline.stage_budget("aiScore") == deadlines.STAGE_CAPS["aiScore"]
+    assert deadline.stage_budget("whois") == deadlines.STAGE_CAPS["whois"]
+    clock[0] += 96
+    assert deadline.stage_budget("aiScore") == pytest.approx(4)
+    assert deadline.stage_budget("whois") == pytest.approx(4 * deadlines.LOOKUP_BUDGET_SHARE)
+
+
+def test_stage_below_minimum_budget_is_skipped(clock):
+    deadline = Deadline(10)
+    clock[0] += 10 - deadlines.MIN_STAGE_BUDGET / 2
+    assert deadline.stage_budget("aiSummary") == 0.0
+    assert deadline.stage_budget("unknownStage") == 0.0
+
+
+# A 600 s job isn't cut to the 120 s preview limit, and one with under a second left still gets most of it
+@pytest.mark.parametrize("job_seconds", [600, 0.8])
+def test_job_deadline_keeps_its_own_limit(monkeypatch, job_seconds):
+    import main
+
+    seen = []
+
+    async def scan_coalesced(url, key, emit=None, profile=None, deadline=None):
+        seen.append(deadline.seconds)
+        return {"url": url}
+
+    monkeypatch.setattr(main, "scan_coalesced", scan_coalesced)
+    monkeypatch.setattr(main, "_shape", lambda result, *args: result)
+    job = {"url": "https://example.com", "profile": None, "force": True, "deadline_at": time.time() + job_seconds}
+    asyncio.run(main.run_job(job, lambda event, payload: None))
+    assert seen[0] == pytest.approx(job_seconds * (1 - main.JOB_DEADLINE_MARGIN), abs=0.05)
@@ -0,0 +1,95 @@
+import asyncio
+
+from conftest import CORPUS_DIR
+from extractor import PageFeatures, extract_features, extract_main_text, features_for
+
+
+def scan(stubbed, page: str) -> dict:
+    return asyncio.run(stubbed(f"http://site.test/{page}"))
+
+
+def test_login_page_from_the_stubbed_scanner(stubbed):
+    data = scan(stubbed, "login.html")
+    features = features_for(data)
+    assert data["features"] is features  # extracted once, then reused
+    assert features.title == "Sign in to your account"
+    assert (features.forms, features.password_inputs, features.email_inputs) == (1, 1, 1)
+    assert features.has_login_form
+    assert features.privacy_link == "http://site.test/site/privacy.html"
+
+
+def test_navbar_sign_in_link_is_not_a_login_form(stubbed):
+    features = features_for(scan(stubbed, "index.html"))
+    assert features.title == "Acme Widgets"
+    assert features.forms == 0
+    assert not features.has_login_form
+    assert features.privacy_link == "http://site.test/site/privacy.html"
+
+
+def test_third_party_scripts_and_partial_privacy_match():
+    html = (CORPUS_DIR / "scripts.html").read_text().replace("{{THIRD_PARTY}}", "http://cdn.test")
+    html = html.replace("</head>", '<script src="/site/static/app.js"></script></head>')
+    features = extract_features(html, "http://site.test/scripts.html")
+    assert len(features.scripts) == 16
+    assert len(features.third_party_scripts) == 15
+    assert features.script_origins == ["cdn.test"]
+    assert features.privacy_link == "http://site.test/site/privacy.html"  # "Your Privacy Rights"
+
+
+def test_login_form_needs_more_than_a_form():
+    search = '<form action="/search"><input type="text" name="q"><button>Search</button></form>'
+    assert not extract_features(search, "http://a.test/").has_login_form
+    # A "Sign in" button outside any form is navigation, not a login form
+    nav = '<nav><button>Sign in</button></nav><form action="/search"><input name="q"></form>'
+    assert not extract_features(nav, "http://a.test/").has_login_form
+    # An email field alone is a newsletter box unless it sits next to a form
+    assert not extract_features('<input type="email">', "http://a.test/").has_login_form
+
+
+def test_login_form_signals():
+    pages = [
+        '<input type="password">',
+        '<form action="/account/signin"><input name="user"></form>',
+        '<form action="/go"><input name="user"><button>Log in</button></form>',
+        '<form action="/subscribe"><input type="email"></form>',
+    ]
+    for html in pages:
+        assert extract_features(html, "http://a.test/").has_login_form, html
+
+
+def test_strong_privacy_keyword_beats_an_earlier_partial_match():
+    html = """
+        <a href="/privacy-settings">Privacy settings</a>
+        <a href="/rights">Your privacy rights</a>
+        <a href="/dp/B0001">Privacy screen protector</a>
+        <a href="/legal/privacy">Privacy Policy</a>
+        <a href="/later">Privacy notice</a>
+    """
+    features = extract_features(html, "https://shop.test/p/1")
+    assert features.privacy_candidates == ["/privacy-settings", "/rights", "/legal/privacy"]
+    assert features.privacy_link == "https://shop.test/legal/privacy"
+
+
+def test_meta_refresh_and_frames():
+    html = """<html><head><meta http-equiv="Refresh" content="0; url=https://evil.test/">
+        <!-- a comment --></head><body><iframe src="/ad"></iframe><frame></body></html>"""
+    features = extract_features(html, "http://a.test/")
+    assert features.meta_refresh == "0; url=https://evil.test/"
+    assert features.iframes == ["/ad", ""]
+
+
+def test_empty_or_unparseable_html():
+    assert extract_features("", "http://a.test/") == PageFeatures()
+    assert extract_features("   \n", "http://a.test/") == PageFeatures()
+    assert extract_main_text("") == ""
+
+
+def test_features_for_accepts_a_serialized_record():
+    features = extract_features((CORPUS_DIR / "login.html").read_text(), "http://site.test/login.html")
+    data = {"features": features.to_dict()}
+    assert features_for(data) == features
+
+
+def test_main_text_skips_scripts_and_chrome():
+    html = (CORPUS_DIR / "index.html").read_text().replace("</main>", "<script>var x = 1;</script></main>")
+    assert extract_main_text(html) == "Acme Widgets\nHand-made widgets shipped worldwide since 1999."
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from history import HistoryStore
+
+SCREENSHOT = {"data": b"\x89PNG stub", "mime_type": "image/png", "width": 1280, "height": 720}
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / "history.db"), str(tmp_path / "blobs"))
+    monkeypatch.setattr(main, "get_history", lambda: store)
+    yield store
+    store.close()
+
+
+def scan_and_record(stubbed, url: str, **extra) -> dict:
+    """Scan with the stub, build the preview and wait for the history write."""
+
+    async def scenario():
+        data = {**await stubbed(url), **extra}
+        result = await main.build_preview(url, data)
+        main.record_history(url, data, result, None)
+        await asyncio.gather(*main._background_tasks)
+        return result
+
+    return asyncio.run(scenario())
+
+
+def blob_files(store: HistoryStore) -> list:
+    return sorted(p for p in store.blobs.root.rglob("*") if p.is_file())
+
+
+def test_preview_is_recorded(stubbed, history):
+    result = scan_and_record(stubbed, "http://site.test/login.html", screenshot=SCREENSHOT)
+    assert history.count() == 1
+    scan = history.get(1)
+    assert scan["url"] == "http://site.test/login.html"
+    assert scan["input_domain"] == scan["final_domain"] == "site.test"
+    assert scan["score"] == result["risk"]["score"]
+    assert scan["flagged"] is True  # the Safe Browsing stub flags "login" URLs
+    assert scan["result"]["risk"] == result["risk"]
+    assert scan["features"]["domainMismatch"] is False
+    assert "finalDomain" not in scan["features"]
+    assert b"Sign in to your account" in history.blobs.get(scan["html_blob"])
+    assert history.blobs.get(scan["screenshot_blob"]) == SCREENSHOT["data"]
+    assert scan["screenshot_mime"] == "image/png"
+
+
+def test_same_page_and_screenshot_are_stored_once(stubbed, history):
+    for _ in range(3):
+        scan_and_record(stubbed, "http://site.test/index.html", screenshot=SCREENSHOT)
+    scan_and_record(stubbed, "http://site.test/index.html?ref=mail", screenshot=SCREENSHOT)
+    assert history.count() == 4
+    first, last = history.get(1), history.get(4)
+    assert (first["html_blob"], first["screenshot_blob"]) == (last["html_blob"], last["screenshot_blob"])
+    files = blob_files(history)
+    assert [p.suffix for p in files].count(".z") == 1  # HTML is compressed
+    assert len(files) == 2
+    # A different page adds only its own HTML
+    scan_and_record(stubbed, "http://site.test/privacy.html", screenshot=SCREENSHOT)
+    assert len(blob_files(history)) == 3
+
+
+def test_blob_store_rejects_bad_digests(history):
+    digest = history.blobs.put(b"data")
+    assert history.blobs.get(digest) == b"data"
+    assert history.blobs.get("../" + digest[3:]) is None
+    assert history.blobs.get("0" * 64) is None
+
+
+def test_query_filters_and_pagination(history, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    page = {"html": "<title>x</title>"}
+    for i in range(5):
+        history.record(f"https://Example.com:443/p?i={i % 2}", {**page, "final_url": "https://example.com/"})
+        now[0] += 10
+    history.record("https://short.test/a", {**page, "final_url": "https://example.com/landing"}, source="batch")
+
+    everything = history.query(limit=4)
+    assert [s["id"] for s in everything["items"]] == [6, 5, 4, 3]
+    assert history.query(before=everything["next_cursor"], limit=4) == {
+        "items": history.query(until=1020)["items"], "next_cursor": None,
+    }
+    assert [s["id"] for s in history.query(normalized_url="https://example.com/p?i=1")["items"]] == [4, 2]
+    assert [s["id"] for s in history.query(domain="WWW.short.test")["items"]] == [6]
+    assert [s["id"] for s in history.query(final_domain="example.com", redirected=True)["items"]] == [6]
+    assert [s["id"] for s in history.query(since=1015, until=1035)["items"]] == [4, 3]
+    assert history.query(since=5000) == {"items": [], "next_cursor": None}
+    assert history.get(6)["source"] == "batch"
+    assert history.get(6)["result"] is None  # recorded without a preview: heuristic score
+
+
+def test_history_api(stubbed, history):
+    scan_and_record(stubbed, "http://site.test/index.html")
+    client = TestClient(main.app)
+    listing = client.get("/api/history", params={"url": "http://site.test/index.html"}).json()
+    assert [s["id"] for s in listing["items"]] == [1]
+    scan = client.get("/api/history/1").json()
+    assert scan["html_url"] == "/api/history/1/html" and scan["screenshot_url"] is None
+    html = client.get(scan["html_url"])
+    assert html.headers["content-type"].startswith("text/plain")
+    assert "Acme Widgets" in html.text
+    assert client.get("/api/history/1/screenshot").status_code == 404
+    assert client.get("/api/history", params={"label": "Fine"}).status_code == 400
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+
+from jobs import CANCELLED, QUEUED, SUCCEEDED, TIMED_OUT, InMemoryJobStore, JobManager, QueueFull, SQLiteJobStore
+
+
+async def wait_for_status(manager: JobManager, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        job = await manager.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_every_skipped_stage_is_kept():
+    async def runner(job, emit):
+        emit("navigation", {"finalUrl": job["url"]})
+        emit("skipped", {"stage": "whois"})
+        emit("skipped", {"stage": "aiSummary"})
+        await asyncio.sleep(0.2)
+        return {"ok": True}
+
+    async def scenario():
+        manager = JobManager(runner, store=InMemoryJobStore(), workers=1)
+        await manager.start()
+        job = await manager.submit("https://example.com")
+        await asyncio.sleep(0.05)
+        assert (await manager.get(job["id"]))["partial"]["skipped"] == ["whois", "aiSummary"]
+        await wait_for_status(manager, job["id"], SUCCEEDED)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_raises_with_retry_after():
+    async def scenario():
+        manager = JobManager(None, store=InMemoryJobStore(), workers=1, max_queued=2)
+        await manager.submit("https://a.example")
+        await manager.submit("https://b.example")
+        with pytest.raises(QueueFull) as raised:
+            await manager.submit("https://c.example")
+        assert raised.value.retry_after >= 1
+        assert manager.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancel_queued_and_running_jobs():
+    started = asyncio.Event()
+
+    async def runner(job, emit):
+        started.set()
+        await asyncio.sleep(60)
+
+    async def scenario():
+        manager = JobManager(runner, store=InMemoryJobStore(), workers=1)
+        await manager.start()
+        running = await manager.submit("https://a.example")
+        queued = await manager.submit("https://b.example")
+        await started.wait()
+        assert (await manager.cancel(queued["id"]))["status"] == CANCELLED
+        await manager.cancel(running["id"])
+        await wait_for_status(manager, running["id"], CANCELLED)
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_job_past_its_deadline_times_out():
+    async def runner(job, emit):
+        await asyncio.sleep(60)
+
+    async def scenario():
+        manager = JobManager(runner, store=InMemoryJobStore(), workers=1)
+        await manager.start()
+        job = await manager.submit("https://a.example", deadline=0.05)
+        done = await wait_for_status(manager, job["id"], TIMED_OUT)
+        assert done["error"] == "Job deadline exceeded"
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_new_jobs_start_queued():
+    manager = JobManager(None, store=InMemoryJobStore())
+    assert asyncio.run(manager.submit("https://a.example"))["status"] == QUEUED
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_job_interrupted_by_stop_runs_after_restart(backend, tmp_path):
+    store = InMemoryJobStore() if backend == "memory" else SQLiteJobStore(str(tmp_path / "jobs.db"))
+    runs = []
+
+    async def runner(job, emit):
+        runs.append(job["id"])
+        if len(runs) == 1:
+            await asyncio.sleep(60)  # interrupted by stop()
+        return {"ok": True}
+
+    async def scenario():
+        manager = JobManager(runner, store=store, workers=1)
+        await manager.start()
+        job = await manager.submit("https://a.example")
+        await asyncio.sleep(0.05)
+        await manager.stop()
+        assert (await manager.get(job["id"]))["status"] == QUEUED
+        assert manager.store.count(QUEUED) == 1
+        await manager.start()
+        await wait_for_status(manager, job["id"], SUCCEEDED)
+        assert runs == [job["id"], job["id"]]
+        await manager.stop()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_store_batches_stage_events(tmp_path, monkeypatch):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    writes = []
+    set_partials = store.set_partials
+
+    def recording_set_partials(job_id, stages):
+        writes.append(dict(stages))
+        set_partials(job_id, stages)
+
+    monkeypatch.setattr(store, "set_partials", recording_set_partials)
+
+    async def runner(job, emit):
+        for i in range(20):
+            emit(f"stage{i}", {"n": i})
+        emit("skipped", {"stage": "whois"})
+        await asyncio.sleep(0.5)
+        return {"ok": True}
+
+    async def scenario():
+        manager = JobManager(runner, store=store, workers=1)
+        await manager.start()
+        job = await manager.submit("https://example.com")
+        done = await wait_for_status(manager, job["id"], SUCCEEDED)
+        await manager.stop()
+        return done
+
+    done = asyncio.run(scenario())
+    assert len(writes) == 1 and len(writes[0]) == 21
+    assert done["partial"]["stage19"] == {"n": 19} and done["partial"]["skipped"] == ["whois"]
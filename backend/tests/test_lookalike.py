@@ -0,0 +1,109 @@
+import pytest
+
+from lookalike import KeywordMatcher, LookalikeDetector, brand_hits, levenshtein, skeleton, split_host
+
+# Real sites that share letters with a brand; none of them may be flagged
+BENIGN_URLS = [
+    "https://finance.com/",
+    "https://passenger.com/",
+    "https://passenger.com/account",
+    "https://discard.com/",
+    "https://twister.com/",
+    "https://morton.com/",
+    "https://horton.com/",
+    "https://goggle.com/",
+    "https://www.telegraph.co.uk/login",
+    "https://s3.amazonaws.com/bucket/paypal.png",
+    "https://www.youtube-nocookie.com/embed/abc",
+    "https://lh3.googleusercontent.com/a/photo",
+    "https://www.microsoftstore.com/",
+    "https://fonts.gstatic.com/s/roboto",
+    "https://raw.githubusercontent.com/user/repo/main/README.md",
+    "https://www.paypalobjects.com/js/checkout.js",
+    "https://example.com/auth/facebook/callback",
+    "https://example.com/login-with-google",
+    "https://example.com/oauth2/google/login",
+    "https://example.com/blog/why-we-left-facebook",
+    "https://pineapple.com/",
+    "https://www.paypal.com/signin",
+    "https://shop.amazon.co.uk/account",
+    "https://amazon.de/",
+    "https://wikipedia.org/wiki/PayPal",
+    "https://www.microsoft365.com/login",
+    "https://www.costcotravel.com/",
+    "https://www.googleblog.com/",
+    "https://www.binanceus.com/account",
+]
+
+
+def kinds(url: str) -> set[tuple[str, str]]:
+    return {(hit["kind"], hit["brand"]) for hit in brand_hits(url)}
+
+
+@pytest.mark.parametrize("url", BENIGN_URLS)
+def test_benign_urls_have_no_hits(url):
+    assert brand_hits(url) == []
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://paypa1.com/", ("homoglyph", "paypal")),
+        ("https://xn--pypal-4ve.com/", ("homoglyph", "paypal")),
+        ("https://xn--80ak6aa92e.com/", ("homoglyph", "apple")),
+        ("https://rnicrosoft.com/", ("homoglyph", "microsoft")),
+        ("https://amazom.com/", ("typo", "amazon")),
+        ("https://paypla.com/", ("typo", "paypal")),
+        ("https://paypal-login.xyz/", ("brandInDomain", "paypal")),
+        ("https://chase-bank.com/", ("brandInDomain", "chase")),
+        ("https://example.com/paypal/verify", ("brandInPath", "paypal")),
+        ("http://1.2.3.4/paypal-login/", ("brandInPath", "paypal")),
+    ],
+)
+def test_impersonation_is_flagged(url, expected):
+    assert expected in kinds(url)
+
+
+def test_two_edits_need_a_credential_cue():
+    assert kinds("https://massanger.com/") == set()
+    assert kinds("https://massanger.com/login") == {("typo", "messenger")}
+    assert ("typo", "instagram") in kinds("https://lnstagran.com/")  # one edit is enough
+
+
+def test_brand_in_path_needs_a_credential_cue():
+    assert kinds("https://example.com/paypal/") == set()
+    assert kinds("https://example.com/paypal/account") == {("brandInPath", "paypal")}
+
+
+def test_short_keywords_only_match_whole_tokens():
+    assert kinds("https://chasers.com/") == set()
+    assert ("brandInDomain", "chase") in kinds("https://my-chase.net/")
+
+
+def test_infrastructure_is_owned_but_not_a_typo_target():
+    detector = LookalikeDetector({"amazon": ("amazon.com",)}, {"amazon": ("amazonaws.com",)})
+    assert detector.check("https://s3.amazonaws.com/") == []
+    assert {hit["kind"] for hit in detector.check("https://amazonaw.com/")} == {"brandInDomain"}
+    assert {hit["kind"] for hit in detector.check("https://amazom.com/")} == {"typo"}
+
+
+def test_skeleton_folds_confusables():
+    assert skeleton("pаypa1") == skeleton("paypal")
+    assert skeleton("rnicrosoft") == skeleton("microsoft")
+
+
+def test_split_host_handles_multi_part_suffixes():
+    assert split_host("www.shop.amazon.co.uk") == (["shop"], "amazon", "co.uk")
+    assert split_host("localhost") == ([], "localhost", "")
+
+
+def test_levenshtein_limit():
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("kitten", "sitting", limit=1) == 2
+    assert levenshtein("paypal", "paypal", limit=0) == 0
+
+
+def test_keyword_matcher_finds_overlapping_keywords():
+    matches = KeywordMatcher(["pay", "paypal", "pal"]).find("mypaypal")
+    assert {keyword for _, _, keyword in matches} == {"pay", "paypal", "pal"}
+    assert (2, 8, "paypal") in matches
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+import main
+from deadlines import Deadline
+
+LOGIN = "http://site.test/login.html"
+LOOKUPS = {"whois", "pageRank", "safeBrowsing"}
+PROMPTS = {"aiSummary", "aiCaption", "privacyAnalysis"}
+
+
+def preview(stubbed, url: str, **kwargs) -> tuple[dict, list[str]]:
+    events = []
+
+    async def scenario():
+        data = await stubbed(url)
+        return await main.build_preview(url, data, emit=lambda event, payload: events.append(event), **kwargs)
+
+    return asyncio.run(scenario()), events
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Every enrichment stage replaced by a 50 ms fake that logs when it starts and ends."""
+    log = []
+
+    def fake(name, value, delay=0.05):
+        async def stage(*args, **kwargs):
+            log.append(("start", name))
+            await asyncio.sleep(delay)
+            log.append(("end", name))
+            return value
+
+        return stage
+
+    score = {"score": 10, "tier": "HIGH", "reasoning": "Looks fine.", "domainTrustScore": 80}
+    monkeypatch.setattr(main, "lookup_whois", fake("whois", {"registrar": "Stub"}))
+    monkeypatch.setattr(main, "lookup_pagerank", fake("pageRank", {"rank": 1}))
+    monkeypatch.setattr(main, "fetch_safe_browsing", fake("safeBrowsing", {"is_flagged": False, "threat_types": []}))
+    monkeypatch.setattr(main, "ask_gemini_for_score", fake("aiScore", score))
+    monkeypatch.setattr(main, "ask_gemini_site_summary", fake("aiSummary", "A page."))
+    monkeypatch.setattr(main, "ask_gemini_image_caption", fake("aiCaption", "A picture."))
+    monkeypatch.setattr(main, "lookup_privacy_analysis", fake("privacyAnalysis", None))
+    return log
+
+
+def test_all_stages_against_the_upstream_stubs(stubbed):
+    result, events = preview(stubbed, LOGIN)
+    assert result["ok"] and not result["partial"]
+    assert result["whois"]["registrar"] == "Bench Registrar, Inc."
+    assert result["pageRank"] is not None
+    assert result["safeBrowsing"]["is_flagged"] is True  # the stub flags URLs with "login"
+    assert result["risk"]["score"] == 72 and result["risk"]["reasoning"]
+    assert result["aiSummary"]
+    assert events[:2] == ["navigation", "screenshot"]
+    assert {"risk", "aiScore", "aiSummary"} | LOOKUPS <= set(events)
+
+
+def test_independent_stages_start_together(stubbed, stages):
+    preview(stubbed, LOGIN)
+    first_end = next(i for i, (kind, _) in enumerate(stages) if kind == "end")
+    assert {name for _, name in stages[:first_end]} == LOOKUPS | PROMPTS
+
+
+def test_score_waits_only_for_the_lookups(stubbed, stages):
+    result, _ = preview(stubbed, LOGIN)
+    score_started = stages.index(("start", "aiScore"))
+    assert all(stages.index(("end", name)) < score_started for name in LOOKUPS)
+    # The other prompts never waited on the lookups
+    assert all(stages.index(("start", name)) < stages.index(("end", "whois")) for name in PROMPTS)
+    assert result["risk"]["score"] == 10
+
+
+def test_fields_limit_the_stages_that_run(stubbed, stages):
+    result, _ = preview(stubbed, LOGIN, fields=frozenset({"whois"}))
+    assert {name for _, name in stages} == {"whois"}
+    assert result["whois"] == {"registrar": "Stub"} and "aiSummary" not in result
+
+
+def test_combined_mode_asks_gemini_once(stubbed, monkeypatch):
+    import stubs
+
+    monkeypatch.setattr(main, "GEMINI_MODE", "combined")
+    before = stubs.calls.get("gemini", 0)
+    result, events = preview(stubbed, LOGIN)
+    assert stubs.calls["gemini"] - before == 1
+    assert result["risk"]["score"] == 72 and result["aiSummary"] == "A benchmark corpus page."
+    assert "aiCombined" not in events and "aiScore" in events
+
+
+def test_stage_past_the_deadline_is_skipped(stubbed, stages, monkeypatch):
+    async def slow_whois(domain):
+        await asyncio.sleep(5)
+
+    monkeypatch.setattr(main, "lookup_whois", slow_whois)
+    result, events = preview(stubbed, LOGIN, deadline=Deadline(1))
+    assert result["partial"] and "whois" in result["skippedStages"]
+    assert result["whois"] is None and "skipped" in events
@@ -0,0 +1,99 @@
+import asyncio
+
+import httpx
+import pytest
+
+import agent
+import http_client
+from urls import is_public_address
+
+POLICY = "<html><body><main>" + "We collect and process your data. " * 40 + "</main></body></html>"
+PUBLIC = "http://93.184.216.34"
+
+
+class Recorder:
+    bytes_downloaded = 0
+
+
+def fetch(handler, link: str, recorder=None):
+    async def scenario():
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await agent.fetch_privacy_text_http(link, recorder)
+        finally:
+            await http_client.close_client()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize(
+    "address, public",
+    [
+        ("93.184.216.34", True), ("2606:2800:220:1::", True), ("127.0.0.1", False), ("10.1.2.3", False),
+        ("192.168.0.1", False), ("169.254.169.254", False), ("::1", False), ("fe80::1%eth0", False),
+        ("::ffff:127.0.0.1", False), ("0.0.0.0", False), ("not-an-ip", False),
+    ],
+)
+def test_is_public_address(address, public):
+    assert is_public_address(address) is public
+
+
+def test_fetches_html_policy_text():
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8"}, text=POLICY)
+
+    text = fetch(handler, f"{PUBLIC}/privacy")
+    assert text.startswith("We collect")
+
+
+@pytest.mark.parametrize("link", ["http://127.0.0.1/privacy", "http://169.254.169.254/latest/meta-data/"])
+def test_private_links_are_refused(link):
+    def handler(request):
+        raise AssertionError("must not be fetched")
+
+    with pytest.raises(agent.UnsafeLink):
+        fetch(handler, link)
+
+
+def test_redirect_to_private_address_is_refused():
+    def handler(request):
+        if request.url.host == "93.184.216.34":
+            return httpx.Response(302, headers={"location": "http://10.0.0.5/admin"})
+        raise AssertionError("redirect target must not be fetched")
+
+    with pytest.raises(agent.UnsafeLink):
+        fetch(handler, f"{PUBLIC}/privacy")
+
+
+def test_redirects_are_capped():
+    hops = []
+
+    def handler(request):
+        hops.append(request.url.path)
+        return httpx.Response(302, headers={"location": f"/hop{len(hops)}"})
+
+    assert fetch(handler, f"{PUBLIC}/privacy") is None
+    assert len(hops) == agent.PRIVACY_MAX_REDIRECTS + 1
+
+
+def test_non_text_responses_are_not_read():
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "application/pdf"}, content=b"%PDF" * 1000)
+
+    assert fetch(handler, f"{PUBLIC}/privacy.pdf") is None
+
+
+def test_endless_body_stops_at_the_byte_cap(monkeypatch):
+    monkeypatch.setattr(agent, "PRIVACY_MAX_BYTES", 64 * 1024)
+
+    async def endless():
+        yield POLICY.encode()
+        while True:
+            yield b"<p>" + b"x" * 8192 + b"</p>"
+
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/html"}, content=endless())
+
+    recorder = Recorder()
+    assert fetch(handler, f"{PUBLIC}/privacy", recorder) is not None
+    assert recorder.bytes_downloaded == 64 * 1024
@@ -0,0 +1,78 @@
+import asyncio
+import gzip
+
+from responses import CompressionMiddleware, choose_encoding, dumps
+
+SCOPE = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+
+
+async def receive():
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+def run(app) -> list[dict]:
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(SCOPE, receive, send))
+    return sent
+
+
+def start(content_type: bytes, length: int | None = None) -> dict:
+    headers = [(b"content-type", content_type)]
+    if length is not None:
+        headers.append((b"content-length", str(length).encode()))
+    return {"type": "http.response.start", "status": 200, "headers": headers}
+
+
+def test_large_json_is_compressed():
+    body = dumps({"items": list(range(500))})
+
+    async def app(scope, receive, send):
+        await send(start(b"application/json", len(body)))
+        await send({"type": "http.response.body", "body": body})
+
+    response_start, response_body = run(app)
+    headers = dict(response_start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert gzip.decompress(response_body["body"]) == body
+
+
+def test_small_and_binary_bodies_pass_through():
+    for content_type, body in ((b"application/json", b"{}"), (b"image/jpeg", b"\xff" * 500)):
+        async def app(scope, receive, send):
+            await send(start(content_type, len(body)))
+            await send({"type": "http.response.body", "body": body})
+
+        response_start, response_body = run(app)
+        assert b"content-encoding" not in dict(response_start["headers"])
+        assert response_body["body"] == body
+
+
+def test_event_stream_headers_are_not_held_back():
+    seen_before_first_event = []
+
+    async def app(scope, receive, send):
+        await send(start(b"text/event-stream; charset=utf-8"))
+        seen_before_first_event.append(len(sent))
+        await send({"type": "http.response.body", "body": b"event: navigation\ndata: {}\n\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(CompressionMiddleware(app, minimum_size=1)(SCOPE, receive, send))
+    assert seen_before_first_event == [1]
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body", "http.response.body"]
+    assert sent[1]["body"].startswith(b"event: navigation")
+
+
+def test_choose_encoding_respects_q_values():
+    assert choose_encoding("gzip;q=0.5, identity") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("") is None
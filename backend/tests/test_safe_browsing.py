@@ -0,0 +1,176 @@
+import asyncio
+import base64
+import hashlib
+
+import httpx
+import pytest
+
+import http_client
+from safe_browsing import ThreatDatabase, ThreatList, ThreatListStore, canonicalize, full_hash, url_expressions
+
+
+def canonical(url: str) -> str:
+    host, path, query = canonicalize(url)
+    return host + path + (f"?{query}" if query is not None else "")
+
+
+# Examples from the Safe Browsing v4 URL canonicalization spec
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("http://host/%25%32%35", "host/%25"),
+        ("http://host/%25%32%35%25%32%35", "host/%25%25"),
+        ("http://host/%2525252525252525", "host/%25"),
+        ("http://host/asdf%25%32%35asd", "host/asdf%25asd"),
+        ("http://host/%%%25%32%35asd%%", "host/%25%25%25asd%25%25"),
+        ("http://www.google.com/", "www.google.com/"),
+        (
+            "http://%31%36%38%2e%31%38%38%2e%39%39%2e%32%36/%2E%73%65%63%75%72%65/%77%77%77%2E%65%62%61%79%2E%63%6F%6D/",
+            "168.188.99.26/.secure/www.ebay.com/",
+        ),
+        (
+            "http://host%23.com/%257Ea%2521b%2540c%2523d%2524e%25f%255E00%252611%252A22%252833%252944_55%252B",
+            "host%23.com/~a!b@c%23d$e%25f^00&11*22(33)44_55+",
+        ),
+        ("http://3279880203/blah", "195.127.0.11/blah"),
+        ("http://www.google.com/blah/..", "www.google.com/"),
+        ("www.google.com/", "www.google.com/"),
+        ("www.google.com", "www.google.com/"),
+        ("http://www.evil.com/blah#frag", "www.evil.com/blah"),
+        ("http://www.GOOgle.com/", "www.google.com/"),
+        ("http://www.google.com.../", "www.google.com/"),
+        ("http://www.google.com/foo\tbar\rbaz\n2", "www.google.com/foobarbaz2"),
+        ("http://www.google.com/q?", "www.google.com/q?"),
+        ("http://www.google.com/q?r?", "www.google.com/q?r?"),
+        ("http://www.google.com/q?r?s", "www.google.com/q?r?s"),
+        ("http://evil.com/foo#bar#baz", "evil.com/foo"),
+        ("http://evil.com/foo;", "evil.com/foo;"),
+        ("http://evil.com/foo?bar;", "evil.com/foo?bar;"),
+        ("http://notrailingslash.com", "notrailingslash.com/"),
+        ("http://www.gotaport.com:1234/", "www.gotaport.com/"),
+        ("  http://www.google.com/  ", "www.google.com/"),
+        ("http://%20leadingspace.com/", "%20leadingspace.com/"),
+        ("%20leadingspace.com/", "%20leadingspace.com/"),
+        ("https://www.securesite.com/", "www.securesite.com/"),
+        ("http://host.com/ab%23cd", "host.com/ab%23cd"),
+        ("http://host.com//twoslashes?more//slashes", "host.com/twoslashes?more//slashes"),
+    ],
+)
+def test_canonicalize_matches_spec_examples(url, expected):
+    assert canonical(url) == expected
+
+
+def test_url_expressions_for_path_and_query():
+    assert sorted(url_expressions("http://a.b.c/1/2.html?param=1")) == sorted([
+        "a.b.c/1/2.html?param=1", "a.b.c/1/2.html", "a.b.c/", "a.b.c/1/",
+        "b.c/1/2.html?param=1", "b.c/1/2.html", "b.c/", "b.c/1/",
+    ])
+
+
+def test_url_expressions_keep_last_five_host_components():
+    assert sorted(url_expressions("http://a.b.c.d.e.f.g/1.html")) == sorted([
+        "a.b.c.d.e.f.g/1.html", "a.b.c.d.e.f.g/",
+        "c.d.e.f.g/1.html", "c.d.e.f.g/", "d.e.f.g/1.html", "d.e.f.g/",
+        "e.f.g/1.html", "e.f.g/", "f.g/1.html", "f.g/",
+    ])
+
+
+def test_url_expressions_for_ip_hosts():
+    assert sorted(url_expressions("http://1.2.3.4/1/")) == ["1.2.3.4/", "1.2.3.4/1/"]
+
+
+def list_update(prefixes: list[bytes], response_type="FULL_UPDATE", removals=(), state="s1", checksum=None) -> dict:
+    update = {
+        "threatType": "MALWARE",
+        "responseType": response_type,
+        "additions": [{"rawHashes": {"prefixSize": 4, "rawHashes": base64.b64encode(b"".join(prefixes)).decode()}}],
+        "newClientState": state,
+    }
+    if removals:
+        update["removals"] = [{"rawIndices": {"indices": list(removals)}}]
+    if checksum is not None:
+        update["checksum"] = {"sha256": base64.b64encode(hashlib.sha256(b"".join(checksum)).digest()).decode()}
+    return update
+
+
+def test_with_update_merges_and_verifies_checksum():
+    full = ThreatList("MALWARE").with_update(list_update([b"cccc", b"aaaa"], checksum=[b"aaaa", b"cccc"]))
+    assert full.prefixes() == [b"aaaa", b"cccc"] and full.state == "s1"
+
+    # Removal indices refer to the sorted list before the additions
+    partial = full.with_update(list_update(
+        [b"bbbb"], response_type="PARTIAL_UPDATE", removals=[1], state="s2", checksum=[b"aaaa", b"bbbb"],
+    ))
+    assert partial.prefixes() == [b"aaaa", b"bbbb"] and partial.state == "s2"
+    assert full.prefixes() == [b"aaaa", b"cccc"]  # the old list is untouched
+
+    with pytest.raises(ValueError):
+        partial.with_update(list_update([b"dddd"], response_type="PARTIAL_UPDATE", checksum=[b"zzzz"]))
+
+
+def test_update_swaps_in_new_lists_and_drops_bad_ones(monkeypatch):
+    monkeypatch.setenv("GOOGLE_SAFE_BROWSING_KEY", "test")
+    good = list_update([b"aaaa"], checksum=[b"aaaa"])
+    bad = {**list_update([b"bbbb"], checksum=[b"zzzz"]), "threatType": "SOCIAL_ENGINEERING"}
+
+    def handler(request):
+        return httpx.Response(200, json={"listUpdateResponses": [good, bad], "minimumWaitDuration": "60s"})
+
+    async def scenario():
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        store = ThreatListStore({"SOCIAL_ENGINEERING": ThreatList("SOCIAL_ENGINEERING", "old", {4: b"eeee"})})
+        db = ThreatDatabase(store, threat_types=["MALWARE", "SOCIAL_ENGINEERING"])
+        try:
+            await db.update()
+        finally:
+            await http_client.close_client()
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.lists["MALWARE"].prefixes() == [b"aaaa"]
+    # A checksum mismatch drops the list so the next update is a full one
+    assert store.lists["SOCIAL_ENGINEERING"].prefixes() == [] and store.lists["SOCIAL_ENGINEERING"].state == ""
+
+
+def test_store_matches_full_hashes_of_added_urls(tmp_path):
+    store = ThreatListStore()
+    store.add_urls("MALWARE", ["http://evil.example/download.exe"])
+    path = str(tmp_path / "lists.json")
+    store.save(path)
+    loaded = ThreatListStore.load(path)
+    digest = full_hash("evil.example/download.exe")
+    assert loaded.match(digest) == [("MALWARE", digest)]
+    assert loaded.match(full_hash("evil.example/")) == []
+
+
+def test_prefix_with_only_other_full_hashes_is_negative_cached(monkeypatch):
+    monkeypatch.setenv("GOOGLE_SAFE_BROWSING_KEY", "test")
+    prefix = full_hash("safe.example/")[:4]
+    other = prefix + b"\x00" * 28  # a listed URL that shares the prefix
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={
+            "matches": [{
+                "threatType": "MALWARE",
+                "threat": {"hash": base64.b64encode(other).decode()},
+                "cacheDuration": "300s",
+            }],
+            "negativeCacheDuration": "600s",
+        })
+
+    async def scenario():
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        db = ThreatDatabase(ThreatListStore({"MALWARE": ThreatList("MALWARE", "s1", {4: prefix})}))
+        try:
+            first = await db.check_urls(["http://safe.example/"])
+            second = await db.check_urls(["http://safe.example/"])
+        finally:
+            await http_client.close_client()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["http://safe.example/"]["is_flagged"] is False
+    assert second["http://safe.example/"]["is_flagged"] is False
+    assert len(requests) == 1
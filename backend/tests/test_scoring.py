@@ -0,0 +1,75 @@
+import random
+
+import numpy as np
+import pytest
+
+from scoring import FEATURES, feature_matrix, load_risk_config, score_batch, score_features, url_features
+
+
+def random_records(count: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "ssl": rng.random() < 0.7,
+            "thirdPartyScripts": rng.randrange(15),
+            "redirects": rng.randrange(6),
+            "hasPrivacyLink": rng.random() < 0.6,
+            "domainParts": rng.randrange(2, 6),
+            "suspiciousTld": rng.random() < 0.2,
+            "domainMismatch": rng.random() < 0.2,
+            "lookalikeDomain": rng.random() < 0.1,
+            "brandInDomain": rng.random() < 0.1,
+            "brandInPath": rng.random() < 0.1,
+        }
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("weights", [{}, {"noSsl": 12.5, "lookalikeDomain": 33.3}])
+def test_score_batch_matches_score_features(weights):
+    config = load_risk_config("")
+    config["weights"].update(weights)
+    records = random_records(2000)
+    batch = score_batch(records, config)
+    expected = [score_features(f, config) for f in records]
+    assert batch["scores"].tolist() == pytest.approx([e["score"] for e in expected])
+    assert batch["tiers"].tolist() == [e["tier"] for e in expected]
+
+
+def test_score_batch_accepts_legacy_seven_column_matrix():
+    records = random_records(500)
+    for f in records:
+        f.update(lookalikeDomain=False, brandInDomain=False, brandInPath=False)
+    legacy = feature_matrix(records)[:, :7]
+    assert legacy.shape == (500, 7)
+    assert score_batch(legacy)["scores"].tolist() == score_batch(records)["scores"].tolist()
+
+
+def test_records_without_brand_features_score_as_before():
+    f = random_records(1)[0]
+    for name in FEATURES[7:]:
+        del f[name]
+    assert score_features(f)["score"] == score_batch([f])["scores"][0]
+
+
+def test_url_features_flag_impersonation():
+    f = url_features("https://paypa1.com/login")
+    assert f["lookalikeDomain"] and not f["brandInDomain"]
+    result = score_features(f)
+    assert any("paypal.com" in reason for reason in result["reasons"])
+    assert result["tier"] == "LOW"  # one signal alone stays below tierMedium
+
+
+def test_score_is_capped():
+    worst = {name: 1 for name in FEATURES}
+    worst.update(ssl=0, hasPrivacyLink=0, thirdPartyScripts=50, redirects=10, domainParts=9)
+    assert score_batch(np.array([[worst[name] for name in FEATURES]]))["scores"][0] == 100
+
+
+@pytest.mark.parametrize(
+    "url", ["https://paypa1-login.xyz/", "https://paypa1.xyz/", "https://amazom.top/", "https://paypal-secure.click/"]
+)
+def test_impersonation_on_suspicious_tld_is_at_least_medium(url):
+    result = score_features(url_features(url))
+    assert result["score"] >= load_risk_config("")["thresholds"]["tierMedium"]
+    assert result["tier"] in ("MEDIUM", "HIGH")
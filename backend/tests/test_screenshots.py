@@ -0,0 +1,48 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from screenshots import ScreenshotStore
+
+
+def test_put_again_refreshes_expiry(monkeypatch):
+    store = ScreenshotStore(max_bytes=1024, ttl=10)
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    image_id = store.put(b"png", "image/png")
+    now[0] += 8
+    assert store.put(b"png", "image/png") == image_id
+    now[0] += 8
+    assert store.get(image_id) == (b"png", "image/png")
+    now[0] += 10
+    assert store.get(image_id) is None
+    assert store.stats()["bytes"] == 0
+
+
+def test_evicts_least_recently_used_over_budget():
+    store = ScreenshotStore(max_bytes=8, ttl=60)
+    first = store.put(b"aaaa", "image/jpeg")
+    second = store.put(b"bbbb", "image/jpeg")
+    store.get(first)
+    store.put(b"cccc", "image/jpeg")
+    assert store.get(second) is None
+    assert store.get(first) is not None
+
+
+def test_endpoint_caches_only_until_the_store_expires_the_image(monkeypatch):
+    store = ScreenshotStore(max_bytes=1024, ttl=3600)
+    monkeypatch.setattr(main, "screenshot_store", store)
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    image_id = store.put(b"png", "image/png")
+    now[0] += 600
+    client = TestClient(main.app)
+    resp = client.get(f"/api/screenshots/{image_id}")
+    assert resp.content == b"png"
+    assert resp.headers["cache-control"] == "public, max-age=3000, immutable"
+    resp = client.get(f"/api/screenshots/{image_id}", headers={"If-None-Match": f'"{image_id}"'})
+    assert resp.status_code == 304
+    assert resp.headers["cache-control"] == "public, max-age=3000, immutable"
+    now[0] += 3000
+    assert client.get(f"/api/screenshots/{image_id}").status_code == 404
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def fetch(publish):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert flight.stats() == {"executions": 1, "coalesced": 4, "inFlight": 0}
+        assert await flight.do("k", fetch) == "value"  # finished flights aren't reused
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_waiter():
+    async def fail(publish):
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def scenario():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert [type(r) for r in results] == [ValueError, ValueError]
+
+    asyncio.run(scenario())
+
+
+def test_late_joiners_get_missed_events_replayed():
+    async def work(publish):
+        publish("navigation", 1)
+        await asyncio.sleep(0.05)
+        publish("risk", 2)
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        early, late = [], []
+        first = asyncio.create_task(flight.do("k", work, listener=lambda e, p: early.append(e)))
+        await asyncio.sleep(0.01)
+        assert flight.in_flight("k")
+        await flight.do("k", work, listener=lambda e, p: late.append(e))
+        await first
+        assert early == late == ["navigation", "risk"]
+        assert not flight.in_flight("k")
+
+    asyncio.run(scenario())
+
+
+def test_shared_task_is_cancelled_only_when_the_last_waiter_leaves():
+    cancelled = asyncio.Event()
+
+    async def work(publish):
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "done"
+
+    async def scenario():
+        flight = SingleFlight("test")
+        a = asyncio.create_task(flight.do("k", work))
+        b = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        a.cancel()
+        await asyncio.sleep(0.01)
+        assert not cancelled.is_set() and flight.in_flight("k")
+        b.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await b
+        await asyncio.sleep(0.01)
+        assert cancelled.is_set()
+
+    asyncio.run(scenario())
+
+
+def test_do_many_joins_in_flight_keys_and_fetches_the_rest_together():
+    batches = []
+
+    async def single(publish):
+        await asyncio.sleep(0.05)
+        return "from-single"
+
+    async def fetch_many(keys):
+        batches.append(keys)
+        return {k: k.upper() for k in keys}
+
+    async def scenario():
+        flight = SingleFlight("test")
+        pending = asyncio.create_task(flight.do("a", single))
+        await asyncio.sleep(0.01)
+        results = await flight.do_many(["a", "b", "c", "b"], fetch_many)
+        assert results == {"a": "from-single", "b": "B", "c": "C"}
+        await pending
+
+    asyncio.run(scenario())
+    assert batches == [["b", "c"]]
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import main
+
+LOGIN = "http://site.test/login.html"
+STAGES = ["risk", "whois", "pageRank", "safeBrowsing", "aiScore", "aiSummary", "aiCaption", "privacyAnalysis"]
+
+
+def parse(chunks: list[bytes]) -> list[tuple[str, object]]:
+    events = []
+    for block in b"".join(chunks).decode().split("\n\n"):
+        if block:
+            event, data = block.split("\n", 1)
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def stream(url: str, **options) -> list[tuple[str, object]]:
+    async def scenario():
+        response = await main.preview_stream(main.PreviewRequest(url=url, **options))
+        assert response.media_type == "text/event-stream"
+        return [chunk async for chunk in response.body_iterator]
+
+    return parse(asyncio.run(scenario()))
+
+
+def test_events_arrive_in_pipeline_order(stubbed):
+    events = stream(LOGIN)
+    names = [name for name, _ in events]
+    assert names[:2] == ["navigation", "screenshot"] and names[-1] == "done"
+    assert sorted(names[2:-1]) == sorted(STAGES)  # each stage exactly once
+    # The score is built on the three lookups, so it can only follow them
+    assert all(names.index(lookup) < names.index("aiScore") for lookup in ("whois", "pageRank", "safeBrowsing"))
+    done = events[-1][1]
+    assert done["finalUrl"] == LOGIN and done["cache"]["status"] == "miss"
+
+
+def test_cached_result_is_replayed_in_the_same_order(stubbed):
+    first = [name for name, _ in stream(LOGIN)]
+    replay = stream(LOGIN)
+    assert len(stubbed.scanned) == 1
+    assert [name for name, _ in replay][:3] == first[:3] and replay[-1][0] == "done"
+    assert replay[-1][1]["cache"]["status"] == "fresh"
+
+
+def test_failed_scan_ends_with_an_error_event(stubbed):
+    events = stream("http://site.test/gone.html?fail=1")
+    assert events == [("error", {"status": 502, "detail": "Failed to load the URL"})]
+
+
+def test_disconnect_cancels_the_scan(stubbed):
+    url = "http://site.test/index.html?delay=5"
+
+    async def scenario():
+        response = await main.preview_stream(main.PreviewRequest(url=url))
+        reader = asyncio.create_task(anext(response.body_iterator))
+        await asyncio.sleep(0.05)
+        # What the server does when the client goes away mid-stream
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        await response.body_iterator.aclose()
+        await asyncio.sleep(0.05)
+        return main.scan_flight.stats()["inFlight"]
+
+    assert asyncio.run(scenario()) == 0
+    assert stubbed.cancelled == [url] and stubbed.finished == []
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_client
+import main
+from cache import LookupCache, _MISSING
+
+RECORD = {"WhoisRecord": {"domainName": "example.com", "registrarName": "Example Registrar"}}
+
+
+@pytest.fixture
+def whois_cache(monkeypatch):
+    monkeypatch.setenv("WHOIS_API_KEY", "test-key")
+    cache = LookupCache("whois", ttl=100, negative_ttl=50)
+    monkeypatch.setattr(main, "whois_cache", cache)
+    return cache
+
+
+def lookup(handler, domain="example.com"):
+    async def scenario():
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await main.lookup_whois(domain)
+        finally:
+            await http_client.close_client()
+
+    return asyncio.run(scenario())
+
+
+def cached(cache, key="example.com"):
+    return asyncio.run(cache.get(key))
+
+
+def test_record_is_cached(whois_cache):
+    result = lookup(lambda request: httpx.Response(200, json=RECORD))
+    assert result["registrar"] == "Example Registrar"
+    assert cached(whois_cache)["registrar"] == "Example Registrar"
+
+
+def test_no_record_is_negative_cached(whois_cache):
+    assert lookup(lambda request: httpx.Response(200, json={"ErrorMessage": {"msg": "no data"}})) is None
+    assert cached(whois_cache) is None
+
+
+def timeout(request):
+    raise httpx.ConnectTimeout("timed out", request=request)
+
+
+@pytest.mark.parametrize(
+    "handler",
+    [
+        timeout,
+        lambda request: httpx.Response(503),
+        lambda request: httpx.Response(429),
+        lambda request: httpx.Response(200, text="<html>gateway</html>"),
+    ],
+)
+def test_transient_failures_are_not_cached(whois_cache, handler):
+    assert lookup(handler) is None
+    assert cached(whois_cache) is _MISSING
+    # The next scan asks again and caches the real answer
+    assert lookup(lambda request: httpx.Response(200, json=RECORD))["domainName"] == "example.com"
+
+
+def test_missing_api_key_skips_the_cache(whois_cache, monkeypatch):
+    monkeypatch.delenv("WHOIS_API_KEY")
+    assert lookup(lambda request: httpx.Response(200, json=RECORD)) is None
+    assert cached(whois_cache) is _MISSING
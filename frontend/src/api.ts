@@ -2,22 +2,46 @@ const API_URL = import.meta.env.VITE_API_URL ?? "http://localhost:3001";
 
 export interface ScanResult {
   ok: boolean;
+  /** True when the scan deadline cut some stages off; they are listed in skippedStages. */
+  partial?: boolean;
+  skippedStages?: string[];
   finalUrl: string;
   redirectCount: number;
   redirects: string[];
-  screenshotBase64: string;
+  screenshot: {
+    id: string;
+    url: string;
+    thumbnailUrl: string | null;
+    mimeType: string;
+    width: number;
+    height: number;
+    bytes: number;
+  } | null;
   signals: {
     title: string;
     ssl: boolean;
     hasPrivacyLink: boolean;
     hasLoginForm: boolean;
     thirdPartyScriptsCount: number;
+    hasMetaRefresh?: boolean;
+    iframeCount?: number;
   };
   privacy: {
     link: string | null;
     snippet: string | null;
   };
   scripts: string[];
+  capture?: {
+    profile: "full" | "fast";
+    bytesDownloaded: number | null;
+    blockedRequests: number;
+    blocked: { url: string; type: string; tracker: boolean }[];
+    trackerHosts: string[];
+  } | null;
+  settle?: {
+    ms: number;
+    timedOut: boolean;
+  } | null;
   risk: {
     score: number;
     tier: "LOW" | "MEDIUM" | "HIGH";
@@ -34,8 +58,9 @@ export interface ScanResult {
     privateRegistration: boolean;
   } | null;
   safeBrowsing: {
-    is_flagged: boolean;
+    is_flagged: boolean | null;
     threat_types: string[];
+    error?: string;
   };
   pageRank: {
     pageRankDecimal: number | null;
@@ -48,6 +73,15 @@ export interface ScanResult {
     summary: string;
     highlights: string[];
   } | null;
+  cache?: {
+    status: "miss" | "fresh" | "stale" | "bypass";
+    ageSeconds: number;
+  };
+}
+
+/** Resolve an API-relative path (e.g. a screenshot URL) against the API host. */
+export function apiUrl(path: string): string {
+  return `${API_URL}${path}`;
 }
 
 export async function previewUrl(url: string): Promise<ScanResult> {
@@ -64,3 +98,63 @@ export async function previewUrl(url: string): Promise<ScanResult> {
 
   return res.json();
 }
+
+export type ScanStage =
+  | "navigation"
+  | "screenshot"
+  | "risk"
+  | "whois"
+  | "pageRank"
+  | "safeBrowsing"
+  | "aiScore"
+  | "aiSummary"
+  | "aiCaption"
+  | "privacyAnalysis";
+
+export async function previewUrlStream(
+  url: string,
+  onStage: (stage: ScanStage, payload: unknown) => void,
+): Promise<ScanResult> {
+  const res = await fetch(`${API_URL}/api/preview/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({ url }),
+  });
+
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({ detail: "Request failed" }));
+    throw new Error(err.detail || `HTTP ${res.status}`);
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // SSE frames are separated by a blank line
+    let boundary: number;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of frame.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const payload = data ? JSON.parse(data) : null;
+
+      if (event === "done") return payload as ScanResult;
+      if (event === "error") throw new Error(payload?.detail || "Scan failed");
+      // A stage the deadline cut off is over too, just without a result
+      if (event === "skipped") onStage(payload.stage as ScanStage, null);
+      else onStage(event as ScanStage, payload);
+    }
+  }
+
+  throw new Error("Scan stream ended unexpectedly");
+}
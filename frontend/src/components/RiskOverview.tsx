@@ -12,8 +12,9 @@ interface WhoisData {
 }
 
 interface SafeBrowsingData {
-  is_flagged: boolean
+  is_flagged: boolean | null
   threat_types: string[]
+  error?: string
 }
 
 interface PageRankData {
@@ -140,7 +141,7 @@ export function RiskOverview({ score, tier, reasons, reasoning, domainTrustScore
 
   const credibilityScore = pageRank?.pageRankDecimal ?? null
 
-  const threatLevel = safeBrowsing
+  const threatLevel = safeBrowsing && safeBrowsing.is_flagged !== null
     ? (safeBrowsing.is_flagged ? 'HIGH' : 'LOW')
     : null
 
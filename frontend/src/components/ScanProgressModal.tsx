@@ -1,17 +1,20 @@
 import { useState, useEffect } from 'react'
+import type { ScanStage } from '../api'
 
 interface Step {
   label: string
+  stages: ScanStage[]
 }
 
 const steps: Step[] = [
-  { label: 'Opening website in secure sandbox' },
-  { label: 'Capturing screenshot' },
-  { label: 'Analyzing redirects & scripts' },
-  { label: 'Looking up WHOIS domain data' },
-  { label: 'Querying OpenPageRank' },
-  { label: 'Scanning Google Safe Browsing' },
-  { label: 'Computing risk score' },
+  { label: 'Opening website in secure sandbox', stages: ['navigation'] },
+  { label: 'Capturing screenshot', stages: ['screenshot'] },
+  { label: 'Analyzing redirects & scripts', stages: ['risk'] },
+  { label: 'Looking up WHOIS domain data', stages: ['whois'] },
+  { label: 'Querying OpenPageRank', stages: ['pageRank'] },
+  { label: 'Scanning Google Safe Browsing', stages: ['safeBrowsing'] },
+  { label: 'Summarizing site & privacy policy', stages: ['aiSummary', 'aiCaption', 'privacyAnalysis'] },
+  { label: 'Computing risk score', stages: ['aiScore'] },
 ]
 
 const tips = [
@@ -30,32 +33,23 @@ const tips = [
 ]
 
 const TIP_INTERVAL = 5000
-const STEP_INTERVAL = 2400
 
 interface ScanProgressModalProps {
   visible: boolean
+  completedStages: ScanStage[]
 }
 
-export function ScanProgressModal({ visible }: ScanProgressModalProps) {
-  const [currentStep, setCurrentStep] = useState(0)
+export function ScanProgressModal({ visible, completedStages }: ScanProgressModalProps) {
   const [tipIndex, setTipIndex] = useState(() => Math.floor(Math.random() * tips.length))
   const [tipFade, setTipFade] = useState(true)
 
+  const stepDone = steps.map(step => step.stages.every(stage => completedStages.includes(stage)))
+  const doneCount = stepDone.filter(Boolean).length
+
   useEffect(() => {
     if (!visible) {
-      setCurrentStep(0)
       setTipIndex(Math.floor(Math.random() * tips.length))
-      return
     }
-
-    const timer = setInterval(() => {
-      setCurrentStep(prev => {
-        if (prev < steps.length - 1) return prev + 1
-        return prev
-      })
-    }, STEP_INTERVAL)
-
-    return () => clearInterval(timer)
   }, [visible])
 
   useEffect(() => {
@@ -95,14 +89,15 @@ export function ScanProgressModal({ visible }: ScanProgressModalProps) {
         <div className="mx-6 h-1.5 rounded-full bg-[#1f2024] overflow-hidden">
           <div
             className="h-full rounded-full bg-[#7c3aed] transition-all duration-700 ease-out"
-            style={{ width: `${((currentStep + 1) / steps.length) * 100}%` }}
+            style={{ width: `${(Math.max(doneCount, 0.5) / steps.length) * 100}%` }}
           />
         </div>
 
         {/* Steps */}
         <div className="px-6 pt-5 pb-3 space-y-1.5">
           {steps.map((step, i) => {
-            const status = i < currentStep ? 'done' : i === currentStep ? 'active' : 'pending'
+            // Once the page has loaded every remaining stage runs in parallel
+            const status = stepDone[i] ? 'done' : i === 0 || stepDone[0] ? 'active' : 'pending'
             return (
               <div
                 key={i}
@@ -14,12 +14,12 @@ const snapshotIcon = (
 )
 
 interface ScreenshotPanelProps {
-  screenshotBase64?: string
+  screenshotUrl?: string
   caption?: string | null
   aiSummary?: string | null
 }
 
-export function ScreenshotPanel({ screenshotBase64, caption, aiSummary }: ScreenshotPanelProps) {
+export function ScreenshotPanel({ screenshotUrl, caption, aiSummary }: ScreenshotPanelProps) {
   return (
     <>
       {/* AI Summary */}
@@ -33,11 +33,11 @@ export function ScreenshotPanel({ screenshotBase64, caption, aiSummary }: Screen
 
       {/* Page Snapshot */}
       <SectionContainer title="Page Snapshot" icon={snapshotIcon}>
-        {screenshotBase64 ? (
+        {screenshotUrl ? (
           <>
             <div className="rounded-lg border border-[#1f2024] bg-[#0c0d0f] overflow-hidden">
               <img
-                src={`data:image/png;base64,${screenshotBase64}`}
+                src={screenshotUrl}
                 alt="Page screenshot"
                 className="w-full"
               />
@@ -11,7 +11,7 @@ import { TechnicalDetails } from '../components/TechnicalDetails'
 import { SemanticsPanel } from '../components/SemanticsPanel'
 import { RiskOverviewSkeleton, TabsPanelSkeleton } from '../components/Skeleton'
 import { ScanProgressModal } from '../components/ScanProgressModal'
-import { previewUrl, type ScanResult } from '../api'
+import { apiUrl, previewUrlStream, type ScanResult, type ScanStage } from '../api'
 
 const overviewIcon = (
   <svg className="h-4.5 w-4.5" fill="none" viewBox="0 0 24 24" stroke="currentColor" strokeWidth={1.5}>
@@ -40,6 +40,7 @@ export function ScanPage() {
 
   const [scanResult, setScanResult] = useState<ScanResult | null>(null)
   const [loading, setLoading] = useState(false)
+  const [completedStages, setCompletedStages] = useState<ScanStage[]>([])
   const [error, setError] = useState<string | null>(null)
 
   const handleScan = async (url: string) => {
@@ -49,9 +50,12 @@ export function ScanPage() {
     setLoading(true)
     setError(null)
     setScanResult(null)
+    setCompletedStages([])
 
     try {
-      const result = await previewUrl(url)
+      const result = await previewUrlStream(url, stage =>
+        setCompletedStages(prev => [...prev, stage]),
+      )
       setScanResult(result)
     } catch (e) {
       setError(e instanceof Error ? e.message : 'Scan failed')
@@ -83,7 +87,7 @@ export function ScanPage() {
       icon: overviewIcon,
       content: (
         <ScreenshotPanel
-          screenshotBase64={scanResult?.screenshotBase64}
+          screenshotUrl={scanResult?.screenshot ? apiUrl(scanResult.screenshot.url) : undefined}
           aiSummary={scanResult?.aiSummary}
           caption={scanResult?.aiCaption}
         />
@@ -229,7 +233,7 @@ export function ScanPage() {
         </div>
       </div>
 
-      <ScanProgressModal visible={loading} />
+      <ScanProgressModal visible={loading} completedStages={completedStages} />
 
       {/* Results — fades and slides in */}
       {scanned && (